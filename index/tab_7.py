@@ -6,7 +6,8 @@ from loguru import logger
 
 from config.global_setting import global_setting
 from PyQt6 import QtCore
-from PyQt6.QtCore import QRect, QThread, pyqtSignal
+from PyQt6.QtCore import QRect, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor
 from PyQt6.QtWidgets import QWidget, QMainWindow, QTextBrowser, QVBoxLayout, QScrollArea, QPushButton, QHBoxLayout, \
     QTextEdit, QPlainTextEdit, QSlider, QLabel, QStackedWidget, QComboBox
 
@@ -15,7 +16,11 @@ from ui.custom_ui.BarChart import BarChartApp
 from ui.custom_ui.ImageGallery import ImageGallery
 from ui.custom_ui.VideoPlayer import VideoPlayer
 from ui.tab7 import Ui_tab7_frame
+from util.log_tail import LogTail
 class Status_thread(QThread):
+    """
+    状态栏日志线程：增量读取昨天和今天的报告日志，保留最新 Status.max_line 行
+    """
     # 线程信号
     update_time_thread_doing = pyqtSignal()
 
@@ -24,87 +29,35 @@ class Status_thread(QThread):
         # 获取主线程更新界面信号
         self.update_status_main_signal: pyqtSignal = update_status_main_signal
         self._stop_requested = False
+        self.tail_max_line = self._max_line()
+        try:
+            refresh_interval = float(global_setting.get_setting('configer')['Status'].get('status_refresh_interval', 1000)) / 1000.0
+        except Exception as exc:
+            logger.warning(f"[StatusThread] 读取 Status.status_refresh_interval 失败，使用 1s: {exc}")
+            refresh_interval = 1.0
+        refresh_bus = global_setting.get_setting("refresh_bus")
+        self.subscription = refresh_bus.subscribe("status", refresh_interval) if refresh_bus is not None else None
         pass
 
-    def reverse_lines_efficient(self,input_string):
-        """
-        更高效的内存管理方案（适用于非常大的字符串）
-        :param input_string: 输入的多行字符串
-        :return: 逆序后的字符串
-        """
-        # 寻找最后一个换行符的位置
-        last_index = len(input_string)
-        output_lines = []
-
-        # 从字符串末尾向前处理
-        for i in range(len(input_string) - 1, -2, -1):
-            if i < 0 or input_string[i] == '\n':
-                # 找到一行内容（当前指针位置+1 到 last_index）
-                line = input_string[i + 1:last_index]
-                output_lines.append(line)
-                last_index = i
-        if output_lines and output_lines[0] == "":
-            output_lines = output_lines[1:]
-
-        max_line = int(global_setting.get_setting('configer')['Status']['max_line'])
-        if max_line > 0:
-            output_lines = output_lines[:max_line]
-
-        return '\n'.join(output_lines)
-
-    def read_large_log_file(self, filename, chunk_size=10 * 1024 * 1024):  # 默认 10MB 分块
-        """
-        分批读取大日志文件（避免内存溢出）。缺失文件或临时无法访问时返回空迭代。
-        :param filename: 日志文件路径
-        :param chunk_size: 每次读取的字节大小
-        :return: 生成器产生日志行
-        """
-
-        def _iter_file(file_obj):
-            buffer = ""
-            while True:
-                data = file_obj.read(chunk_size)
-                if not data:
-                    if buffer:
-                        yield buffer
-                    break
-
-                buffer += data
-                lines = buffer.splitlines()
-                buffer = lines.pop() if lines and not data.endswith('\n') else ""
-
-                for line in lines:
-                    yield line
-
-        path = Path(filename)
+    def _max_line(self):
         try:
-            with path.open('r', encoding='utf-8') as file:
-                yield from _iter_file(file)
-        except UnicodeDecodeError:
-            try:
-                with path.open('r', encoding='gbk', errors='ignore') as file:
-                    yield from _iter_file(file)
-            except Exception as exc:
-                logger.warning(f"[StatusThread] 无法以兼容编码读取日志 {path}: {exc}")
-        except FileNotFoundError:
-            logger.debug(f"[StatusThread] 日志文件不存在，等待写入: {path}")
-        except PermissionError as exc:
-            logger.warning(f"[StatusThread] 无法读取日志 {path}: {exc}")
-        except OSError as exc:
-            logger.warning(f"[StatusThread] 读取日志 {path} 失败: {exc}")
+            return int(global_setting.get_setting('configer')['Status']['max_line'])
+        except Exception as exc:
+            logger.warning(f"[StatusThread] 读取 Status.max_line 失败，不限制行数: {exc}")
+            return 0
 
     def run(self):
-        event = global_setting.get_setting("processing_done")
         first_iteration = True
+        # 记住文件读取位置，每次只读取新追加的日志行
+        tail = LogTail(max_lines=self.tail_max_line)
 
         while not self._stop_requested:
-            triggered = True
             if not first_iteration:
-                if event is not None:
-                    triggered = event.wait(timeout=600)
+                # 合并窗口内的多次通知只读取一次日志
+                if self.subscription is not None:
+                    self.subscription.wait(timeout=600)
                 else:
                     time.sleep(600)
-                    triggered = False
                 if self._stop_requested:
                     break
             else:
@@ -120,44 +73,36 @@ class Status_thread(QThread):
             today_path = log_dir / f"report_{time.strftime('%Y-%m-%d', time.localtime())}.log"
             yesterday_path = log_dir / f"report_{time.strftime('%Y-%m-%d', time.localtime(time.time() - 86400))}.log"
 
-            collected_lines: list[str] = []
-
             for path in (yesterday_path, today_path):
                 try:
                     if not path.exists():
                         path.touch(exist_ok=True)
                 except OSError as exc:
                     logger.warning(f"[StatusThread] 创建日志文件失败 {path}: {exc}")
-                    continue
-
-                for line in self.read_large_log_file(str(path)):
-                    collected_lines.append(line)
 
+            # 跨天时文件列表变化，重新加载
+            tail.set_files([str(yesterday_path), str(today_path)])
             try:
-                joined_text = "\n".join(collected_lines)
-                reversed_text = self.reverse_lines_efficient(joined_text)
+                lines, reset = tail.poll()
+                # 新日志在最上方；只有首次加载或文件被截断时整体刷新，否则只发送新增行
+                if reset or lines:
+                    self.update_status_main_signal.emit(tail.text(lines), reset)
             except Exception as exc:
                 logger.warning(f"[StatusThread] 处理状态日志失败: {exc}")
-                reversed_text = ""
-
-            self.update_status_main_signal.emit(reversed_text)
-
-            if event is not None and triggered:
-                event.clear()
         pass
 
     pass
 
     def stop(self):
         self._stop_requested = True
-        event = global_setting.get_setting("processing_done")
-        if event is not None:
-            event.set()
+        if self.subscription is not None:
+            self.subscription.close()
 
 
 
 class Tab_7(ThemedWidget):
-    update_status_main_signal_gui_update = pyqtSignal(str)
+    # (文本, 是否整体替换)；不整体替换时文本为新增日志，插入到最上方
+    update_status_main_signal_gui_update = pyqtSignal(str, bool)
 
     DEVICE_FL = "FL"
     DEVICE_YL = "YL"
@@ -173,6 +118,8 @@ class Tab_7(ThemedWidget):
         self.image_page = None
         self.video_page = None
         self.default_device = self.DEVICE_YL
+        self.ingest_label = None
+        self._ingest_text = None
         # 实例化ui
         self._init_ui(parent, geometry, title)
         # 实例化自定义ui
@@ -215,8 +162,44 @@ class Tab_7(ThemedWidget):
         self._init_media_panel()
         self.init_charts()
         self._connect_chart_events()
+        self._init_ingest_status()
         pass
 
+    def _init_ingest_status(self):
+        # 状态栏标题行显示接收积压 / 速率 / 暂停状态（IngestThrottle 写入 global_setting['ingest_metrics']）
+        header_layout = getattr(self.ui, "status_header_layout", None)
+        if header_layout is None:
+            logger.warning("[Tab7] 未找到状态栏标题布局，跳过接收状态显示")
+            return
+        self.ingest_label = QLabel(parent=self.ui.status_frame)
+        self.ingest_label.setObjectName("ingest_label")
+        header_layout.addWidget(self.ingest_label)
+        try:
+            interval = int(global_setting.get_setting('configer')['Status'].get('status_refresh_interval', 1000))
+        except Exception as exc:
+            logger.warning(f"[Tab7] 读取 Status.status_refresh_interval 失败，使用 1s: {exc}")
+            interval = 1000
+        self._ingest_timer = QTimer(self.frame)
+        self._ingest_timer.timeout.connect(self.update_ingest_status)
+        self._ingest_timer.start(max(200, interval))
+        self.update_ingest_status()
+
+    def update_ingest_status(self):
+        metrics = global_setting.get_setting("ingest_metrics")
+        if self.ingest_label is None or not metrics:
+            return
+        text = (
+            f"接收积压 {int(metrics['backlog'])} 张 | {metrics['ingest_per_min']:.1f} 张/分 | "
+            f"累计 {int(metrics['total'])} | 限流拒绝 {int(metrics['rejected'])}"
+            + (" | 已暂停接收" if metrics['paused'] else "")
+        )
+        if text == self._ingest_text:
+            return
+        self._ingest_text = text
+        self.ingest_label.setText(text)
+        # 暂停接收时标红提示
+        self.ingest_label.setStyleSheet("color:#d9534f;" if metrics['paused'] else "")
+
     def _init_media_panel(self):
         try:
             self.media_stack: QStackedWidget = self.frame.findChild(QStackedWidget, "media_stack")
@@ -293,7 +276,7 @@ class Tab_7(ThemedWidget):
         except Exception as e:
             logger.debug(f"[Tab7] 绑定图表数据信号失败: {e}")
 
-    def _on_chart_data_updated(self, _data):
+    def _on_chart_data_updated(self, _data, _full=True):
         if self.image_gallery is not None:
             self.image_gallery.on_data_updated()
 
@@ -411,13 +394,29 @@ class Tab_7(ThemedWidget):
         if isinstance(chart_threads, list) and self.status_thread not in chart_threads:
             chart_threads.append(self.status_thread)
 
-    def update_status_handle(self, text=""):
+    def update_status_handle(self, text="", reset=True):
         # 找到状态栏
         status_broswer :QTextBrowser= self.frame.findChild(QTextBrowser, "statusBrowser")
         if status_broswer is None:
             logger.warning("未找到status_broswer")
             return
-        status_broswer.setText(text)
+        if reset:
+            status_broswer.setPlainText(text)
+            return
+        # 新增日志插入到最上方，超出 max_line 的旧日志从末尾删除
+        scrollbar = status_broswer.verticalScrollBar()
+        scroll_value = scrollbar.value()
+        cursor = QTextCursor(status_broswer.document())
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.insertText(text + "\n")
+        max_line = self.status_thread.tail_max_line if self.status_thread is not None else 0
+        document = status_broswer.document()
+        if max_line > 0 and document.blockCount() > max_line:
+            cursor = QTextCursor(document.findBlockByNumber(max_line))
+            cursor.movePosition(QTextCursor.MoveOperation.PreviousCharacter)
+            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+        scrollbar.setValue(scroll_value)
         pass
     # 将ui文件转成py文件后 直接实例化该py文件里的类对象  uic工具转换之后就是这一段代码 应该是可以统一将文字改为其他语言
     def _retranslateUi(self, **kwargs):
@@ -19,11 +19,18 @@ from loguru import logger
 from config.global_setting import global_setting
 from config.ini_parser import ini_parser
 from index.all_windows import AllWindows
-from server.image_process import Img_process, report_writing  # immediate report writer reuse
+from server.archive import ArchiveManager
+from server.detection_store import DetectionStore
+from server.handoff import FrameHandoff
+from server.last_seen import SNAPSHOT_MARGIN, LastSeenSnapshot, device_key_from_uid, scan_record_dirs
+from server.image_process import Img_process, configure_inference, report_writing, start_detector_warmup  # immediate report writer reuse
+from server.record_index import record_indexes
+from server.report_store import flush_all as flush_reports
 import threading as _threading  # for lock
 from server.sender import Sender
 from server.server import Server
 from server.video_process import Video_process
+from util.refresh_bus import RefreshBus
 from theme.ThemeManager import ThemeManager
 
 
@@ -50,13 +57,15 @@ def _cleanup_dummy_threads():
         pass
 
 def bootstrap_last_seen_from_files():
-    """启动时扫描历史记录目录，推断各设备最近一次上报时间，填充 device_uids 与 last_seen_image。
+    """启动时恢复各设备最近一次上报时间，填充 device_uids 与 last_seen_image。
     规则：
+    - 先加载 <fold_path>/last_seen.json 快照（运行期间定期写入、退出时写入）
+    - 再扫描历史记录目录中修改时间晚于快照的文件；没有快照时全量扫描（各目录并行）
     - 目录: <fold_path>/<TYPE>_<Image_Process.fold_suffix>/
-    - 文件名：TYPE_XXXXXX_YYYY-MM-DD_HH-MM-SS.png
-    - 取同设备最新时间；转换为 epoch 存入 last_seen_image
-    - 同时将其 UID 构造成 AA{TYPE}-{XXXXXX}-BOOT 加入 device_uids（前缀 AA + TYPE 与发送端一致形式）
-    如果没有任何文件，不做任何修改。
+    - 文件名：TYPE_XXXXXX_YYYY-MM-DD_HH-MM-SS.png，取同设备最新时间；转换为 epoch 存入 last_seen_image
+    - 快照中已有该设备的 UID 时更新该 UID，否则将其 UID 构造成 AA{TYPE}-{XXXXXX}-BOOT 加入 device_uids
+      （前缀 AA + TYPE 与发送端一致形式）
+    如果快照与文件都没有数据，不做任何修改。
     """
     server_cfg = global_setting.get_setting("server_config")
     if not server_cfg:
@@ -65,52 +74,44 @@ def bootstrap_last_seen_from_files():
     record_suffix = server_cfg['Image_Process']['fold_suffix']  # e.g. record or FL_Record
     last_seen_image = global_setting.get_setting("last_seen_image") or {}
     device_uids = global_setting.get_setting("device_uids") or set()
-    updated = False
+
+    snapshot = LastSeenSnapshot.from_config(server_cfg)
+    global_setting.set_setting("last_seen_snapshot", snapshot)
+    started = time.perf_counter()
+    saved, saved_at = snapshot.load()
+    for uid, epoch_ts in saved.items():
+        if epoch_ts > last_seen_image.get(uid, 0):
+            last_seen_image[uid] = epoch_ts
+        device_uids.add(uid)
+    uid_by_device = {}
+    for uid in last_seen_image:
+        key = device_key_from_uid(uid)
+        # 同一设备优先使用正式 UID
+        if key is not None and (key not in uid_by_device or uid_by_device[key].endswith('-BOOT')):
+            uid_by_device[key] = uid
+
     # 支持的类型（与模拟 sender 一致）
     types = ["FL", "YL"]
-    for t in types:
-        record_dir = os.path.join(fold_path, f"{t}_{record_suffix}")
-        if not os.path.isdir(record_dir):
-            continue
-        try:
-            for fname in os.listdir(record_dir):
-                if not fname.lower().endswith('.png'):
-                    continue
-                parts = fname.split('_')
-                # 期望: TYPE, XXXXXX, YYYY-MM-DD, HH-MM-SS.png
-                if len(parts) < 4:
-                    continue
-                type_code = parts[0]
-                dev_num = parts[1]
-                date_part = parts[2]
-                time_part = parts[3].split('.')[0]
-                try:
-                    dt_str = f"{date_part} {time_part.replace('-',':')}"
-                    # 按与生成时格式对应解析
-                    dt = time.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-                    epoch_ts = time.mktime(dt)
-                except Exception:
-                    continue
-                # 构造 key 与 uid
-                chart_key = f"{type_code}_{dev_num}"  # 用于图表内部映射
-                # 构造发送时一致的 uid 结构: AA{TYPE}-{dev_num}-BOOT
-                uid = f"AA{type_code}-{dev_num}-BOOT"
-                # 更新最新时间
-                prev = last_seen_image.get(uid, 0)
-                if epoch_ts > prev:
-                    last_seen_image[uid] = epoch_ts
-                device_uids.add(uid)
-                updated = True
-        except Exception as e:
-            logger.warning(f"启动扫描目录失败 {record_dir}: {e}")
-    if updated:
+    since = saved_at - SNAPSHOT_MARGIN if saved_at > 0 else 0.0
+    record_dirs = [os.path.join(fold_path, f"{t}_{record_suffix}") for t in types]
+    scanned = scan_record_dirs(record_dirs, since=since)
+    for (type_code, dev_num), epoch_ts in scanned.items():
+        # 构造发送时一致的 uid 结构: AA{TYPE}-{dev_num}-BOOT
+        uid = uid_by_device.get((type_code.upper(), dev_num), f"AA{type_code}-{dev_num}-BOOT")
+        # 更新最新时间
+        if epoch_ts > last_seen_image.get(uid, 0):
+            last_seen_image[uid] = epoch_ts
+        device_uids.add(uid)
+    logger.info(
+        f"启动恢复 last_seen: 快照 {len(saved)} 台设备，"
+        f"{'增量' if saved_at > 0 else '全量'}扫描 {len(scanned)} 台设备，耗时 {time.perf_counter() - started:.2f}s"
+    )
+    snapshot.start(lambda: global_setting.get_setting("last_seen_image"))
+    if saved or scanned:
         global_setting.set_setting("last_seen_image", last_seen_image)
         global_setting.set_setting("device_uids", device_uids)
-        # 触发一次图表刷新：设置 processing_done 事件（数据线程会读取最新 CSV, 若无则仍显示时间标签 0s/年龄）
-        try:
-            global_setting.get_setting("processing_done").set()
-        except Exception:
-            pass
+        # 触发一次图表刷新（数据线程会读取最新数据, 若无则仍显示时间标签 0s/年龄）
+        global_setting.get_setting("refresh_bus").publish("devices")
         logger.info(f"启动初始化 last_seen 完成，设备数={len(device_uids)}")
 
 def load_global_setting():
@@ -138,6 +139,8 @@ def load_global_setting():
     global_setting.set_setting("active_video_devices", set())
     # 用于指示图像处理任务的完成状态
     global_setting.set_setting("processing_done",threading.Event())
+    # 界面刷新总线：各界面线程独立订阅、按合并窗口刷新（processing_done 仅为兼容保留）
+    global_setting.set_setting("refresh_bus", RefreshBus(legacy_event=global_setting.get_setting("processing_done")))
     global_setting.set_setting("chart_threads", [])
     # 加载gui配置存储到全局类中
     ini_parser_obj = ini_parser()
@@ -167,6 +170,16 @@ def load_global_setting():
                                  file_name_preffix=server_cfg['Storage']['report_file_name_preffix'],
                                  file_name_suffix=server_cfg['Storage']['report_file_name_suffix'])
         global_setting.set_setting("global_report_writer", writer)
+        # 检测结果库（[Storage] detection_db 为空时不启用）
+        store = DetectionStore.from_config(server_cfg)
+        if store is not None:
+            latest = writer.get_latest_file(writer.file_direct_path)
+            if latest is not None:
+                writer.file_path = latest
+                seeded = store.seed_from_report(writer.csv_read_not_dict())
+                if seeded:
+                    logger.info(f"[DetectionStore] 从报告 {os.path.basename(latest)} 导入 {seeded} 台设备的最新数据")
+        global_setting.set_setting("detection_store", store)
     pass
 
 
@@ -228,6 +241,18 @@ def quit_qt_application():
         if getattr(video_process_thread, 'isRunning', None) and video_process_thread.isRunning():
             logger.warning("video_process_thread still running after join timeout")
 
+    # 写出尚未落盘的报告快照
+    flush_reports()
+    detection_store = global_setting.get_setting("detection_store")
+    if detection_store is not None:
+        detection_store.close()
+    last_seen_snapshot = global_setting.get_setting("last_seen_snapshot")
+    if last_seen_snapshot is not None:
+        last_seen_snapshot.stop(global_setting.get_setting("last_seen_image"))
+    archive_manager = global_setting.get_setting("archive_manager")
+    if archive_manager is not None:
+        archive_manager.stop()
+
     chart_threads = global_setting.get_setting("chart_threads") or []
     seen_threads = set()
     for chart_thread in chart_threads:
@@ -341,8 +366,14 @@ if __name__ == "__main__" and os.path.basename(__file__) == "main.py":
     logger.info("loading config finish")
     # 启动前扫描历史记录初始化 last_seen
     bootstrap_last_seen_from_files()
+    # 推理会话参数（[Inference]），启动时输出实际生效的值
+    configure_inference(global_setting.get_setting("server_config"))
+    # 可选：后台预热 FL/YL 模型，避免开机后第一张图片等待模型加载
+    start_detector_warmup(["FL", "YL"])
 
     server_cfg = global_setting.get_setting("server_config")
+    # 可选：接收线程解密后的图片直接交给图像处理线程，Temp 文件仅作崩溃恢复日志
+    global_setting.set_setting("image_handoff", FrameHandoff.from_config(server_cfg.get("Image_Process", {})))
     try:
         port = int(server_cfg["Server"]["port"])
     except Exception as e:
@@ -446,6 +477,12 @@ if __name__ == "__main__" and os.path.basename(__file__) == "main.py":
         report_file_name_suffix=server_cfg['Storage']['report_file_name_suffix'],
     )
     image_process_thread.image_process_remains()
+    # Record 目录后台维护：迁移旧的平铺文件到日分区、打包旧日期、按保留策略清理
+    archive_manager = ArchiveManager.from_config(
+        server_cfg, img_types, on_added=record_indexes.notify_archived, on_removed=record_indexes.notify_removed
+    )
+    global_setting.set_setting("archive_manager", archive_manager)
+    archive_manager.start()
     try:
         logger.info("image_process_thread |子线程开始运行")
         image_process_thread.start()
@@ -0,0 +1,441 @@
+"""Record 归档目录的分区布局、查询接口与后台维护。
+
+原先所有识别结果平铺在 ``<TYPE>_Record/`` 下，目录越大列目录越慢，且从不清理。现在：
+- 新文件按文件名中的采集日期写入 ``<TYPE>_Record/YYYY/MM/DD/``（文件名无法解析日期时仍放在根目录）；
+- 超过 bundle_after_days 的日分区打包为同级的 ``DD.zip``，原目录删除；
+- 按保留天数 / 总大小上限从最早的日期开始删除；
+- 旧的平铺文件由 ArchiveManager 在后台迁移到分区目录。
+所有读取 Record 目录的代码都通过 iter_images / locate / read_image_bytes 访问，不直接列目录。
+Temp 目录中的文件在每轮处理后即被取走，仍保持平铺。
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from server.detect import IMAGE_EXTENSIONS
+from server.detection_sidecar import SIDECAR_SUFFIX
+
+BUNDLE_SUFFIX = ".zip"
+# 归档编码策略可能生成 WebP
+ARCHIVE_EXTENSIONS = frozenset(IMAGE_EXTENSIONS | {".webp"})
+
+
+class ArchivedImage(NamedTuple):
+    name: str
+    path: Path  # 打包的图片为所在 zip 文件
+    mtime: float
+    bundled: bool = False
+
+
+def capture_day(name: str) -> Optional[Tuple[str, str, str]]:
+    """TYPE_XXXXXX_YYYY-MM-DD_HH-MM-SS.png -> ('YYYY', 'MM', 'DD')。"""
+    parts = name.split("_")
+    if len(parts) < 3:
+        return None
+    day = parts[2].split("-")
+    if len(day) != 3 or not all(p.isdigit() for p in day) or len(day[0]) != 4:
+        return None
+    return day[0], day[1].zfill(2), day[2].zfill(2)
+
+
+def partition_dir(record_dir: Path, name: str) -> Path:
+    day = capture_day(name)
+    return record_dir.joinpath(*day) if day else record_dir
+
+
+def _is_image(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in ARCHIVE_EXTENSIONS
+
+
+def _sorted_subdirs(directory: Path, width: int) -> List[str]:
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(e.name for e in entries if e.is_dir() and len(e.name) == width and e.name.isdigit())
+    except OSError:
+        return []
+
+
+def iter_days(record_dir: Path) -> Iterator[Tuple[str, Path, bool]]:
+    """按日期升序返回 (YYYY-MM-DD, 日分区目录或 zip, 是否已打包)。"""
+    record_dir = Path(record_dir)
+    for year in _sorted_subdirs(record_dir, 4):
+        year_dir = record_dir / year
+        for month in _sorted_subdirs(year_dir, 2):
+            month_dir = year_dir / month
+            days: Dict[str, Tuple[Path, bool]] = {}
+            try:
+                with os.scandir(month_dir) as entries:
+                    for entry in entries:
+                        stem, suffix = os.path.splitext(entry.name)
+                        if entry.is_dir() and len(entry.name) == 2 and entry.name.isdigit():
+                            days.setdefault(entry.name, (Path(entry.path), False))
+                        elif suffix == BUNDLE_SUFFIX and len(stem) == 2 and stem.isdigit():
+                            # 打包过程中目录与 zip 可能同时存在，以目录为准
+                            days.setdefault(stem, (Path(entry.path), True))
+            except OSError:
+                continue
+            for day in sorted(days):
+                path, bundled = days[day]
+                yield f"{year}-{month}-{day}", path, bundled
+
+
+def _iter_dir_images(directory: Path, since: float) -> Iterator[ArchivedImage]:
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not _is_image(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if since > 0 and mtime <= since:
+                    continue
+                yield ArchivedImage(entry.name, Path(entry.path), mtime)
+    except FileNotFoundError:
+        return
+    except OSError as exc:
+        logger.warning(f"[Archive] 读取目录失败 {directory}: {exc}")
+
+
+def _iter_bundle_images(bundle: Path, since: float) -> Iterator[ArchivedImage]:
+    try:
+        with zipfile.ZipFile(bundle) as archive:
+            infos = archive.infolist()
+    except (OSError, zipfile.BadZipFile) as exc:
+        logger.warning(f"[Archive] 读取打包文件失败 {bundle}: {exc}")
+        return
+    for info in infos:
+        if not _is_image(info.filename):
+            continue
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        if since > 0 and mtime <= since:
+            continue
+        yield ArchivedImage(info.filename, bundle, mtime, True)
+
+
+def iter_partitions(record_dir: Path, since: float = 0.0, include_bundles: bool = False) -> Iterator[Tuple[Path, bool]]:
+    """
+    iter_images 的扫描单元 (目录或 zip, 是否已打包)：Record 根目录（尚未迁移的平铺文件）+ 各日分区（+ 打包文件）
+    since > 0 时修改时间不晚于 since 的日分区整体跳过；各单元可独立并行列出
+    """
+    record_dir = Path(record_dir)
+    yield record_dir, False
+    for _, path, bundled in iter_days(record_dir):
+        if bundled and not include_bundles:
+            continue
+        if since > 0 and _mtime(path) <= since:
+            continue
+        yield path, bundled
+
+
+def iter_partition_images(path: Path, bundled: bool, since: float = 0.0) -> Iterator[ArchivedImage]:
+    """列出单个扫描单元中的图片。"""
+    return _iter_bundle_images(path, since) if bundled else _iter_dir_images(path, since)
+
+
+def iter_images(record_dir: Path, since: float = 0.0, include_bundles: bool = False) -> Iterator[ArchivedImage]:
+    """
+    列出 Record 目录中的图片：根目录中尚未迁移的平铺文件 + 各日分区（+ 打包文件）
+    since > 0 时只返回修改时间晚于 since 的文件，目录修改时间不晚于 since 的日分区整体跳过
+    """
+    for path, bundled in iter_partitions(record_dir, since, include_bundles):
+        yield from iter_partition_images(path, bundled, since)
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def _size(path: Path) -> int:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def _files_size(directory: Path, archive_only: bool = False) -> int:
+    """目录中文件的总大小（不递归）；archive_only 时只统计图片与检测结果附属文件。"""
+    total = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if archive_only and not (_is_image(entry.name) or entry.name.endswith(SIDECAR_SUFFIX)):
+                    continue
+                try:
+                    if entry.is_file():
+                        total += entry.stat().st_size
+                except OSError:
+                    continue
+    except OSError:
+        return 0
+    return total
+
+
+def locate(record_dir: Path, name: str) -> Optional[ArchivedImage]:
+    """按文件名查找归档图片（日分区 -> 平铺 -> 打包文件），不列目录。"""
+    record_dir = Path(record_dir)
+    for directory in (partition_dir(record_dir, name), record_dir):
+        path = directory / name
+        try:
+            return ArchivedImage(name, path, os.stat(path).st_mtime)
+        except OSError:
+            continue
+    day = capture_day(name)
+    if day is None:
+        return None
+    bundle = record_dir / day[0] / day[1] / f"{day[2]}{BUNDLE_SUFFIX}"
+    try:
+        with zipfile.ZipFile(bundle) as archive:
+            info = archive.getinfo(name)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+    return ArchivedImage(name, bundle, time.mktime(info.date_time + (0, 0, -1)), True)
+
+
+def read_image_bytes(record_dir: Path, name: str) -> Optional[bytes]:
+    image = locate(record_dir, name)
+    if image is None:
+        return None
+    try:
+        if image.bundled:
+            with zipfile.ZipFile(image.path) as archive:
+                return archive.read(name)
+        return image.path.read_bytes()
+    except (OSError, KeyError, zipfile.BadZipFile) as exc:
+        logger.warning(f"[Archive] 读取归档图片失败 {name}: {exc}")
+        return None
+
+
+class ArchiveManager:
+    """
+    后台维护 Record 目录：迁移平铺文件、打包旧的日分区、按保留策略删除
+    on_added / on_removed 在图片移入分区或从目录中移除时调用（用于同步图库索引）；
+    删除已打包的日期时，对其中每张图片以 ``<DD.zip>/<文件名>`` 调用 on_removed
+    """
+
+    def __init__(
+        self,
+        record_dirs: Sequence[Path],
+        bundle_after_days: int = 0,
+        retention_days: int = 0,
+        max_total_mb: float = 0,
+        interval: float = 3600.0,
+        on_added: Optional[Callable[[Path], None]] = None,
+        on_removed: Optional[Callable[[Path], None]] = None,
+    ) -> None:
+        self.record_dirs = [Path(d) for d in record_dirs]
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.bundle_after_days = max(0, int(bundle_after_days))
+        self.retention_days = max(0, int(retention_days))
+        self.max_total_bytes = int(max(0.0, float(max_total_mb)) * 1024 * 1024)
+        self.interval = max(60.0, float(interval))
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, server_cfg, types: Sequence[str], **kwargs) -> "ArchiveManager":
+        base = Path(server_cfg["Storage"]["fold_path"])
+        suffix = server_cfg["Image_Process"]["fold_suffix"]
+        section = server_cfg["Archive"] if "Archive" in server_cfg else {}
+        values = {}
+        for key, default in (
+            ("bundle_after_days", 0),
+            ("retention_days", 0),
+            ("max_total_mb", 0),
+            ("maintenance_interval", 3600),
+        ):
+            try:
+                values[key] = float(section.get(key, default))
+            except (TypeError, ValueError):
+                logger.warning(f"Archive.{key} 配置无效，使用默认值 {default}")
+                values[key] = float(default)
+        return cls(
+            [base / f"{t}_{suffix}" for t in types],
+            bundle_after_days=int(values["bundle_after_days"]),
+            retention_days=int(values["retention_days"]),
+            max_total_mb=values["max_total_mb"],
+            interval=values["maintenance_interval"],
+            **kwargs,
+        )
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="archive_maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        for record_dir in self.record_dirs:
+            if self._stop_event.is_set():
+                return
+            self.migrate_flat(record_dir)
+        while not self._stop_event.is_set():
+            for record_dir in self.record_dirs:
+                if self._stop_event.is_set():
+                    return
+                try:
+                    self.bundle_old_days(record_dir)
+                    self.apply_retention(record_dir)
+                except Exception as exc:
+                    logger.error(f"[Archive] 维护 {record_dir} 失败: {exc}")
+            self._stop_event.wait(self.interval)
+
+    # ------------------------------------------------------------------
+    # 迁移
+    # ------------------------------------------------------------------
+    def migrate_flat(self, record_dir: Path) -> int:
+        """把根目录中的平铺图片移入日分区，返回迁移数量。"""
+        moved = 0
+        started = time.perf_counter()
+        for image in list(_iter_dir_images(record_dir, 0.0)):
+            if self._stop_event.is_set():
+                break
+            target_dir = partition_dir(record_dir, image.name)
+            if target_dir == record_dir:
+                continue
+            target = target_dir / image.name
+            try:
+                target_dir.mkdir(parents=True, exist_ok=True)
+                os.replace(image.path, target)
+            except OSError as exc:
+                logger.warning(f"[Archive] 迁移失败 {image.path}: {exc}")
+                continue
+            if self.on_added is not None:
+                self.on_added(target)
+            moved += 1
+        if moved:
+            logger.info(f"[Archive] {record_dir} 迁移 {moved} 个平铺文件到日分区，耗时 {time.perf_counter() - started:.1f}s")
+        return moved
+
+    # ------------------------------------------------------------------
+    # 打包与清理
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _cutoff(days: int) -> str:
+        return time.strftime("%Y-%m-%d", time.localtime(time.time() - days * 86400))
+
+    def bundle_old_days(self, record_dir: Path) -> int:
+        """把早于 bundle_after_days 的日分区打包为 zip，返回打包的天数。"""
+        if self.bundle_after_days <= 0:
+            return 0
+        cutoff = self._cutoff(self.bundle_after_days)
+        bundled = 0
+        for day, path, is_bundle in list(iter_days(record_dir)):
+            if day >= cutoff or self._stop_event.is_set():
+                break
+            if is_bundle:
+                continue
+            if self._bundle_day(path):
+                bundled += 1
+        return bundled
+
+    def _bundle_day(self, day_dir: Path) -> bool:
+        bundle = day_dir.with_name(day_dir.name + BUNDLE_SUFFIX)
+        part = bundle.with_name(bundle.name + ".part")
+        files = [p for p in day_dir.iterdir() if p.is_file()]
+        try:
+            # 已有同日打包文件时（例如补归档）先合并原有内容
+            if bundle.exists():
+                shutil.copyfile(bundle, part)
+                mode = "a"
+            else:
+                mode = "w"
+            with zipfile.ZipFile(part, mode, compression=zipfile.ZIP_DEFLATED) as archive:
+                existing = set(archive.namelist())
+                for path in files:
+                    if path.name not in existing:
+                        archive.write(path, arcname=path.name)
+            os.replace(part, bundle)
+        except (OSError, zipfile.BadZipFile) as exc:
+            logger.error(f"[Archive] 打包 {day_dir} 失败: {exc}")
+            try:
+                part.unlink(missing_ok=True)
+            except OSError:
+                pass
+            return False
+        for path in files:
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            if self.on_removed is not None:
+                self.on_removed(path)
+        try:
+            day_dir.rmdir()
+        except OSError:
+            # 打包期间又有新文件写入，留待下次打包
+            pass
+        logger.info(f"[Archive] 已打包 {day_dir} -> {bundle.name}（{len(files)} 个文件）")
+        return True
+
+    def apply_retention(self, record_dir: Path) -> int:
+        """删除超过保留天数、或超出总大小上限的最早日期，返回删除的天数；当天的分区不删除。"""
+        if self.retention_days <= 0 and self.max_total_bytes <= 0:
+            return 0
+        today = time.strftime("%Y-%m-%d")
+        days = list(iter_days(record_dir))
+        removed = 0
+        if self.retention_days > 0:
+            cutoff = self._cutoff(self.retention_days)
+            while days and days[0][0] < cutoff and days[0][0] < today:
+                self._remove_day(*days.pop(0))
+                removed += 1
+        if self.max_total_bytes > 0:
+            # 日分区中的图片、.det.json 附属文件都计入；根目录只统计尚未迁移的图片及其附属文件
+            sizes = [self._day_size(path, bundled) for _, path, bundled in days]
+            total = sum(sizes) + _files_size(record_dir, archive_only=True)
+            while days and total > self.max_total_bytes and days[0][0] < today:
+                self._remove_day(*days.pop(0))
+                total -= sizes.pop(0)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _day_size(path: Path, bundled: bool) -> int:
+        if bundled:
+            return _size(path)
+        return _files_size(path)
+
+    def _remove_day(self, day: str, path: Path, bundled: bool) -> None:
+        try:
+            if bundled:
+                removed = [path / image.name for image in _iter_bundle_images(path, 0.0)]
+                path.unlink()
+            else:
+                removed = [image.path for image in _iter_dir_images(path, 0.0)]
+                shutil.rmtree(path)
+        except OSError as exc:
+            logger.warning(f"[Archive] 删除 {day} 的归档失败 {path}: {exc}")
+            return
+        if self.on_removed is not None:
+            for image_path in removed:
+                self.on_removed(image_path)
+        logger.info(f"[Archive] 按保留策略删除 {day} 的归档 {path}")
+        for parent in (path.parent, path.parent.parent):
+            # 空的月/年目录一并删除
+            try:
+                parent.rmdir()
+            except OSError:
+                break
@@ -0,0 +1,102 @@
+"""识别结果归档的编码策略（[Archive] encoding，可按设备类型覆盖）。
+
+- png：无损 PNG（原行为），png_compression 为 zlib 压缩级别；
+- jpeg / webp：按 quality 有损编码，体积与编码耗时都远小于全分辨率 PNG；
+- original：不绘制标注框、不重新编码，直接保存原图字节，图库显示时按同名 ``.det.json``
+  附属文件（每张归档图片都会写）绘制检测框。
+max_dimension > 0 时标注图在编码前缩小到最长边不超过该值（original 模式保存原图，不缩放）。
+
+默认仍为 png：归档图片自带检测框，在程序外打开 Record 也能看到结果。接收流程省去
+绘制与重新编码的收益只在显式配置 encoding = original（或按类型 encoding_fl/encoding_yl）时才有。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+import cv2
+from loguru import logger
+
+from config.global_setting import global_setting
+
+ENCODING_MODES = ("png", "jpeg", "webp", "original")
+
+_SUFFIXES = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+
+@dataclass(frozen=True)
+class ArchiveEncoding:
+    mode: str = "png"
+    quality: int = 90
+    png_compression: int = 1
+    max_dimension: int = 0
+
+    @property
+    def burn_in(self) -> bool:
+        """是否把检测框画进归档图片；original 模式改为写附属文件。"""
+        return self.mode != "original"
+
+    @property
+    def suffix(self) -> Optional[str]:
+        """归档文件扩展名；original 模式沿用原文件扩展名，返回 None。"""
+        return _SUFFIXES.get(self.mode)
+
+    def encode(self, image: Any) -> bytes:
+        height, width = image.shape[:2]
+        if self.max_dimension > 0 and max(height, width) > self.max_dimension:
+            scale = self.max_dimension / float(max(height, width))
+            image = cv2.resize(
+                image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+            )
+        if self.mode == "jpeg":
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        elif self.mode == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        else:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        ok, buffer = cv2.imencode(self.suffix or ".png", image, params)
+        if not ok:
+            raise IOError(f"cv2.imencode({self.mode}) 返回 False")
+        return buffer.tobytes()
+
+    @classmethod
+    def from_mapping(cls, section: Mapping[str, str], type_code: str = "") -> "ArchiveEncoding":
+        """读取 encoding / quality / png_compression / max_dimension，encoding_fl 等按类型覆盖。"""
+        suffix = f"_{type_code.lower()}" if type_code else ""
+
+        def value(key: str, default):
+            return section.get(f"{key}{suffix}", section.get(key, default))
+
+        mode = str(value("encoding", cls.mode)).strip().lower()
+        if mode == "jpg":
+            mode = "jpeg"
+        if mode not in ENCODING_MODES:
+            raise ValueError(f"encoding={mode} 无效，可选 {'/'.join(ENCODING_MODES)}")
+        return cls(
+            mode=mode,
+            quality=min(100, max(1, int(value("quality", cls.quality)))),
+            png_compression=min(9, max(0, int(value("png_compression", cls.png_compression)))),
+            max_dimension=max(0, int(value("max_dimension", cls.max_dimension))),
+        )
+
+
+_ENCODINGS: Dict[str, ArchiveEncoding] = {}
+
+
+def archive_encoding_for(type_code: str) -> ArchiveEncoding:
+    """按设备类型返回归档编码策略（首次使用时从 server_config 读取并缓存）。"""
+    type_key = (type_code or "").upper()
+    encoding = _ENCODINGS.get(type_key)
+    if encoding is not None:
+        return encoding
+    server_cfg = global_setting.get_setting("server_config") or {}
+    section = server_cfg["Archive"] if "Archive" in server_cfg else {}
+    try:
+        encoding = ArchiveEncoding.from_mapping(section, type_key)
+    except (TypeError, ValueError) as exc:
+        logger.warning(f"[Archive] {type_key} 编码配置无效，使用无损 PNG: {exc}")
+        encoding = ArchiveEncoding()
+    logger.info(f"[Archive] {type_key} 归档编码: {encoding}")
+    _ENCODINGS[type_key] = encoding
+    return encoding
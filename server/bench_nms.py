@@ -0,0 +1,90 @@
+"""Micro-benchmark and regression check for class-aware NMS.
+
+Runs the legacy per-class ``nms`` loop and ``batched_nms`` on the same
+synthetic crowded-trap candidates and verifies that both keep the same boxes
+before reporting timings. Exits with status 1 on any mismatch.
+
+Usage:
+    python -m server.bench_nms --candidates 8400 --classes 2 --rounds 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from server.detect import batched_nms, nms
+
+
+def legacy_class_nms(
+    boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, iou_threshold: float
+) -> List[Tuple[int, int]]:
+    """Reference result of the original ``_postprocess`` loop as (class_id, index) pairs."""
+
+    kept: List[Tuple[int, int]] = []
+    index = np.arange(len(boxes))
+    for class_id in np.unique(class_ids):
+        class_mask = class_ids == class_id
+        keep_indices = nms(boxes[class_mask], scores[class_mask], iou_threshold)
+        kept.extend((int(class_id), int(i)) for i in index[class_mask][keep_indices])
+    return sorted(kept)
+
+
+def make_candidates(count: int, classes: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    # Clusters of jittered boxes mimic many anchors firing on the same insect
+    centers = rng.uniform(20, 620, size=(max(1, count // 20), 2))
+    picks = centers[rng.integers(0, len(centers), size=count)] + rng.normal(0, 3, size=(count, 2))
+    sizes = rng.uniform(8, 40, size=(count, 2))
+    boxes = np.concatenate((picks - sizes / 2, picks + sizes / 2), axis=1).astype(np.float32)
+    # Unique scores keep the greedy order well-defined for both implementations
+    scores = rng.permutation(count).astype(np.float32) / count * 0.7 + 0.3
+    class_ids = rng.integers(0, classes, size=count)
+    return boxes, scores, class_ids
+
+
+def run_benchmark(count: int, classes: int, iou_threshold: float, rounds: int) -> bool:
+    boxes, scores, class_ids = make_candidates(count, classes)
+
+    expected = legacy_class_nms(boxes, scores, class_ids, iou_threshold)
+    actual = sorted((int(class_ids[i]), int(i)) for i in batched_nms(boxes, scores, class_ids, iou_threshold))
+    if expected != actual:
+        print(f"[ERROR] batched_nms kept {len(actual)} boxes, legacy kept {len(expected)}")
+        return False
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy_class_nms(boxes, scores, class_ids, iou_threshold)
+    legacy_ms = (time.perf_counter() - start) * 1000 / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        batched_nms(boxes, scores, class_ids, iou_threshold)
+    batched_ms = (time.perf_counter() - start) * 1000 / rounds
+
+    print(f"[INFO] {count} candidates, {classes} classes, iou={iou_threshold}: {len(expected)} kept (identical)")
+    print(f"        - legacy  : {legacy_ms:8.3f} ms")
+    print(f"        - batched : {batched_ms:8.3f} ms")
+    return True
+
+
+def run_cli(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark and cross-check class-aware NMS")
+    parser.add_argument("--candidates", type=int, default=8400, help="Boxes above the confidence threshold")
+    parser.add_argument("--classes", type=int, default=2, help="Number of classes")
+    parser.add_argument("--iou", type=float, default=0.3, help="IoU threshold")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed repetitions")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    ok = True
+    for count in sorted({100, 1000, args.candidates}):
+        ok = run_benchmark(count, args.classes, args.iou, args.rounds) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(run_cli())
@@ -9,9 +9,11 @@ Suppression, and saves annotated predictions.
 from __future__ import annotations
 
 import argparse
+import hashlib
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence, Tuple
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
@@ -31,6 +33,113 @@ class Detection:
     box: Tuple[float, float, float, float]  # x1, y1, x2, y2 in original image coordinates
 
 
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    """ONNX Runtime session tuning shared by every detector session."""
+
+    intra_op_threads: int = 0  # 0 lets onnxruntime decide
+    inter_op_threads: int = 0
+    execution_mode: str = "sequential"
+    graph_optimization_level: str = "all"
+    optimized_model_path: str = ""  # empty disables; "{tag}" is replaced per model
+    enable_cpu_mem_arena: bool = True
+    enable_mem_pattern: bool = True
+    model_cache: bool = True  # persist the optimized graph next to the model
+    warmup: bool = False  # run a dummy tensor through each session at startup
+
+    @classmethod
+    def from_mapping(cls, section: Mapping[str, str]) -> "InferenceProfile":
+        """Build a profile from an ini section, raising ValueError on bad values."""
+
+        def _bool(key: str, default: bool) -> bool:
+            raw = str(section.get(key, int(default))).strip().lower()
+            if raw in ("1", "true", "yes", "on"):
+                return True
+            if raw in ("0", "false", "no", "off"):
+                return False
+            raise ValueError(f"{key} must be 0/1, got {raw!r}")
+
+        profile = cls(
+            intra_op_threads=int(section.get("intra_op_threads", 0)),
+            inter_op_threads=int(section.get("inter_op_threads", 0)),
+            execution_mode=str(section.get("execution_mode", "sequential")).strip().lower(),
+            graph_optimization_level=str(section.get("graph_optimization_level", "all")).strip().lower(),
+            optimized_model_path=str(section.get("optimized_model_path", "")).strip(),
+            enable_cpu_mem_arena=_bool("enable_cpu_mem_arena", True),
+            enable_mem_pattern=_bool("enable_mem_pattern", True),
+            model_cache=_bool("model_cache", True),
+            warmup=_bool("warmup", False),
+        )
+        if profile.intra_op_threads < 0 or profile.inter_op_threads < 0:
+            raise ValueError("thread counts must be >= 0")
+        if profile.execution_mode not in _EXECUTION_MODES:
+            raise ValueError(f"execution_mode must be one of {sorted(_EXECUTION_MODES)}")
+        if profile.graph_optimization_level not in _GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"graph_optimization_level must be one of {sorted(_GRAPH_OPTIMIZATION_LEVELS)}")
+        return profile
+
+    def session_options(self, tag: str = "", preoptimized: bool = False) -> ort.SessionOptions:
+        """Build SessionOptions; ``preoptimized`` skips graph optimization for cached models."""
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = _EXECUTION_MODES[self.execution_mode]
+        options.enable_cpu_mem_arena = self.enable_cpu_mem_arena
+        options.enable_mem_pattern = self.enable_mem_pattern
+        if preoptimized:
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return options
+        options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[self.graph_optimization_level]
+        if self.optimized_model_path:
+            options.optimized_model_filepath = self.optimized_model_path.replace("{tag}", tag)
+        return options
+
+
+def model_cache_path(model_path: Path, optimization_level: str) -> Path:
+    """Location of the serialized optimized graph for a model file.
+
+    The name is keyed by the model's content hash, the optimization level and
+    the onnxruntime version, so a replaced model or an upgraded runtime never
+    picks up a stale cache.
+    """
+
+    model_path = Path(model_path)
+    digest = hashlib.sha256()
+    with model_path.open("rb") as stream:
+        for chunk in iter(lambda: stream.read(1 << 20), b""):
+            digest.update(chunk)
+    key = f"{digest.hexdigest()[:16]}-{optimization_level}-ort{ort.__version__}"
+    return model_path.with_name(f"{model_path.stem}.{key}.opt.onnx")
+
+
+def describe_session_options(options: ort.SessionOptions) -> str:
+    """One-line summary of the values a session actually runs with."""
+
+    return (
+        f"intra_op_threads={options.intra_op_num_threads} "
+        f"inter_op_threads={options.inter_op_num_threads} "
+        f"execution_mode={options.execution_mode.name} "
+        f"graph_optimization_level={options.graph_optimization_level.name} "
+        f"cpu_mem_arena={options.enable_cpu_mem_arena} "
+        f"mem_pattern={options.enable_mem_pattern} "
+        f"optimized_model={options.optimized_model_filepath or '-'}"
+    )
+
+
 class OnnxYoloDetector:
     """Minimal YOLOv8 ONNX inference wrapper built on ONNX Runtime."""
 
@@ -42,6 +151,9 @@ class OnnxYoloDetector:
         conf_threshold: float = 0.25,
         iou_threshold: float = 0.6,
         providers: Optional[Sequence[str]] = None,
+        nms_top_k: int = 0,
+        max_det: int = 0,
+        session_options: Optional[ort.SessionOptions] = None,
     ) -> None:
         self.model_path = Path(model_path)
         if not self.model_path.exists():
@@ -51,12 +163,25 @@ class OnnxYoloDetector:
         self.imgsz = imgsz
         self.conf_threshold = conf_threshold
         self.iou_threshold = iou_threshold
+        self.nms_top_k = nms_top_k  # 0 keeps every candidate above conf_threshold
+        self.max_det = max_det  # 0 disables the per-image detection cap
 
         self.session = ort.InferenceSession(
-            str(self.model_path), providers=list(providers or self._default_providers())
+            str(self.model_path),
+            sess_options=session_options,
+            providers=list(providers or self._default_providers()),
         )
         self.input_name = self.session.get_inputs()[0].name
         self.output_names = [output.name for output in self.session.get_outputs()]
+        # Static batch dimension of the exported model (None when dynamic)
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        self.max_batch_size: Optional[int] = batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+        self.preprocessor = LetterboxPreprocessor(imgsz)
+
+    def warmup(self) -> None:
+        """Run one dummy frame so lazy allocations happen before the first real image."""
+
+        self.predict(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
 
     def _default_providers(self) -> Sequence[str]:
         available = ort.get_available_providers()
@@ -77,19 +202,41 @@ class OnnxYoloDetector:
         return image, detections
 
     def predict(self, image: np.ndarray) -> List[Detection]:
-        original_shape = image.shape[:2]  # (h, w)
-        processed, ratio, pad = letterbox(image, (self.imgsz, self.imgsz))
-        rgb = cv2.cvtColor(processed, cv2.COLOR_BGR2RGB)
-        tensor = rgb.astype(np.float32) / 255.0
-        tensor = np.transpose(tensor, (2, 0, 1))  # HWC -> CHW
-        tensor = np.expand_dims(tensor, axis=0)  # Add batch dimension
-
-        outputs = self.session.run(self.output_names, {self.input_name: tensor})
-        if not outputs:
+        return self._predict_chunk([image])[0]
+
+    def predict_batch(self, images: Sequence[np.ndarray]) -> List[List[Detection]]:
+        """Run inference on several frames with a single session call.
+
+        Frames are letterboxed into one NCHW tensor and the output is split back
+        per image. Models exported with a fixed batch dimension fall back to
+        chunks of that size.
+        """
+
+        if not images:
             return []
 
-        detections = self._postprocess(outputs[0], ratio, pad, original_shape)
-        return detections
+        results: List[List[Detection]] = []
+        chunk = self.max_batch_size or len(images)
+        for start in range(0, len(images), chunk):
+            results.extend(self._predict_chunk(images[start : start + chunk]))
+        return results
+
+    def _predict_chunk(self, images: Sequence[np.ndarray]) -> List[List[Detection]]:
+        batch = self.preprocessor.batch_buffer(len(images))
+        metas = []
+        for idx, image in enumerate(images):
+            ratio, pad = self.preprocessor.fill(image, batch[idx])
+            metas.append((ratio, pad, image.shape[:2]))
+
+        outputs = self.session.run(self.output_names, {self.input_name: batch})
+        if not outputs:
+            return [[] for _ in images]
+
+        output = np.asarray(outputs[0])
+        return [
+            self._postprocess(output[idx], ratio, pad, original_shape)
+            for idx, (ratio, pad, original_shape) in enumerate(metas)
+        ]
 
     def annotate(self, image: np.ndarray, detections: Sequence[Detection]) -> np.ndarray:
         annotated = image.copy()
@@ -145,35 +292,32 @@ class OnnxYoloDetector:
         best_class_ids = best_class_ids[conf_mask]
         boxes_xyxy = xywh_to_xyxy(boxes)
 
-        detections: List[Detection] = []
-        for class_id in np.unique(best_class_ids):
-            class_mask = best_class_ids == class_id
-            boxes_cls = boxes_xyxy[class_mask]
-            scores_cls = best_scores[class_mask]
-            keep_indices = nms(boxes_cls, scores_cls, self.iou_threshold)
-            if not keep_indices:
-                continue
-
-            scaled_boxes = scale_boxes(boxes_cls[keep_indices], ratio, pad, original_shape)
-            for box, score in zip(scaled_boxes, scores_cls[keep_indices]):
-                detections.append(
-                    Detection(class_id=int(class_id), score=float(score), box=tuple(map(float, box)))
-                )
+        keep_indices = batched_nms(
+            boxes_xyxy,
+            best_scores,
+            best_class_ids,
+            self.iou_threshold,
+            top_k=self.nms_top_k,
+            max_det=self.max_det,
+        )
+        if keep_indices.size == 0:
+            return []
+
+        scaled_boxes = scale_boxes(boxes_xyxy[keep_indices], ratio, pad, original_shape)
+        detections: List[Detection] = [
+            Detection(class_id=int(class_id), score=float(score), box=tuple(map(float, box)))
+            for box, score, class_id in zip(scaled_boxes, best_scores[keep_indices], best_class_ids[keep_indices])
+        ]
 
         detections.sort(key=lambda det: det.score, reverse=True)
         return detections
 
 
-def letterbox(
-    image: np.ndarray,
+def letterbox_geometry(
+    shape: Tuple[int, int],
     new_shape: Tuple[int, int],
-    color: Tuple[int, int, int] = (114, 114, 114),
-) -> Tuple[np.ndarray, Tuple[float, float], Tuple[float, float]]:
-    """Resize and pad image while meeting stride-multiple constraints."""
-
-    shape = image.shape[:2]  # current shape [height, width]
-    if isinstance(new_shape, int):
-        new_shape = (new_shape, new_shape)
+) -> Tuple[Tuple[int, int], Tuple[int, int, int, int], Tuple[float, float], Tuple[float, float]]:
+    """Compute resize size, border widths, ratio and padding for a letterbox."""
 
     ratio = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
     new_unpad = (int(round(shape[1] * ratio)), int(round(shape[0] * ratio)))
@@ -181,13 +325,86 @@ def letterbox(
     dw = (new_shape[1] - new_unpad[0]) / 2  # width padding
     dh = (new_shape[0] - new_unpad[1]) / 2  # height padding
 
-    resized = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
     top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
     left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
-    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
 
     ratio_hw = (new_unpad[0] / shape[1], new_unpad[1] / shape[0])
-    return padded, ratio_hw, (dw, dh)
+    return new_unpad, (top, bottom, left, right), ratio_hw, (dw, dh)
+
+
+def letterbox(
+    image: np.ndarray,
+    new_shape: Tuple[int, int],
+    color: Tuple[int, int, int] = (114, 114, 114),
+) -> Tuple[np.ndarray, Tuple[float, float], Tuple[float, float]]:
+    """Resize and pad image while meeting stride-multiple constraints."""
+
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+
+    new_unpad, (top, bottom, left, right), ratio_hw, pad = letterbox_geometry(image.shape[:2], new_shape)
+    resized = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return padded, ratio_hw, pad
+
+
+class LetterboxPreprocessor:
+    """Letterbox + normalize frames into a reusable NCHW float32 buffer.
+
+    Buffers are kept per thread so concurrent callers sharing one detector never
+    overwrite each other's input. For a steady stream of same-sized frames the
+    only per-call work is one resize into a cached canvas and one fused
+    BGR->RGB / scale / HWC->CHW pass written straight into the input tensor.
+    """
+
+    def __init__(self, imgsz: int, color: Tuple[int, int, int] = (114, 114, 114)) -> None:
+        self.shape = (imgsz, imgsz)
+        self.color = color
+        self._scale = np.float32(1.0 / 255.0)
+        self._local = threading.local()
+
+    def batch_buffer(self, batch_size: int) -> np.ndarray:
+        """Return a contiguous (batch_size, 3, H, W) view of the thread's input buffer."""
+
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < batch_size:
+            buffer = np.empty((batch_size, 3, *self.shape), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:batch_size]
+
+    def fill(
+        self, image: np.ndarray, out: np.ndarray
+    ) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+        """Write one BGR frame into ``out`` (3, H, W); return (ratio, pad)."""
+
+        if image.shape[:2] == self.shape:
+            # Already model-sized: no resize, no border
+            canvas = image
+            ratio, pad = (1.0, 1.0), (0.0, 0.0)
+        else:
+            canvas, ratio, pad = self._letterbox_into_canvas(image)
+
+        # Fused BGR->RGB swap, /255 scaling and HWC->CHW layout
+        for dst_channel, src_channel in enumerate((2, 1, 0)):
+            np.multiply(canvas[:, :, src_channel], self._scale, out=out[dst_channel], casting="unsafe")
+        return ratio, pad
+
+    def _letterbox_into_canvas(
+        self, image: np.ndarray
+    ) -> Tuple[np.ndarray, Tuple[float, float], Tuple[float, float]]:
+        local = self._local
+        src_shape = image.shape[:2]
+        if getattr(local, "src_shape", None) != src_shape:
+            local.geometry = letterbox_geometry(src_shape, self.shape)
+            local.src_shape = src_shape
+            local.resized = None
+            # Border regions stay untouched between frames of the same geometry
+            local.canvas = np.full((*self.shape, 3), self.color, dtype=np.uint8)
+        new_unpad, (top, _, left, _), ratio, pad = local.geometry
+
+        local.resized = cv2.resize(image, new_unpad, dst=local.resized, interpolation=cv2.INTER_LINEAR)
+        local.canvas[top : top + new_unpad[1], left : left + new_unpad[0]] = local.resized
+        return local.canvas, ratio, pad
 
 
 def xywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
@@ -261,6 +478,43 @@ def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> List[int
     return keep
 
 
+def batched_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_threshold: float,
+    top_k: int = 0,
+    max_det: int = 0,
+) -> np.ndarray:
+    """Class-aware NMS over all classes in a single pass.
+
+    Boxes are shifted by a per-class offset larger than the coordinate span so
+    boxes of different classes can never overlap, then one ``cv2.dnn.NMSBoxes``
+    call suppresses everything at once. ``top_k`` limits the candidates
+    considered (highest scores first) and ``max_det`` caps the kept boxes;
+    0 disables either. Returns kept indices ordered by descending score.
+    """
+
+    if boxes.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    span = float(boxes.max() - boxes.min()) + 1.0
+    shifted = boxes + class_ids.astype(boxes.dtype)[:, None] * span
+    xywh = np.concatenate((shifted[:, :2], shifted[:, 2:] - shifted[:, :2]), axis=1)
+
+    indices = cv2.dnn.NMSBoxes(
+        xywh.tolist(),
+        scores.tolist(),
+        score_threshold=0.0,
+        nms_threshold=float(iou_threshold),
+        top_k=int(top_k),
+    )
+    keep = np.asarray(indices, dtype=np.int64).reshape(-1)
+    if max_det > 0:
+        keep = keep[:max_det]
+    return keep
+
+
 def color_palette(class_id: int) -> Tuple[int, int, int]:
     palette = (
         (255, 56, 56),
@@ -357,6 +611,8 @@ def run_cli(argv: Optional[Sequence[str]] = None) -> None:
     parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
     parser.add_argument("--iou", type=float, default=0.45, help="IoU threshold for NMS")
     parser.add_argument("--imgsz", type=int, default=640, help="Inference image size (square)")
+    parser.add_argument("--nms-top-k", type=int, default=0, help="Candidates kept before NMS (0 = all)")
+    parser.add_argument("--max-det", type=int, default=0, help="Maximum detections per image (0 = unlimited)")
 
     args = parser.parse_args(list(argv) if argv is not None else None)
 
@@ -368,6 +624,8 @@ def run_cli(argv: Optional[Sequence[str]] = None) -> None:
         imgsz=args.imgsz,
         conf_threshold=args.conf,
         iou_threshold=args.iou,
+        nms_top_k=args.nms_top_k,
+        max_det=args.max_det,
     )
 
     images = resolve_image_paths(args.inputs)
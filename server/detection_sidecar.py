@@ -0,0 +1,86 @@
+"""归档图片的检测结果附属文件（``<图片名去扩展名>.det.json``，与图片放在同一目录）。
+
+每张归档图片都写一份，图库与识别测试窗口直接按附属文件绘制检测框，不再重新推理：
+{"model_tag", "conf_threshold", "burned_in", "class_names", "width", "height",
+ "detections": [[class_id, score, x1, y1, x2, y2], ...]}
+- 坐标为原图像素坐标，显示时按实际图片尺寸缩放；
+- conf_threshold 为推理时的置信度阈值，显示时可用更高的阈值过滤（低于推理阈值的框未保存）；
+- burned_in 表示归档图片中已画有检测框，显示时不再重复绘制。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+SIDECAR_SUFFIX = ".det.json"
+
+
+def sidecar_path(image_path: Path) -> Path:
+    image_path = Path(image_path)
+    return image_path.with_name(image_path.stem + SIDECAR_SUFFIX)
+
+
+def build_sidecar(
+    detections: Sequence[Any],
+    class_names: Sequence[str],
+    model_tag: str,
+    image_shape: Tuple[int, ...],
+    conf_threshold: Optional[float] = None,
+    burned_in: bool = False,
+) -> Dict[str, Any]:
+    height, width = image_shape[:2]
+    return {
+        "model_tag": model_tag,
+        "conf_threshold": conf_threshold,
+        "burned_in": burned_in,
+        "class_names": list(class_names),
+        "width": int(width),
+        "height": int(height),
+        "detections": [
+            [int(det.class_id), round(float(det.score), 4), *(round(float(v), 1) for v in det.box)]
+            for det in detections
+        ],
+    }
+
+
+def write_sidecar(image_path: Path, data: Dict[str, Any]) -> Optional[Path]:
+    path = sidecar_path(image_path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, mode="w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logger.warning(f"写入检测结果附属文件失败 {path}: {exc}")
+        return None
+    return path
+
+
+def visible_detections(data: Dict[str, Any], min_score: Optional[float] = None) -> List[List[float]]:
+    """置信度不低于 min_score 的检测（None 时返回全部已保存的检测）。"""
+    detections = [d for d in data.get("detections") or [] if len(d) >= 6]
+    if min_score is None:
+        return detections
+    return [d for d in detections if d[1] >= min_score]
+
+
+def class_counts(data: Dict[str, Any], min_score: Optional[float] = None) -> Counter:
+    return Counter(int(d[0]) for d in visible_detections(data, min_score))
+
+
+def read_sidecar(image_path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(sidecar_path(image_path), mode="r", encoding="utf-8") as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.debug(f"读取检测结果附属文件失败 {image_path}: {exc}")
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,321 @@
+"""检测结果时序库（SQLite，WAL 模式）。
+
+报告 CSV 只保留每台设备的最新数量，历史需要从 Record 文件名反推。
+这里把每一次检测结果（各类别数量、置信度、模型标签、推理耗时）写入
+``<fold_path>/<detection_db>``，按 (设备号, 时间) 建索引：
+- 写入：处理线程 add() 缓存，每个处理周期结束 flush() 一次性批量插入，
+  同一事务中更新 ``latest`` 表（每台设备一行），图表读取最新值不扫描历史；
+- 读取：每个线程使用独立只读连接，WAL 模式下与写入互不阻塞；
+- 导出：``python -m server.detection_store export`` 按时间范围导出 CSV（GBK，与报告格式一致）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+
+REPORT_FIELDS = ["日期", "时间", "设备号", "数量"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device TEXT NOT NULL,
+    device_type TEXT NOT NULL,
+    ts REAL NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    class_counts TEXT,
+    scores TEXT,
+    model_tag TEXT,
+    latency_ms REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_detections_device_ts ON detections (device, ts);
+CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections (ts);
+CREATE TABLE IF NOT EXISTS latest (
+    device TEXT PRIMARY KEY,
+    device_type TEXT NOT NULL,
+    ts REAL NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+"""
+
+_INSERT = (
+    "INSERT INTO detections (device, device_type, ts, date, time, count, class_counts, scores, model_tag, latency_ms, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# 只有采集时间不早于现有值时才覆盖（补传的旧图片不影响最新值）
+_UPSERT_LATEST = (
+    "INSERT INTO latest (device, device_type, ts, date, time, count) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(device) DO UPDATE SET device_type = excluded.device_type, ts = excluded.ts, "
+    "date = excluded.date, time = excluded.time, count = excluded.count WHERE excluded.ts >= latest.ts"
+)
+
+# 升级前创建的库：latest 表为空时从历史回填一次
+_BACKFILL_LATEST = (
+    "INSERT INTO latest (device, device_type, ts, date, time, count) "
+    "SELECT device, device_type, MAX(ts), date, time, count FROM detections GROUP BY device"
+)
+
+
+def parse_capture_time(date: str, time_value: str) -> Optional[float]:
+    """报告中的日期 (YYYYMMDD) + 时间 (HH:MM:SS / HH.MM.SS / HH-MM-SS) 转为 epoch。"""
+    digits = "".join(ch for ch in f"{date}{time_value}" if ch.isdigit())
+    if len(digits) < 14:
+        return None
+    try:
+        return time.mktime(time.strptime(digits[:14], "%Y%m%d%H%M%S"))
+    except (ValueError, OverflowError):
+        return None
+
+
+@dataclass
+class DetectionRecord:
+    device: str  # 设备号，如 FL_000001
+    date: str
+    time: str
+    count: int
+    model_tag: str = ""
+    class_counts: Dict[str, int] = field(default_factory=dict)
+    scores: List[float] = field(default_factory=list)
+    latency_ms: Optional[float] = None
+    ts: Optional[float] = None  # 采集时间，None 时由 date/time 解析
+
+    def to_row(self) -> tuple:
+        ts = self.ts if self.ts is not None else parse_capture_time(self.date, self.time)
+        now = time.time()
+        return (
+            self.device,
+            self.device.split("_")[0].upper(),
+            ts if ts is not None else now,
+            str(self.date),
+            str(self.time),
+            int(self.count),
+            json.dumps(self.class_counts, ensure_ascii=False) if self.class_counts else None,
+            json.dumps([round(float(s), 4) for s in self.scores]) if self.scores else None,
+            self.model_tag,
+            self.latency_ms,
+            now,
+        )
+
+
+class DetectionStore:
+    """线程安全的检测结果库：单写连接 + 每线程只读连接。"""
+
+    def __init__(self, db_path: str, batch_size: int = 500) -> None:
+        self.db_path = os.path.abspath(db_path)
+        self.batch_size = max(1, int(batch_size))
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        if self._conn.execute("SELECT 1 FROM latest LIMIT 1").fetchone() is None:
+            with self._conn:
+                self._conn.execute(_BACKFILL_LATEST)
+        self._closed = False
+
+    @classmethod
+    def from_config(cls, server_cfg) -> Optional["DetectionStore"]:
+        """[Storage] detection_db 为空时不启用，返回 None。"""
+        storage = server_cfg["Storage"]
+        name = str(storage.get("detection_db", "")).strip()
+        if not name:
+            return None
+        path = name if os.path.isabs(name) else os.path.join(storage["fold_path"], name)
+        try:
+            batch_size = int(storage.get("detection_db_batch", 500))
+        except (TypeError, ValueError):
+            logger.warning("Storage.detection_db_batch 配置无效，使用默认值 500")
+            batch_size = 500
+        try:
+            store = cls(path, batch_size=batch_size)
+        except sqlite3.Error as exc:
+            logger.error(f"[DetectionStore] 打开数据库失败 {path}: {exc}")
+            return None
+        logger.info(f"[DetectionStore] 检测结果库: {store.db_path}")
+        return store
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def add(self, record: DetectionRecord) -> None:
+        """缓存一条结果；缓存达到 batch_size 时自动写入。"""
+        with self._write_lock:
+            self._pending.append(record.to_row())
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """在一个事务中批量写入缓存的结果，返回写入条数。"""
+        with self._write_lock:
+            if not self._pending or self._closed:
+                return 0
+            rows, self._pending = self._pending, []
+            try:
+                with self._conn:
+                    self._conn.executemany(_INSERT, rows)
+                    self._conn.executemany(_UPSERT_LATEST, [row[:6] for row in rows])
+            except sqlite3.Error as exc:
+                # 保留未写入的数据，下次重试
+                self._pending[:0] = rows
+                logger.error(f"[DetectionStore] 批量写入 {len(rows)} 条失败: {exc}")
+                return 0
+            return len(rows)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def latest_per_device(self, device_types: Optional[Sequence[str]] = None) -> List[Dict[str, str]]:
+        """每台设备最新一条结果，格式与报告 CSV 行一致（设备号排序）。"""
+        sql = "SELECT device, date, time, count FROM latest"
+        params: List[str] = []
+        if device_types:
+            sql += f" WHERE device_type IN ({','.join('?' * len(device_types))})"
+            params.extend(t.upper() for t in device_types)
+        sql += " ORDER BY device"
+        rows = self._reader().execute(sql, params).fetchall()
+        return [{"日期": r["date"], "时间": r["time"], "设备号": r["device"], "数量": str(r["count"])} for r in rows]
+
+    def latest_for_devices(self, devices: Sequence[str]) -> List[Dict[str, str]]:
+        """指定设备的最新一条结果（只刷新变化的设备时使用）。"""
+        devices = list(devices)
+        if not devices:
+            return []
+        sql = f"SELECT device, date, time, count FROM latest WHERE device IN ({','.join('?' * len(devices))})"
+        rows = self._reader().execute(sql, devices).fetchall()
+        return [{"日期": r["date"], "时间": r["time"], "设备号": r["device"], "数量": str(r["count"])} for r in rows]
+
+    def is_empty(self) -> bool:
+        return self._reader().execute("SELECT 1 FROM detections LIMIT 1").fetchone() is None
+
+    def seed_from_report(self, rows: Sequence[Dict[str, str]]) -> int:
+        """新建的库以现有报告 CSV 的各设备最新值作为初始数据，避免图表在首次检测前为空。"""
+        if not rows or not self.is_empty():
+            return 0
+        seeded = 0
+        for row in rows:
+            try:
+                self.add(DetectionRecord(device=row["设备号"], date=row["日期"], time=row["时间"], count=int(row["数量"])))
+            except (KeyError, TypeError, ValueError):
+                continue
+            seeded += 1
+        self.flush()
+        return seeded
+
+    def history(self, device: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 0) -> List[sqlite3.Row]:
+        """单台设备在 [start, end) 内的全部结果，按时间升序。"""
+        sql = "SELECT * FROM detections WHERE device = ?"
+        params: list = [device]
+        if start is not None:
+            sql += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND ts < ?"
+            params.append(end)
+        sql += " ORDER BY ts"
+        if limit > 0:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._reader().execute(sql, params).fetchall()
+
+    def last_seen(self) -> Dict[str, float]:
+        """各设备最近一次采集时间（epoch）。"""
+        rows = self._reader().execute("SELECT device, ts FROM latest").fetchall()
+        return {r["device"]: r["ts"] for r in rows}
+
+    def export_csv(self, path: str, start: Optional[float] = None, end: Optional[float] = None, latest_only: bool = False, encoding: str = "gbk") -> int:
+        """导出为报告格式的 CSV；latest_only 时每台设备一行，否则导出时间范围内的全部结果。"""
+        if latest_only:
+            rows = self.latest_per_device()
+        else:
+            sql = "SELECT device, date, time, count FROM detections WHERE 1=1"
+            params: list = []
+            if start is not None:
+                sql += " AND ts >= ?"
+                params.append(start)
+            if end is not None:
+                sql += " AND ts < ?"
+                params.append(end)
+            sql += " ORDER BY ts"
+            rows = [
+                {"日期": r["date"], "时间": r["time"], "设备号": r["device"], "数量": r["count"]}
+                for r in self._reader().execute(sql, params)
+            ]
+        with open(path, mode="w", encoding=encoding, newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def close(self) -> None:
+        self.flush()
+        with self._write_lock:
+            self._closed = True
+            self._conn.close()
+        with self._readers_lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._readers.clear()
+
+
+def _parse_day(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    return time.mktime(time.strptime(value, "%Y-%m-%d"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="检测结果库导出工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="导出 CSV")
+    export.add_argument("--db", required=True, help="检测结果库路径")
+    export.add_argument("--output", required=True, help="输出 CSV 路径")
+    export.add_argument("--start", help="起始日期 YYYY-MM-DD（含）")
+    export.add_argument("--end", help="结束日期 YYYY-MM-DD（不含）")
+    export.add_argument("--latest", action="store_true", help="每台设备只导出最新一条")
+    args = parser.parse_args()
+
+    store = DetectionStore(args.db)
+    try:
+        count = store.export_csv(args.output, _parse_day(args.start), _parse_day(args.end), latest_only=args.latest)
+    finally:
+        store.close()
+    logger.info(f"已导出 {count} 条记录到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""接收线程到图像处理线程的内存交接队列。
+
+开启后，Server 解密校验通过的图片字节直接放入有界队列，由 Img_process 取出后
+在流水线解码级用 cv2.imdecode 解码，省去 Temp 文件的一次写入和一次读取。
+Temp 文件仅作为崩溃恢复日志，由后台线程异步写入（先写 .part 再原子重命名）：
+- 图片处理完成前程序退出时，重启后仍可从 Temp 文件夹补处理；
+- 图片先处理完成时，尚未写入的日志直接跳过，已写入的日志随归档删除。
+队列已满时 submit 返回 False，调用方按原方式同步写入 Temp 文件，由轮询流程处理。
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+
+_STOP = object()
+
+
+class HandoffItem:
+    """一张交接中的图片及其日志状态。"""
+
+    __slots__ = ("path", "data", "_lock", "_journaled", "_done")
+
+    def __init__(self, path: Path, data: bytes) -> None:
+        self.path = Path(path)
+        self.data = data
+        self._lock = threading.Lock()
+        self._journaled = False
+        self._done = False
+
+
+class FrameHandoff:
+    """有界内存交接队列 + 异步 Temp 日志写入线程。"""
+
+    def __init__(self, queue_size: int = 64, journal: bool = True) -> None:
+        self.queue_size = max(1, int(queue_size))
+        self.journal = journal
+        self._queue: "queue.Queue[HandoffItem]" = queue.Queue(maxsize=self.queue_size)
+        self._journal_queue: "queue.Queue[object]" = queue.Queue()
+        self._inflight: Dict[Path, HandoffItem] = {}
+        self._inflight_lock = threading.Lock()
+        self._closed = False
+        self._journal_thread: Optional[threading.Thread] = None
+        if self.journal:
+            self._journal_thread = threading.Thread(target=self._journal_loop, name="handoff_journal", daemon=True)
+            self._journal_thread.start()
+
+    @classmethod
+    def from_config(cls, process_cfg: Dict[str, str]) -> Optional["FrameHandoff"]:
+        """[Image_Process] handoff = 1 时创建，否则返回 None（沿用 Temp 文件轮询）。"""
+        try:
+            if not bool(int(process_cfg.get("handoff", 0))):
+                return None
+            queue_size = int(process_cfg.get("handoff_queue_size", 64))
+            journal = bool(int(process_cfg.get("handoff_journal", 1)))
+        except (TypeError, ValueError) as exc:
+            logger.warning(f"[Handoff] 配置无效，使用 Temp 文件轮询: {exc}")
+            return None
+        logger.info(f"[Handoff] 内存交接已启用: 队列长度={queue_size} 崩溃恢复日志={'开' if journal else '关'}")
+        return cls(queue_size=queue_size, journal=journal)
+
+    # ------------------------------------------------------------------
+    # 接收端
+    # ------------------------------------------------------------------
+    def submit(self, path: Path, data: bytes) -> bool:
+        """放入交接队列；队列已满时返回 False，由调用方同步写入 Temp 文件。"""
+        if self._closed:
+            return False
+        item = HandoffItem(path, data)
+        with self._inflight_lock:
+            self._inflight[item.path] = item
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._inflight_lock:
+                self._inflight.pop(item.path, None)
+            return False
+        if self.journal:
+            self._journal_queue.put(item)
+        return True
+
+    # ------------------------------------------------------------------
+    # 处理端
+    # ------------------------------------------------------------------
+    def drain(self, limit: int = 0) -> List[HandoffItem]:
+        """取出当前队列中的图片（limit <= 0 表示全部）。"""
+        items: List[HandoffItem] = []
+        while limit <= 0 or len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def unjournaled(self) -> int:
+        """尚未落盘的交接图片数量（Temp 文件夹统计不到的积压）。"""
+        with self._inflight_lock:
+            return sum(1 for item in self._inflight.values() if not item._journaled)
+
+    def inflight_paths(self) -> Set[Path]:
+        """交接中的 Temp 路径，轮询 Temp 文件夹时应跳过，避免重复处理。"""
+        with self._inflight_lock:
+            return set(self._inflight)
+
+    def ensure_journaled(self, item: HandoffItem) -> bool:
+        """同步写入 Temp 文件（归档失败需要移动原图时使用）。"""
+        with item._lock:
+            if not item._journaled:
+                item._journaled = self._write_journal(item)
+            return item._journaled
+
+    def complete(self, item: HandoffItem) -> None:
+        """处理完成：未写入的日志不再写入，已写入的日志删除。"""
+        with item._lock:
+            item._done = True
+            if item._journaled:
+                try:
+                    item.path.unlink(missing_ok=True)
+                except OSError as exc:
+                    logger.warning(f"[Handoff] 删除日志文件失败 {item.path}: {exc}")
+        item.data = b""
+        with self._inflight_lock:
+            self._inflight.pop(item.path, None)
+
+    def stop(self) -> None:
+        """停止交接：之后的图片由调用方直接写入 Temp；仍在内存中的图片补写 Temp，重启后由轮询流程处理。"""
+        self._closed = True
+        with self._inflight_lock:
+            items = list(self._inflight.values())
+        for item in items:
+            with item._lock:
+                if not item._done and not item._journaled:
+                    item._journaled = self._write_journal(item)
+        if self._journal_thread is not None:
+            self._journal_queue.put(_STOP)
+            self._journal_thread.join(timeout=5)
+            self._journal_thread = None
+
+    # ------------------------------------------------------------------
+    # 日志线程
+    # ------------------------------------------------------------------
+    def _journal_loop(self) -> None:
+        while True:
+            item = self._journal_queue.get()
+            if item is _STOP:
+                break
+            with item._lock:
+                if item._done or item._journaled:
+                    continue
+                item._journaled = self._write_journal(item)
+
+    @staticmethod
+    def _write_journal(item: HandoffItem) -> bool:
+        part_path = item.path.with_name(item.path.name + ".part")
+        try:
+            item.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(part_path, "wb") as f:
+                f.write(item.data)
+            os.replace(part_path, item.path)
+            return True
+        except OSError as exc:
+            logger.error(f"[Handoff] 写入日志文件失败 {item.path}: {exc}")
+            return False
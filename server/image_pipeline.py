@@ -0,0 +1,195 @@
+"""图像处理分级流水线：解码 → 推理 → 编码归档 → 报告。
+
+各级之间使用有界队列衔接：
+- 解码 (cv2.imread) 与标注图编码 (annotate + cv2.imwrite) 在线程池中并发执行；
+- 推理在单独线程中按设备类型成批调用检测器；
+- 报告写入 / 临时文件清理在调用线程中按原始顺序串行完成。
+整体吞吐受最慢一级限制，而不是各级耗时之和。
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+# 队列结束标记
+_END = object()
+# 投递阻塞时检查下游是否已退出的间隔（秒）
+_PUT_POLL_INTERVAL = 0.5
+
+
+@dataclass
+class PipelineJob:
+    """流水线中单张图片的处理状态，各级依次填充字段。"""
+
+    image_path: Path
+    device_type: str
+    metadata: Tuple[str, str, str]  # device_code, date_fmt, time_fmt
+    image: Optional[Any] = None
+    detections: Optional[List[Any]] = None
+    count: int = 0
+    tag: str = "unknown"
+    stored_path: Optional[Path] = None
+    handoff: Optional[Any] = None  # 内存交接的图片 (server.handoff.HandoffItem)，None 表示从 Temp 文件读取
+    latency_ms: Optional[float] = None  # 推理耗时（成批推理时按张均摊）
+
+
+class ImagePipeline:
+    """基于有界队列的图像处理流水线。
+
+    各级处理函数由调用方提供：
+    - decode(job): 读取图片，填充 job.image
+    - infer(device_type, jobs): 对同类型一批图片推理，填充 detections / count / tag
+    - encode(job): 生成并保存标注图，填充 job.stored_path
+    - finalize(job): 报告写入与临时文件清理（调用线程中按顺序执行）
+    """
+
+    def __init__(
+        self,
+        decode: Callable[[PipelineJob], None],
+        infer: Callable[[str, List[PipelineJob]], None],
+        encode: Callable[[PipelineJob], None],
+        finalize: Callable[[PipelineJob], None],
+        batch_size: int = 1,
+        decode_workers: int = 2,
+        encode_workers: int = 2,
+        queue_size: int = 16,
+    ) -> None:
+        self._decode = decode
+        self._infer = infer
+        self._encode = encode
+        self._finalize = finalize
+        self.batch_size = max(1, int(batch_size))
+        self.decode_workers = max(1, int(decode_workers))
+        self.encode_workers = max(1, int(encode_workers))
+        self.queue_size = max(1, int(queue_size))
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        """停止向流水线投递新任务，已投递的任务会继续处理完；之后的 run() 不再处理任务，直到 reset()。"""
+        self._stop_event.set()
+
+    def reset(self) -> None:
+        """stop() 之后重新允许 run() 处理任务。"""
+        self._stop_event.clear()
+
+    def run(self, jobs: Iterable[PipelineJob]) -> int:
+        """处理全部任务，返回完成 finalize 的数量。"""
+
+        decode_queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        encode_queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        # 推理级异常退出后不再有人读取 decode_queue，投递线程据此放弃阻塞的 put
+        infer_exited = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix="img_decode") as decode_pool, \
+                ThreadPoolExecutor(max_workers=self.encode_workers, thread_name_prefix="img_encode") as encode_pool:
+            feeder = threading.Thread(
+                target=self._feed_loop, args=(jobs, decode_pool, decode_queue, infer_exited), name="img_feed", daemon=True
+            )
+            inferer = threading.Thread(
+                target=self._infer_loop,
+                args=(decode_queue, encode_pool, encode_queue, infer_exited),
+                name="img_infer",
+                daemon=True,
+            )
+            feeder.start()
+            inferer.start()
+            processed = self._finalize_loop(encode_queue)
+            feeder.join()
+            inferer.join()
+        return processed
+
+    # ------------------------------------------------------------------
+    # 各级循环
+    # ------------------------------------------------------------------
+    def _feed_loop(
+        self, jobs: Iterable[PipelineJob], pool: ThreadPoolExecutor, out_queue: queue.Queue, consumer_exited: threading.Event
+    ) -> None:
+        try:
+            for job in jobs:
+                if self._stop_event.is_set() or consumer_exited.is_set():
+                    break
+                # 队列满时阻塞，限制预读数量
+                if not self._put(out_queue, (job, pool.submit(self._safe_call, self._decode, job, "解码")), consumer_exited):
+                    break
+        except Exception as exc:
+            logger.error(f"[Pipeline] 投递任务失败: {exc}")
+        finally:
+            self._put(out_queue, _END, consumer_exited)
+
+    @staticmethod
+    def _put(out_queue: queue.Queue, item: Any, consumer_exited: threading.Event) -> bool:
+        """队列满时阻塞等待；下游已退出时放弃投递并返回 False。"""
+        while True:
+            try:
+                out_queue.put(item, timeout=_PUT_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if consumer_exited.is_set():
+                    return False
+
+    def _infer_loop(
+        self, in_queue: queue.Queue, pool: ThreadPoolExecutor, out_queue: queue.Queue, exited: threading.Event
+    ) -> None:
+        batch: List[PipelineJob] = []
+        try:
+            while True:
+                item = in_queue.get()
+                if item is _END:
+                    break
+                job, future = item
+                future.result()
+                if batch and job.device_type != batch[0].device_type:
+                    self._flush_batch(batch, pool, out_queue)
+                    batch = []
+                batch.append(job)
+                # 上游暂时没有更多图片时不再等待凑满批次
+                if len(batch) >= self.batch_size or in_queue.empty():
+                    self._flush_batch(batch, pool, out_queue)
+                    batch = []
+            if batch:
+                self._flush_batch(batch, pool, out_queue)
+        except Exception as exc:
+            logger.error(f"[Pipeline] 推理级异常: {exc}")
+        finally:
+            exited.set()
+            out_queue.put(_END)
+
+    def _flush_batch(self, batch: List[PipelineJob], pool: ThreadPoolExecutor, out_queue: queue.Queue) -> None:
+        ready = [job for job in batch if job.image is not None]
+        if ready:
+            try:
+                self._infer(ready[0].device_type, ready)
+            except Exception as exc:
+                logger.error(f"[Pipeline] 推理失败 ({ready[0].device_type} x{len(ready)}): {exc}")
+        for job in batch:
+            out_queue.put((job, pool.submit(self._safe_call, self._encode, job, "编码")))
+
+    def _finalize_loop(self, in_queue: queue.Queue) -> int:
+        processed = 0
+        while True:
+            item = in_queue.get()
+            if item is _END:
+                break
+            job, future = item
+            future.result()
+            # 释放帧内存，避免长批次占用
+            job.image = None
+            if self._safe_call(self._finalize, job, "归档"):
+                processed += 1
+        return processed
+
+    @staticmethod
+    def _safe_call(func: Callable[[PipelineJob], None], job: PipelineJob, stage: str) -> bool:
+        try:
+            func(job)
+            return True
+        except Exception as exc:
+            logger.error(f"[Pipeline] {stage}失败 {job.image_path}: {exc}")
+            return False
@@ -2,22 +2,39 @@ import csv
 import datetime
 import os
 import random
+import re
 import shutil
 import sys
 import threading
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from pathlib import Path
 from threading import Lock, Thread
-from typing import Any, Dict, Optional, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import cv2
+import numpy as np
 
 from loguru import logger
 
 from config.global_setting import global_setting
 from util.time_util import time_util
-from server.detect import IMAGE_EXTENSIONS, OnnxYoloDetector
+from server.detect import (
+    IMAGE_EXTENSIONS,
+    InferenceProfile,
+    OnnxYoloDetector,
+    describe_session_options,
+    model_cache_path,
+)
+from server.archive import partition_dir
+from server.archive_encoding import archive_encoding_for
+from server.detection_sidecar import build_sidecar, write_sidecar
+from server.detection_store import DetectionRecord
+from server.record_index import record_indexes
+from server.handoff import FrameHandoff
+from server.image_pipeline import ImagePipeline, PipelineJob
+from server.report_store import alias_report_index, get_report_index, peek_report_index, report_files
+from server.temp_watcher import TempFolderIndex
 
 report_logger = logger.bind(category="report_logger")
 
@@ -30,7 +47,20 @@ class ModelConfig:
     imgsz: int = 640
     conf_threshold: float = 0.31
     iou_threshold: float = 0.3
+    nms_top_k: int = 0
+    max_det: int = 0
+    precision: str = "fp32"  # fp32 | int8 (built by server/quantize.py)
 
+    def precision_path(self, precision: Optional[str] = None) -> Path:
+        """Model file for the given precision; fp32 is the exported model itself."""
+
+        precision = (precision or self.precision).lower()
+        if precision == "fp32":
+            return self.model_path
+        return self.model_path.with_name(f"{self.model_path.stem}.{precision}{self.model_path.suffix}")
+
+
+MODEL_PRECISIONS = ("fp32", "int8")
 
 
 def _get_bundle_root() -> Path:
@@ -77,6 +107,40 @@ class _DetectorRegistry:
     def __init__(self) -> None:
         self._detectors: Dict[str, OnnxYoloDetector] = {}
         self._lock = Lock()
+        self._type_locks: Dict[str, Lock] = {}
+        self._profile: Optional[InferenceProfile] = None
+        self._precisions: Dict[str, str] = {}
+
+    def configure(self, server_cfg: Optional[Dict[str, Dict[str, str]]]) -> InferenceProfile:
+        """Load the [Inference] section; applies to detectors created afterwards."""
+
+        section = (server_cfg or {}).get("Inference", {})
+        try:
+            profile = InferenceProfile.from_mapping(section)
+        except Exception as exc:
+            logger.warning(f"[Inference] 配置无效，使用 onnxruntime 默认参数: {exc}")
+            profile = InferenceProfile()
+        if profile.optimized_model_path and not Path(profile.optimized_model_path).is_absolute():
+            profile = replace(profile, optimized_model_path=str(_MODEL_DIR / profile.optimized_model_path))
+        precisions: Dict[str, str] = {}
+        for type_key, config in _MODEL_CONFIGS.items():
+            precision = str(
+                section.get(f"precision_{type_key.lower()}", section.get("precision", config.precision))
+            ).strip().lower()
+            if precision not in MODEL_PRECISIONS:
+                logger.warning(f"[Inference] {type_key} 精度 {precision} 无效，使用 {config.precision}")
+                precision = config.precision
+            precisions[type_key] = precision
+        with self._lock:
+            self._profile = profile
+            self._precisions = precisions
+        logger.info(f"[Inference] 推理配置: {profile} | 模型精度: {precisions}")
+        return profile
+
+    def _get_profile(self) -> InferenceProfile:
+        if self._profile is None:
+            self.configure(global_setting.get_setting("server_config"))
+        return self._profile
 
     def get(self, type_code: str) -> OnnxYoloDetector:
         type_key = type_code.upper()
@@ -84,25 +148,128 @@ class _DetectorRegistry:
         if config is None:
             raise KeyError(f"Unsupported device type '{type_code}' for YOLO inference")
 
+        profile = self._get_profile()
         with self._lock:
             detector = self._detectors.get(type_key)
             if detector is not None:
                 return detector
+            type_lock = self._type_locks.setdefault(type_key, Lock())
+
+        # 模型加载只持有该类型的锁，FL/YL 互不阻塞
+        with type_lock:
+            with self._lock:
+                detector = self._detectors.get(type_key)
+            if detector is not None:
+                return detector
 
-            detector = OnnxYoloDetector(
-                model_path=config.model_path,
-                class_names=config.class_names,
-                imgsz=config.imgsz,
-                conf_threshold=config.conf_threshold,
-                iou_threshold=config.iou_threshold,
+            start = time.time()
+            detector = self._create_detector(self._resolve_precision(type_key, config), profile)
+            logger.info(
+                f"[Inference] {type_key} 模型 {detector.model_path.name} 已加载 ({time.time() - start:.2f}s): "
+                f"{describe_session_options(detector.session.get_session_options())}"
             )
-            self._detectors[type_key] = detector
+            with self._lock:
+                self._detectors[type_key] = detector
             return detector
 
+    def warmup(self, type_codes: Sequence[str]) -> None:
+        """Load each detector and run a dummy frame through it."""
+
+        for type_code in type_codes:
+            try:
+                start = time.time()
+                self.get(type_code).warmup()
+                logger.info(f"[Inference] {type_code} 模型预热完成 ({time.time() - start:.2f}s)")
+            except Exception as exc:
+                logger.warning(f"[Inference] {type_code} 模型预热失败: {exc}")
+
+    def _resolve_precision(self, type_key: str, config: ModelConfig) -> ModelConfig:
+        precision = self._precisions.get(type_key, config.precision)
+        if precision == "fp32":
+            return config
+        model_path = config.precision_path(precision)
+        if not model_path.exists():
+            logger.warning(
+                f"[Inference] {type_key} 未找到 {precision} 模型 {model_path.name}，"
+                f"请先运行 python -m server.quantize --type {type_key}；改用 fp32"
+            )
+            return config
+        return replace(config, model_path=model_path, precision=precision)
+
+    def _create_detector(self, config: ModelConfig, profile: InferenceProfile) -> OnnxYoloDetector:
+        kwargs = dict(
+            class_names=config.class_names,
+            imgsz=config.imgsz,
+            conf_threshold=config.conf_threshold,
+            iou_threshold=config.iou_threshold,
+            nms_top_k=config.nms_top_k,
+            max_det=config.max_det,
+        )
+        if not profile.model_cache:
+            return OnnxYoloDetector(
+                model_path=config.model_path, session_options=profile.session_options(config.tag), **kwargs
+            )
+
+        try:
+            cache_path = model_cache_path(config.model_path, profile.graph_optimization_level)
+        except OSError as exc:
+            raise FileNotFoundError(f"ONNX model not found: {config.model_path}") from exc
+
+        if cache_path.exists():
+            try:
+                return OnnxYoloDetector(
+                    model_path=cache_path,
+                    session_options=profile.session_options(config.tag, preoptimized=True),
+                    **kwargs,
+                )
+            except Exception as exc:
+                logger.warning(f"[Inference] 优化模型缓存 {cache_path.name} 加载失败，重新生成: {exc}")
+                cache_path.unlink(missing_ok=True)
+
+        # 先写入临时文件，会话创建成功后再替换，避免中途退出留下损坏的缓存
+        tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+        options = profile.session_options(config.tag)
+        options.optimized_model_filepath = str(tmp_path)
+        try:
+            detector = OnnxYoloDetector(model_path=config.model_path, session_options=options, **kwargs)
+        except Exception as exc:
+            logger.warning(f"[Inference] 生成优化模型缓存失败，直接加载原模型: {exc}")
+            tmp_path.unlink(missing_ok=True)
+            return OnnxYoloDetector(
+                model_path=config.model_path, session_options=profile.session_options(config.tag), **kwargs
+            )
+
+        try:
+            os.replace(tmp_path, cache_path)
+            stale_pattern = re.compile(rf"{re.escape(config.model_path.stem)}\.[0-9a-f]{{16}}-.+\.opt\.onnx")
+            for stale in cache_path.parent.glob(f"{config.model_path.stem}.*.opt.onnx"):
+                if stale != cache_path and stale_pattern.fullmatch(stale.name):
+                    stale.unlink(missing_ok=True)
+            logger.info(f"[Inference] 已保存优化模型缓存 {cache_path.name}")
+        except OSError as exc:
+            logger.warning(f"[Inference] 保存优化模型缓存失败 {cache_path}: {exc}")
+        return detector
+
 
 _DETECTORS = _DetectorRegistry()
 
 
+def configure_inference(server_cfg: Optional[Dict[str, Dict[str, str]]]) -> InferenceProfile:
+    """Apply the [Inference] section of server_config.ini to the detector registry."""
+
+    return _DETECTORS.configure(server_cfg)
+
+
+def start_detector_warmup(type_codes: Sequence[str]) -> Optional[Thread]:
+    """Warm up detectors in the background when [Inference] warmup is enabled."""
+
+    if not _DETECTORS._get_profile().warmup:
+        return None
+    thread = Thread(target=_DETECTORS.warmup, args=(list(type_codes),), name="detector_warmup", daemon=True)
+    thread.start()
+    return thread
+
+
 def _resolve_device_type(device_code: str) -> Optional[str]:
     if not device_code:
         return None
@@ -112,29 +279,28 @@ def _resolve_device_type(device_code: str) -> Optional[str]:
     return parts[0].upper()
 
 
-def analyze_image_with_yolo(image_full_path: Path, device_code: str) -> Tuple[int, str, Optional[Any]]:
-    """Run YOLO inference for the given image and return detection info and annotated frame."""
+def _detect_image(image_full_path: Path, device_code: str) -> Tuple[str, Optional[Any], Optional[List[Any]]]:
+    """Run YOLO inference for the given image and return (model tag, frame, detections)."""
 
     device_type = _resolve_device_type(device_code)
     if not device_type:
         report_logger.warning(f"无法从设备名解析类型，跳过: {device_code}")
-        return 0, "unknown", None
+        return "unknown", None, None
 
     config = _MODEL_CONFIGS.get(device_type)
     if config is None:
         report_logger.warning(f"未配置 {device_type} 的模型，跳过 {image_full_path}")
-        return 0, "unknown", None
+        return "unknown", None, None
 
     try:
         detector = _DETECTORS.get(device_type)
     except Exception as exc:
         report_logger.error(f"加载 {device_type} 模型失败: {exc}")
-        return 0, config.tag, None
+        return config.tag, None, None
 
     try:
         image, detections = detector.predict_from_path(image_full_path)
-        annotated = detector.annotate(image, detections)
-        return len(detections), config.tag, annotated
+        return config.tag, image, detections
     except FileNotFoundError:
         report_logger.error(f"图片不存在: {image_full_path}")
     except ValueError as exc:
@@ -142,7 +308,46 @@ def analyze_image_with_yolo(image_full_path: Path, device_code: str) -> Tuple[in
     except Exception as exc:
         report_logger.error(f"YOLO 推理失败 {image_full_path}: {exc}")
 
-    return 0, config.tag, None
+    return config.tag, None, None
+
+
+def analyze_image_with_yolo(image_full_path: Path, device_code: str) -> Tuple[int, str, Optional[Any]]:
+    """Run YOLO inference for the given image and return detection info and annotated frame."""
+
+    tag, image, detections = _detect_image(image_full_path, device_code)
+    if image is None or detections is None:
+        return 0, tag, None
+    annotated = _DETECTORS.get(_resolve_device_type(device_code)).annotate(image, detections)
+    return len(detections), tag, annotated
+
+
+def _archive_outputs(
+    device_type: str, image: Optional[Any], detections: Optional[List[Any]], tag: str
+) -> Tuple[Optional[Any], Optional[Dict[str, Any]]]:
+    """Prepare the archived frame (burned-in only if the encoding policy asks for it) and the detection sidecar.
+
+    The sidecar is written for every archived image so the gallery and tester can draw overlays without
+    rerunning the model.
+    """
+
+    if image is None or detections is None:
+        return None, None
+    detector = _DETECTORS.get(device_type)
+    burn_in = archive_encoding_for(device_type).burn_in
+    sidecar = build_sidecar(
+        detections, detector.class_names, tag, image.shape, conf_threshold=detector.conf_threshold, burned_in=burn_in
+    )
+    return (detector.annotate(image, detections) if burn_in else None), sidecar
+
+
+def _predict_frames(detector: OnnxYoloDetector, frames: Sequence[Any], device_type: str) -> Optional[List[List[Any]]]:
+    if not frames:
+        return []
+    try:
+        return detector.predict_batch(frames)
+    except Exception as exc:
+        report_logger.error(f"YOLO 批量推理失败 ({device_type} x{len(frames)}): {exc}")
+        return None
 
 
 def _store_processed_image(
@@ -150,11 +355,18 @@ def _store_processed_image(
     annotated_image: Optional[Any],
     base_path: Path,
     record_suffix: str,
+    payload: Optional[bytes] = None,
+    sidecar: Optional[Dict[str, Any]] = None,
 ) -> Optional[Path]:
-    """Persist annotated image (or original fallback) into the record directory."""
+    """Persist annotated image (or original fallback) into the record directory.
+
+    ``payload`` holds the original bytes of a handed-off image whose Temp file may not exist yet.
+    The annotated frame is encoded per the device type's archive encoding; ``sidecar`` (detections
+    for an original-bytes archive) is written next to the stored image.
+    """
 
     type_code = image_path.stem.split("_")[0].upper()
-    target_dir = base_path / f"{type_code}_{record_suffix}"
+    target_dir = partition_dir(base_path / f"{type_code}_{record_suffix}", image_path.name)
     try:
         target_dir.mkdir(parents=True, exist_ok=True)
     except Exception as exc:
@@ -164,14 +376,20 @@ def _store_processed_image(
     target_path = target_dir / image_path.name
     try:
         if annotated_image is not None:
-            if not cv2.imwrite(str(target_path), annotated_image):
-                raise IOError("cv2.imwrite 返回 False")
+            encoding = archive_encoding_for(type_code)
+            target_path = target_dir / f"{image_path.stem}{encoding.suffix or image_path.suffix}"
+            target_path.write_bytes(encoding.encode(annotated_image))
+        elif payload:
+            target_path.write_bytes(payload)
         else:
             shutil.copy2(str(image_path), str(target_path))
     except Exception as exc:
         report_logger.error(f"保存识别结果失败 {image_path} -> {target_path}: {exc}")
         return None
 
+    if sidecar is not None:
+        write_sidecar(target_path, sidecar)
+    record_indexes.notify_archived(target_path)
     return target_path
 
 
@@ -191,7 +409,9 @@ def immediate_process_single(filename: str, save_dir: str) -> None:
         time_fmt = name_parts[3].split('.')[0].replace('-', ':')
         full_path = Path(save_dir) / base
 
-        count, tag, annotated = analyze_image_with_yolo(full_path, device_code)
+        tag, image, detections = _detect_image(full_path, device_code)
+        count = len(detections) if detections is not None else 0
+        annotated, sidecar = _archive_outputs(_resolve_device_type(device_code), image, detections, tag)
         writer = global_setting.get_setting("global_report_writer")
         lock = global_setting.get_setting("report_lock")
         if writer is None or lock is None:
@@ -211,8 +431,12 @@ def immediate_process_single(filename: str, save_dir: str) -> None:
             writer.file_path = latest
 
         with lock:
+            # 逐张即时写入只追加日志，报告快照按 report_snapshot_interval 定期写出
             writer.update_data(date_fmt, time_fmt, device_code, count)
-        writer.csv_close()
+        store = global_setting.get_setting("detection_store")
+        if store is not None:
+            store.add(DetectionRecord(device=device_code, date=date_fmt, time=time_fmt, count=count, model_tag=tag))
+            store.flush()
         server_cfg = global_setting.get_setting("server_config")
         if server_cfg:
             base_dir = Path(server_cfg['Storage']['fold_path']).resolve()
@@ -220,23 +444,50 @@ def immediate_process_single(filename: str, save_dir: str) -> None:
         else:
             base_dir = Path(save_dir).resolve().parent
             record_suffix = "Record"
-        stored_path = _store_processed_image(full_path, annotated, base_dir, record_suffix)
+        stored_path = _store_processed_image(full_path, annotated, base_dir, record_suffix, sidecar=sidecar)
         if stored_path is not None:
             try:
                 full_path.unlink(missing_ok=True)
             except Exception as cleanup_exc:
                 report_logger.warning(f"删除临时文件失败 {full_path}: {cleanup_exc}")
         report_logger.info(f"即时统计完成 {device_code} -> {count} ({tag})")
-        done_event = global_setting.get_setting("processing_done")
-        if done_event is not None:
-            done_event.set()
+        refresh_bus = global_setting.get_setting("refresh_bus")
+        if refresh_bus is not None:
+            refresh_bus.publish("image", device_code)
     except Exception as exc:
         report_logger.error(f"即时处理失败 {filename}: {exc}")
 
 
+def _detection_record(job: PipelineJob) -> DetectionRecord:
+    device_code, date_fmt, time_fmt = job.metadata
+    class_counts: Dict[str, int] = {}
+    scores: List[float] = []
+    config = _MODEL_CONFIGS.get(job.device_type)
+    for det in job.detections or []:
+        if config is not None and 0 <= det.class_id < len(config.class_names):
+            name = config.class_names[det.class_id]
+        else:
+            name = str(det.class_id)
+        class_counts[name] = class_counts.get(name, 0) + 1
+        scores.append(det.score)
+    return DetectionRecord(
+        device=device_code,
+        date=date_fmt,
+        time=time_fmt,
+        count=job.count,
+        model_tag=job.tag,
+        class_counts=class_counts,
+        scores=scores,
+        latency_ms=job.latency_ms,
+    )
+
+
 class report_writing:
     """
     将处理的坐标写入csv文件
+
+    update_data 只追加日志并更新内存索引（见 server/report_store.py），
+    “每台设备一行”的报告 CSV 按 report_snapshot_interval 定期重写，或在 csv_close 时写出。
     """
 
     def __init__(self, file_path, file_name_preffix, file_name_suffix):
@@ -246,6 +497,13 @@ class report_writing:
         self.max_retry_attempts = 5  # 最大重试次数
         self.retry_delay = 1  # 重试间隔（秒）
         self.file_lock = threading.Lock()  # 文件操作锁
+        self.snapshot_interval = 5.0  # 报告快照间隔（秒）
+        server_cfg = global_setting.get_setting("server_config")
+        if server_cfg:
+            try:
+                self.snapshot_interval = float(server_cfg["Storage"].get("report_snapshot_interval", 5))
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Storage.report_snapshot_interval 配置无效，使用默认值 5")
 
         self.file_name_preffix = file_name_preffix
         self.file_name_suffix = file_name_suffix
@@ -296,16 +554,8 @@ class report_writing:
     def get_latest_file(self, folder_path):
         if not os.path.exists(folder_path):
             os.makedirs(folder_path)
-        # 获取文件夹内所有文件的完整路径
-        files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if
-                 os.path.isfile(os.path.join(folder_path, f))]
-
-        if not files:  # 如果文件夹为空
-            return None
-
-        # 使用 max 函数找到修改时间最新的文件
-        latest_file = max(files, key=os.path.getmtime)
-        return latest_file
+        # 当前报告文件记录在内存与指针文件中，只在指针失效时扫描目录
+        return report_files.current(folder_path, self.file_name_preffix, self.file_name_suffix)
 
     def csv_create(self):
         def _create_operation():
@@ -315,27 +565,47 @@ class report_writing:
                 writer = csv.writer(file)
                 writer.writerow(["日期", "时间", "设备号", "数量"])
 
-        return self._safe_file_operation(_create_operation)
+        result = self._safe_file_operation(_create_operation)
+        report_files.set_current(self.file_direct_path, self.file_path)
+        index = peek_report_index(self.file_path)
+        if index is not None:
+            index.reset()
+        return result
+
+    def _report_index(self):
+        return get_report_index(self.file_path, self.encoding, self.snapshot_interval)
+
+    def _write_snapshot(self, data):
+        index = peek_report_index(self.file_path)
+        self.csv_write_multiple(data)
+        # 原文件被占用时 csv_write_multiple 会改写到新文件，新文件沿用同一份索引
+        if index is not None and os.path.normcase(os.path.abspath(index.path)) != os.path.normcase(os.path.abspath(self.file_path)):
+            alias_report_index(index, self.file_path)
+
+    def flush_report(self):
+        """写出报告快照（有未写出的变化时）。失败时保留追加日志，下次再写。"""
+        index = peek_report_index(self.file_path)
+        if index is None:
+            return
+        try:
+            index.flush(writer=self._write_snapshot)
+        except Exception as exc:
+            logger.error(f"写出报告快照失败 {self.file_path}: {exc}")
 
     def update_data(self, date, time, equipment_number, nums):
-        # 读取现有数据
-        current_data = self.csv_read()
-
-        # 如果设备号已存在，更新数据，否则添加
-        current_data[equipment_number] = {
-            "日期": date,
-            "时间": time,
-            "设备号": equipment_number,
-            "数量": nums,
-        }
-
-        # 写回 CSV
-        self.csv_write_multiple(current_data)
+        # 追加日志并更新内存索引；设备号已存在则更新，否则添加
+        index = self._report_index()
+        index.append(date, time, equipment_number, nums)
+        if index.snapshot_due():
+            self.flush_report()
 
     def csv_read(self):
         """
         安全读取CSV文件，支持文件被占用时的处理
         """
+        index = peek_report_index(self.file_path)
+        if index is not None:
+            return {row['设备号']: row for row in index.records()}
 
         def _read_operation():
             data = {}
@@ -371,6 +641,9 @@ class report_writing:
         """
         安全读取CSV文件为列表格式
         """
+        index = peek_report_index(self.file_path)
+        if index is not None:
+            return index.records()
 
         def _read_operation():
             data = []
@@ -432,6 +705,7 @@ class report_writing:
                         new_file = os.path.basename(target_file)
                         print(f"✅ 原文件 {old_file} 被占用，数据已写入新文件 {new_file}")
                         self.file_path = target_file
+                        report_files.set_current(self.file_direct_path, target_file)
                     return
 
                 except PermissionError:
@@ -453,6 +727,7 @@ class report_writing:
         return self._safe_file_operation(_write_operation)
 
     def csv_close(self):
+        self.flush_report()
         if self.csv_file is not None:
             self.csv_file.close()
             self.csv_file = None
@@ -501,20 +776,32 @@ class Img_process(Thread):
             file_name_preffix=report_file_name_preffix,
             file_name_suffix=report_file_name_suffix,
         )
+        process_cfg = server_cfg['Image_Process'] if server_cfg else {}
+        # 待处理文件索引：先注册再扫描，Server 之后写入的文件通过 add() 通知
+        self.temp_index = TempFolderIndex.from_config(
+            [self.base_path / f"{t}_{self.temp_folder}" for t in self.types], IMAGE_EXTENSIONS, process_cfg
+        )
+        global_setting.set_setting("temp_index", self.temp_index)
+        self.temp_index.start()
+        self.pipeline = ImagePipeline(
+            decode=self._decode_job,
+            infer=self._infer_jobs,
+            encode=self._encode_job,
+            finalize=self._finalize_job,
+            batch_size=self._read_int(process_cfg, 'batch_size', 1),
+            decode_workers=self._read_int(process_cfg, 'decode_workers', 2),
+            encode_workers=self._read_int(process_cfg, 'encode_workers', 2),
+            queue_size=self._read_int(process_cfg, 'queue_size', 16),
+        )
         self.running = False
 
-    def get_image_files(self) -> Sequence[Path]:
-        """获取临时目录中的所有图片文件（非递归）。"""
-
-        image_files: list[Path] = []
-        for t in self.types:
-            temp_dir = self.base_path / f"{t}_{self.temp_folder}"
-            temp_dir.mkdir(parents=True, exist_ok=True)
-            for entry in temp_dir.iterdir():
-                if entry.is_file() and entry.suffix.lower() in IMAGE_EXTENSIONS:
-                    image_files.append(entry)
-        image_files.sort()
-        return image_files
+    @staticmethod
+    def _read_int(section, key: str, default: int) -> int:
+        try:
+            return max(1, int(section.get(key, default)))
+        except Exception:
+            logger.warning(f"Image_Process.{key} 配置无效，使用默认值 {default}")
+            return default
 
     def image_process_remains(self) -> None:
         if self.has_files():
@@ -522,7 +809,15 @@ class Img_process(Thread):
             self.image_processing()
 
     def has_files(self) -> bool:
-        return any(self.get_image_files())
+        handoff = self._handoff()
+        if handoff is not None and handoff.pending() > 0:
+            return True
+        self.temp_index.refresh()
+        return self.temp_index.pending() > 0
+
+    @staticmethod
+    def _handoff() -> Optional[FrameHandoff]:
+        return global_setting.get_setting("image_handoff")
 
     # 运行结束
     def join(self, timeout: Optional[float] = None):
@@ -534,6 +829,12 @@ class Img_process(Thread):
 
     def stop(self):
         self.running = False
+        self.pipeline.stop()
+        self.temp_index.stop()
+        handoff = self._handoff()
+        if handoff is not None:
+            # 仍在内存中的图片写入 Temp，下次启动时补处理
+            handoff.stop()
         condition = global_setting.get_setting("condition")
         if condition is not None:
             with condition:
@@ -558,7 +859,8 @@ class Img_process(Thread):
         while self.running:
             if not self.has_files():
                 with condition:
-                    condition.wait(timeout=poll_interval or None)
+                    # 未配置 delay 时仍按对账间隔醒来，发现外部拷入 Temp 的文件
+                    condition.wait(timeout=poll_interval or self.temp_index.rescan_interval or None)
                 if not self.running:
                     break
                 # 醒来后再次检查是否有文件，没有则继续等待
@@ -571,8 +873,11 @@ class Img_process(Thread):
                 time.sleep(poll_interval)
 
     def image_processing(self) -> None:
-        images = list(self.get_image_files())
-        if not images:
+        handoff = self._handoff()
+        handed_off = handoff.drain() if handoff is not None else []
+        # 内存交接中的图片其 Temp 文件只是恢复日志，不重复处理
+        images = self.temp_index.take(exclude=handoff.inflight_paths() if handoff is not None else None)
+        if not images and not handed_off:
             report_logger.warning("暂未检测到待处理的 FL/YL 图像")
             return
 
@@ -582,29 +887,35 @@ class Img_process(Thread):
         else:
             self.data_save.file_path = latest_file
 
-        processed_any = False
-        event = global_setting.get_setting("processing_done")
-
-        for image_path in images:
+        jobs: List[PipelineJob] = []
+        sources = [(item.path, item) for item in handed_off] + [(image_path, None) for image_path in images]
+        for image_path, item in sources:
             metadata = self._parse_image_metadata(image_path)
             if metadata is None:
                 report_logger.warning(f"文件名不符合约定，跳过: {image_path.name}")
+                if item is not None:
+                    handoff.complete(item)
                 image_path.unlink(missing_ok=True)
                 continue
+            device_type = _resolve_device_type(metadata[0]) or ""
+            jobs.append(PipelineJob(image_path=image_path, device_type=device_type, metadata=metadata, handoff=item))
+        # 同类型设备相邻，便于推理级按 batch_size 成批
+        jobs.sort(key=lambda job: job.device_type)
 
-            device_code, date_fmt, time_fmt = metadata
-            count, tag, annotated = self.image_handle(image_path, device_code)
-            self.data_save.update_data(date_fmt, time_fmt, device_code, count)
-            report_logger.info(f"完成 {device_code} 数据分析 -> {count} ({tag})")
-            self._archive_file(image_path, annotated)
-            if event is not None:
-                try:
-                    event.set()
-                except Exception:
-                    logger.debug("processing_done per-image set failed", exc_info=True)
-            processed_any = True
+        try:
+            processed_any = self.pipeline.run(jobs) > 0
+        finally:
+            self.temp_index.release(images)
 
         self.data_save.csv_close()
+        # 本轮结果一次性写入检测结果库，写入后通知界面按设备刷新数量
+        store = global_setting.get_setting("detection_store")
+        refresh_bus = global_setting.get_setting("refresh_bus")
+        if store is not None:
+            store.flush()
+            if refresh_bus is not None:
+                for device_code in sorted({job.metadata[0] for job in jobs}):
+                    refresh_bus.publish("stored", device_code)
 
         if processed_any:
             cycle_received = global_setting.get_setting("cycle_received_uids")
@@ -622,8 +933,69 @@ class Img_process(Thread):
         time_fmt = parts[3].replace('-', ':')
         return device_code, date_fmt, time_fmt
 
-    def _archive_file(self, image_path: Path, annotated_image: Optional[Any]) -> None:
-        stored_path = _store_processed_image(image_path, annotated_image, self.base_path, self.record_folder)
+    # ------------------------------------------------------------------
+    # 流水线各级处理函数
+    # ------------------------------------------------------------------
+    def _decode_job(self, job: PipelineJob) -> None:
+        logger.info(f"处理数据 {job.image_path}")
+        if job.handoff is not None:
+            job.image = cv2.imdecode(np.frombuffer(job.handoff.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        else:
+            job.image = cv2.imread(str(job.image_path))
+        if job.image is None:
+            report_logger.error(f"图片读取失败 {job.image_path}")
+
+    def _infer_jobs(self, device_type: str, jobs: List[PipelineJob]) -> None:
+        config = _MODEL_CONFIGS.get(device_type)
+        if config is None:
+            report_logger.warning(f"未配置 {device_type} 的模型，跳过 {len(jobs)} 张图片")
+            return
+        for job in jobs:
+            job.tag = config.tag
+        try:
+            detector = _DETECTORS.get(device_type)
+        except Exception as exc:
+            report_logger.error(f"加载 {device_type} 模型失败: {exc}")
+            return
+
+        started = time.perf_counter()
+        batch_detections = _predict_frames(detector, [job.image for job in jobs], device_type)
+        if batch_detections is None:
+            return
+        latency_ms = (time.perf_counter() - started) * 1000.0 / max(1, len(jobs))
+        for job, detections in zip(jobs, batch_detections):
+            job.detections = detections
+            job.count = len(detections)
+            job.latency_ms = latency_ms
+
+    def _encode_job(self, job: PipelineJob) -> None:
+        annotated, sidecar = _archive_outputs(job.device_type, job.image, job.detections, job.tag)
+        payload = job.handoff.data if job.handoff is not None else None
+        job.stored_path = _store_processed_image(
+            job.image_path, annotated, self.base_path, self.record_folder, payload, sidecar
+        )
+
+    def _finalize_job(self, job: PipelineJob) -> None:
+        device_code, date_fmt, time_fmt = job.metadata
+        self.data_save.update_data(date_fmt, time_fmt, device_code, job.count)
+        store = global_setting.get_setting("detection_store")
+        if store is not None:
+            store.add(_detection_record(job))
+        report_logger.info(f"完成 {device_code} 数据分析 -> {job.count} ({job.tag})")
+        if job.handoff is not None:
+            handoff = self._handoff()
+            if job.stored_path is None:
+                # 归档失败时与 Temp 文件流程一致：原图移入 Record
+                handoff.ensure_journaled(job.handoff)
+                self._finish_archive(job.image_path, None)
+            handoff.complete(job.handoff)
+        else:
+            self._finish_archive(job.image_path, job.stored_path)
+        refresh_bus = global_setting.get_setting("refresh_bus")
+        if refresh_bus is not None:
+            refresh_bus.publish("image", device_code)
+
+    def _finish_archive(self, image_path: Path, stored_path: Optional[Path]) -> None:
         if stored_path is not None:
             try:
                 image_path.unlink(missing_ok=True)
@@ -632,13 +1004,11 @@ class Img_process(Thread):
             return
 
         type_code = image_path.stem.split('_')[0].upper()
-        target_dir = self.base_path / f"{type_code}_{self.record_folder}"
+        target_dir = partition_dir(self.base_path / f"{type_code}_{self.record_folder}", image_path.name)
         try:
             target_dir.mkdir(parents=True, exist_ok=True)
             shutil.move(str(image_path), str(target_dir / image_path.name))
         except Exception as exc:
             report_logger.error(f"归档 {image_path} 失败: {exc}")
-
-    def image_handle(self, image_path: Path, device_code: str) -> Tuple[int, str, Optional[Any]]:
-        logger.info(f"处理数据 {image_path}")
-        return analyze_image_with_yolo(image_path, device_code)
\ No newline at end of file
+            return
+        record_indexes.notify_archived(target_dir / image_path.name)
@@ -0,0 +1,192 @@
+"""接收端背压控制与指标统计。
+
+以 Temp 文件夹中待处理图片数量（加上内存交接中尚未落盘的图片）作为下游积压深度：
+- 积压达到 pause_backlog 时暂停接收新图片，降到 resume_backlog 以下后恢复；
+- 积压超过 resume_backlog（下游处理跟不上）时，才对单台设备启用最小上传间隔限制；
+- 积压深度、接收速率等指标写入 global_setting['ingest_metrics'] 并定期输出日志。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Optional
+
+from loguru import logger
+
+from config.global_setting import global_setting
+
+
+class IngestThrottle:
+    """根据下游积压决定是否继续接收上传。"""
+
+    def __init__(
+        self,
+        base_dir: Path,
+        temp_suffix: str,
+        pause_backlog: int = 0,
+        resume_backlog: Optional[int] = None,
+        device_min_interval: float = 0.0,
+        sample_interval: float = 1.0,
+        metrics_interval: float = 60.0,
+        rate_window: float = 60.0,
+    ) -> None:
+        self.base_dir = Path(base_dir)
+        self.temp_suffix = temp_suffix
+        # pause_backlog <= 0 表示不暂停接收
+        self.pause_backlog = max(0, int(pause_backlog))
+        if resume_backlog is None:
+            resume_backlog = self.pause_backlog * 3 // 4
+        self.resume_backlog = max(0, min(int(resume_backlog), self.pause_backlog))
+        self.device_min_interval = max(0.0, float(device_min_interval))
+        self.sample_interval = max(0.1, float(sample_interval))
+        self.metrics_interval = max(0.0, float(metrics_interval))
+        self.rate_window = max(1.0, float(rate_window))
+
+        self._lock = threading.Lock()
+        self._backlog = 0
+        self._sampled_at = 0.0
+        self._paused = False
+        self._ingested: Deque[float] = deque()
+        self._total = 0
+        self._rejected = 0
+        self._device_last: Dict[str, float] = {}
+        self._logged_at = time.monotonic()
+
+    @classmethod
+    def from_config(cls, base_dir: Path, server_cfg: Dict[str, str]) -> "IngestThrottle":
+        def _number(key: str, default: float) -> float:
+            try:
+                return float(server_cfg.get(key, default))
+            except (TypeError, ValueError):
+                logger.warning(f"[Ingest] 配置 Server-{key} 无效，使用默认值 {default}")
+                return default
+
+        pause_backlog = int(_number("backlog_pause", 0))
+        resume_raw = server_cfg.get("backlog_resume")
+        return cls(
+            base_dir=base_dir,
+            temp_suffix=server_cfg.get("fold_suffix", "Temp"),
+            pause_backlog=pause_backlog,
+            resume_backlog=int(_number("backlog_resume", 0)) if resume_raw not in (None, "") else None,
+            device_min_interval=_number("device_min_interval", 0.0),
+            metrics_interval=_number("metrics_interval", 60.0),
+        )
+
+    # ------------------------------------------------------------------
+    # 积压深度
+    # ------------------------------------------------------------------
+    def backlog(self) -> int:
+        """Temp 文件夹中待处理的文件数（按 sample_interval 缓存，避免每个连接都扫描目录）。"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._sampled_at < self.sample_interval:
+                return self._backlog
+            self._sampled_at = now
+        count = self._count_pending()
+        with self._lock:
+            self._backlog = count
+        return count
+
+    def _count_pending(self) -> int:
+        # 图像处理线程已维护待处理索引时直接使用，不再扫描目录
+        temp_index = global_setting.get_setting("temp_index")
+        handoff = global_setting.get_setting("image_handoff")
+        if temp_index is not None:
+            return temp_index.backlog() + (handoff.unjournaled() if handoff is not None else 0)
+        count = 0
+        suffix = f"_{self.temp_suffix}"
+        try:
+            with os.scandir(self.base_dir) as type_dirs:
+                for type_dir in type_dirs:
+                    if not (type_dir.is_dir() and type_dir.name.endswith(suffix)):
+                        continue
+                    with os.scandir(type_dir.path) as entries:
+                        count += sum(1 for entry in entries if entry.is_file())
+        except FileNotFoundError:
+            return 0
+        except OSError as exc:
+            logger.debug(f"[Ingest] 统计 Temp 积压失败: {exc}")
+            return self._backlog
+        # 内存交接中尚未写入 Temp 的图片同样属于下游积压
+        handoff = global_setting.get_setting("image_handoff")
+        if handoff is not None:
+            count += handoff.unjournaled()
+        return count
+
+    # ------------------------------------------------------------------
+    # 背压策略
+    # ------------------------------------------------------------------
+    def should_pause(self) -> bool:
+        """积压超过上限时返回 True（带回滞，避免在阈值附近反复切换）。"""
+        backlog = self.backlog()
+        if self.pause_backlog <= 0:
+            self.maybe_log()
+            return False
+        with self._lock:
+            if not self._paused and backlog >= self.pause_backlog:
+                self._paused = True
+                logger.warning(f"[Ingest] 下游积压 {backlog} 张，暂停接收 (恢复阈值 {self.resume_backlog})")
+            elif self._paused and backlog <= self.resume_backlog:
+                self._paused = False
+                logger.info(f"[Ingest] 下游积压降至 {backlog} 张，恢复接收")
+            paused = self._paused
+        self.maybe_log()
+        return paused
+
+    def admit(self, uid: str) -> bool:
+        """下游跟不上时，对上传间隔小于 device_min_interval 的设备拒绝本次上传。"""
+        if self.device_min_interval <= 0:
+            return True
+        now = time.monotonic()
+        behind = self.backlog() > self.resume_backlog
+        with self._lock:
+            last = self._device_last.get(uid)
+            if behind and last is not None and now - last < self.device_min_interval:
+                self._rejected += 1
+                return False
+            self._device_last[uid] = now
+        return True
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+    def record_ingest(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._ingested.append(now)
+            self._total += 1
+            # 新图片写入 Temp，积压估计值同步加一，直到下次采样
+            self._backlog += 1
+        self.maybe_log()
+
+    def snapshot(self) -> Dict[str, float]:
+        now = time.monotonic()
+        with self._lock:
+            while self._ingested and now - self._ingested[0] > self.rate_window:
+                self._ingested.popleft()
+            return {
+                "backlog": self._backlog,
+                "paused": self._paused,
+                "ingest_per_min": len(self._ingested) * 60.0 / self.rate_window,
+                "total": self._total,
+                "rejected": self._rejected,
+            }
+
+    def maybe_log(self) -> None:
+        metrics = self.snapshot()
+        global_setting.set_setting("ingest_metrics", metrics)
+        if self.metrics_interval <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._logged_at < self.metrics_interval:
+                return
+            self._logged_at = now
+        logger.info(
+            f"[Ingest] 积压={metrics['backlog']} 接收速率={metrics['ingest_per_min']:.1f}张/分 "
+            f"累计={metrics['total']} 限流拒绝={metrics['rejected']} 暂停={'是' if metrics['paused'] else '否'}"
+        )
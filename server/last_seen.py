@@ -0,0 +1,146 @@
+"""图像设备 last_seen 状态的快照与启动恢复。
+
+原启动流程逐个列出 FL/YL Record 目录中的全部 PNG 并对每个文件名 strptime，
+归档一年后会把启动拖慢数分钟。现在：
+- 运行期间按 snapshot_interval 定期、退出时再写一次 ``<fold_path>/last_seen.json``
+  （{"saved_at": epoch, "last_seen": {uid: epoch}}）；
+- 启动时先加载快照（O(设备数)），再只统计修改时间晚于快照的归档文件；
+- 没有快照时全量扫描，各 Record 目录按日分区 / 打包文件拆分，在线程池中并行列出；
+  同一设备只比较文件名中的时间字符串（格式定长，可按字典序比较），每台设备只解析一次时间。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+
+from server.archive import iter_partition_images, iter_partitions
+
+SNAPSHOT_FILE_NAME = "last_seen.json"
+# 快照时间之前写入、之后才归档的文件仍按修改时间筛选，留出余量
+SNAPSHOT_MARGIN = 60.0
+
+
+def device_key_from_uid(uid: str) -> Optional[Tuple[str, str]]:
+    """AA{TYPE}-{XXXXXX}-... -> (TYPE, XXXXXX)。"""
+    parts = uid.split("-")
+    if len(parts) < 2 or len(parts[0]) < 3:
+        return None
+    return parts[0][2:].upper(), parts[1]
+
+
+def _scan_partition(path: Path, bundled: bool, since: float) -> Dict[Tuple[str, str], str]:
+    """返回 {(TYPE, XXXXXX): 'YYYY-MM-DD_HH-MM-SS'}，只统计修改时间晚于 since 的图片（单个日分区或打包文件）。"""
+    latest: Dict[Tuple[str, str], str] = {}
+    for image in iter_partition_images(path, bundled, since):
+        # 期望: TYPE, XXXXXX, YYYY-MM-DD, HH-MM-SS.png
+        parts = image.name.split("_")
+        if len(parts) < 4:
+            continue
+        key = (parts[0], parts[1])
+        stamp = f"{parts[2]}_{parts[3].split('.')[0]}"
+        if stamp > latest.get(key, ""):
+            latest[key] = stamp
+    return latest
+
+
+def scan_record_dirs(record_dirs: Iterable[str], since: float = 0.0, workers: int = 4) -> Dict[Tuple[str, str], float]:
+    """扫描 Record 目录，返回各设备最新的采集时间（epoch）；每个日分区 / 打包文件是一个并行任务。"""
+    units = [unit for d in record_dirs if os.path.isdir(d) for unit in iter_partitions(d, since, include_bundles=True)]
+    if not units:
+        return {}
+    merged: Dict[Tuple[str, str], str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(units))), thread_name_prefix="last_seen_scan") as pool:
+        for result in pool.map(lambda unit: _scan_partition(*unit, since), units):
+            for key, stamp in result.items():
+                if stamp > merged.get(key, ""):
+                    merged[key] = stamp
+    seen: Dict[Tuple[str, str], float] = {}
+    for key, stamp in merged.items():
+        try:
+            seen[key] = time.mktime(time.strptime(stamp, "%Y-%m-%d_%H-%M-%S"))
+        except ValueError:
+            continue
+    return seen
+
+
+class LastSeenSnapshot:
+    """last_seen_image 的持久化快照，带后台定期写入线程。"""
+
+    def __init__(self, path: str, interval: float = 300.0) -> None:
+        self.path = path
+        self.interval = max(0.0, float(interval))
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, server_cfg) -> "LastSeenSnapshot":
+        storage = server_cfg["Storage"]
+        try:
+            interval = float(storage.get("last_seen_snapshot_interval", 300))
+        except (TypeError, ValueError):
+            logger.warning("Storage.last_seen_snapshot_interval 配置无效，使用默认值 300")
+            interval = 300.0
+        return cls(os.path.join(storage["fold_path"], SNAPSHOT_FILE_NAME), interval)
+
+    def load(self) -> Tuple[Dict[str, float], float]:
+        """返回 (last_seen, saved_at)；没有或无法读取快照时返回 ({}, 0)。"""
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as file:
+                data = json.load(file)
+            last_seen = {str(uid): float(ts) for uid, ts in data.get("last_seen", {}).items()}
+            return last_seen, float(data.get("saved_at", 0))
+        except FileNotFoundError:
+            return {}, 0.0
+        except (OSError, ValueError, TypeError, AttributeError) as exc:
+            logger.warning(f"读取 last_seen 快照失败，将全量扫描: {exc}")
+            return {}, 0.0
+
+    def save(self, last_seen: Dict[str, float]) -> None:
+        # 接收线程可能同时更新字典，复制失败时重试
+        for _ in range(3):
+            try:
+                items = dict(last_seen)
+                break
+            except RuntimeError:
+                continue
+        else:
+            return
+        data = {"saved_at": time.time(), "last_seen": items}
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp_path, mode="w", encoding="utf-8") as file:
+                json.dump(data, file)
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            logger.warning(f"写入 last_seen 快照失败: {exc}")
+
+    def start(self, get_last_seen) -> None:
+        """每隔 interval 秒写一次快照（interval <= 0 时只在退出时写入）。"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+
+        def _loop() -> None:
+            while not self._stop_event.wait(self.interval):
+                last_seen = get_last_seen()
+                if last_seen is not None:
+                    self.save(last_seen)
+
+        self._thread = threading.Thread(target=_loop, name="last_seen_snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, last_seen: Optional[Dict[str, float]] = None) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if last_seen is not None:
+            self.save(last_seen)
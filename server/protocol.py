@@ -0,0 +1,141 @@
+"""图片上传协议的定长帧接收。
+
+帧格式（大端）：nonce(16) + tag(16) + UID(32, 以 \\x00 填充) + 密文长度(4) + 密文。
+接收时先按声明长度一次性分配缓冲区，再用 recv_into 直接写入 memoryview，
+避免小块 recv 与 bytearray 反复扩容；每个字段都会循环读满，防止 TCP 分片导致协议头错位。
+
+会话扩展（协议版本 1）：
+- 连接建立后客户端先发送 8 字节握手 SESSION_MAGIC + 版本号 + 保留字节(0)，
+  服务端回复相同格式的握手，版本号为服务端接受的版本，最后一字节为会话空闲超时秒数
+  （超过 255 秒按 255 发送，0 表示未声明），客户端两帧间隔超过该值时应先重新连接；
+- 之后客户端可在同一连接上连续发送多个上述帧，每帧收到 5 字节应答：状态(1) + 帧序号(4)；
+- 不以握手开头的连接按旧协议处理：只接收一帧，不应答，接收后关闭连接。
+握手魔数与随机 nonce 的前 8 字节碰撞的概率可忽略。
+"""
+
+from __future__ import annotations
+
+import socket
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+NONCE_SIZE = 16
+TAG_SIZE = 16
+UID_SIZE = 32
+LENGTH_SIZE = 4
+HEADER_SIZE = NONCE_SIZE + TAG_SIZE + UID_SIZE + LENGTH_SIZE
+
+SESSION_MAGIC = b"SDSESS"
+PROTOCOL_VERSION = 1
+HELLO_SIZE = len(SESSION_MAGIC) + 2
+ACK_SIZE = 5
+
+# 帧应答状态
+ACK_OK = 0
+ACK_CORRUPTED = 1  # 解密校验失败，已按损坏图片记录
+ACK_REJECTED = 2  # 超出大小限制或被限流，服务端随后关闭会话
+
+DEFAULT_RECV_SIZE = 256 * 1024
+DEFAULT_MAX_IMAGE_SIZE = 32 * 1024 * 1024
+
+
+class FrameError(ValueError):
+    """帧格式错误或声明长度超出限制。"""
+
+
+class IncompleteFrame(ConnectionError):
+    """连接在字段读满之前关闭，received 为已收到的字节数，partial 为已收到的数据（如有）。"""
+
+    def __init__(self, expected: int, received: int, partial: bytes = b"") -> None:
+        super().__init__(f"connection closed after {received}/{expected} bytes")
+        self.expected = expected
+        self.received = received
+        self.partial = partial
+
+
+@dataclass(frozen=True)
+class FrameHeader:
+    nonce: bytes
+    tag: bytes
+    uid: str
+    size: int
+
+
+def parse_header(header: bytes) -> FrameHeader:
+    if len(header) != HEADER_SIZE:
+        raise FrameError(f"header must be {HEADER_SIZE} bytes, got {len(header)}")
+    offset = 0
+    nonce = bytes(header[offset : offset + NONCE_SIZE])
+    offset += NONCE_SIZE
+    tag = bytes(header[offset : offset + TAG_SIZE])
+    offset += TAG_SIZE
+    # Remove null padding and decode
+    uid = bytes(header[offset : offset + UID_SIZE]).rstrip(b"\x00").decode("utf-8")
+    offset += UID_SIZE
+    size = int.from_bytes(header[offset : offset + LENGTH_SIZE], byteorder="big")
+    return FrameHeader(nonce=nonce, tag=tag, uid=uid, size=size)
+
+
+def recv_into_exact(conn: socket.socket, view: memoryview, recv_size: int = DEFAULT_RECV_SIZE) -> None:
+    """循环 recv_into 直到 view 被填满，连接提前关闭时抛出 IncompleteFrame。"""
+    received = 0
+    total = len(view)
+    while received < total:
+        n = conn.recv_into(view[received:], min(total - received, recv_size))
+        if n == 0:
+            raise IncompleteFrame(total, received)
+        received += n
+
+
+def recv_exact(conn: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    recv_into_exact(conn, memoryview(buffer))
+    return buffer
+
+
+def recv_header(conn: socket.socket) -> FrameHeader:
+    return parse_header(recv_exact(conn, HEADER_SIZE))
+
+
+def recv_body(conn: socket.socket, size: int, recv_size: int = DEFAULT_RECV_SIZE, max_size: int = DEFAULT_MAX_IMAGE_SIZE) -> bytearray:
+    """按声明长度预分配缓冲区并读满密文。"""
+    if max_size > 0 and size > max_size:
+        raise FrameError(f"declared image size {size} exceeds limit {max_size}")
+    body = bytearray(size)
+    try:
+        recv_into_exact(conn, memoryview(body), recv_size)
+    except IncompleteFrame as exc:
+        raise IncompleteFrame(exc.expected, exc.received, bytes(body[: exc.received])) from None
+    return body
+
+
+def build_header(nonce: bytes, tag: bytes, uid: str, size: int) -> bytes:
+    # Send UID as fixed 32-byte string (padded with null bytes if shorter)
+    uid_padded = uid.encode("utf-8")[:UID_SIZE].ljust(UID_SIZE, b"\x00")
+    return bytes(nonce) + bytes(tag) + uid_padded + size.to_bytes(LENGTH_SIZE, byteorder="big")
+
+
+def build_hello(version: int = PROTOCOL_VERSION, idle_timeout: float = 0) -> bytes:
+    return SESSION_MAGIC + bytes((version, min(255, max(0, int(idle_timeout)))))
+
+
+def parse_hello(prefix: bytes) -> Optional[int]:
+    """前 HELLO_SIZE 字节是会话握手时返回版本号，否则返回 None（旧协议的帧头）。"""
+    if len(prefix) != HELLO_SIZE or bytes(prefix[: len(SESSION_MAGIC)]) != SESSION_MAGIC:
+        return None
+    return prefix[len(SESSION_MAGIC)]
+
+
+def hello_idle_timeout(prefix: bytes) -> int:
+    """服务端握手中声明的会话空闲超时秒数，0 表示未声明（旧版服务端）。"""
+    return prefix[len(SESSION_MAGIC) + 1] if len(prefix) == HELLO_SIZE else 0
+
+
+def build_ack(status: int, sequence: int) -> bytes:
+    return bytes((status,)) + (sequence & 0xFFFFFFFF).to_bytes(4, byteorder="big")
+
+
+def parse_ack(data: bytes) -> Tuple[int, int]:
+    if len(data) != ACK_SIZE:
+        raise FrameError(f"ack must be {ACK_SIZE} bytes, got {len(data)}")
+    return data[0], int.from_bytes(data[1:], byteorder="big")
@@ -0,0 +1,219 @@
+"""Build INT8 variants of the FL/YL detectors with an accuracy gate.
+
+Static quantization is calibrated on archived frames from the device type's
+``<TYPE>_Record`` folder; a disjoint held-out slice of the same folder is then
+run through both the FP32 and the INT8 model and per-image detection counts
+are compared. The INT8 model is only written next to the FP32 one (as
+``<stem>.int8.onnx``, which ``ModelConfig.precision_path`` resolves) when the
+drift stays within tolerance; otherwise it is discarded and the tool exits
+with status 1. A JSON accuracy report is written either way.
+
+Requires the ``onnx`` package in addition to onnxruntime (pinned in
+requirements.txt); the CLI checks for it before loading any images.
+
+Usage:
+    python -m server.quantize --type FL
+    python -m server.quantize --type YL --mode dynamic --tolerance 0.03
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from config.ini_parser import ini_parser
+from server.archive import iter_images
+from server.detect import LetterboxPreprocessor, OnnxYoloDetector
+from server.image_process import _MODEL_CONFIGS, ModelConfig
+
+
+class _RecordCalibrationReader:
+    """CalibrationDataReader feeding letterboxed Record frames one at a time."""
+
+    def __init__(self, input_name: str, image_paths: Sequence[Path], imgsz: int) -> None:
+        self.input_name = input_name
+        self.image_paths = list(image_paths)
+        self.preprocessor = LetterboxPreprocessor(imgsz)
+        self._index = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        while self._index < len(self.image_paths):
+            image = cv2.imread(str(self.image_paths[self._index]))
+            self._index += 1
+            if image is None:
+                continue
+            tensor = self.preprocessor.batch_buffer(1)
+            self.preprocessor.fill(image, tensor[0])
+            return {self.input_name: tensor.copy()}
+        return None
+
+    def rewind(self) -> None:
+        self._index = 0
+
+
+def default_record_dir(type_code: str, config_path: Path) -> Path:
+    server_cfg = ini_parser().read(str(config_path)) or {}
+    storage = server_cfg.get("Storage", {})
+    suffix = server_cfg.get("Image_Process", {}).get("fold_suffix", "Record")
+    return Path(storage.get("fold_path", "./data_smart_device/")) / f"{type_code}_{suffix}"
+
+
+def split_images(record_dir: Path, calib_count: int, holdout_count: int, seed: int) -> Tuple[List[Path], List[Path]]:
+    # Bundled (zipped) days are skipped; calibration needs files cv2 can read directly
+    images = sorted(image.path for image in iter_images(record_dir))
+    random.Random(seed).shuffle(images)
+    return images[:calib_count], images[calib_count : calib_count + holdout_count]
+
+
+def quantize_model(model_path: Path, output_path: Path, mode: str, calib_images: Sequence[Path], imgsz: int) -> None:
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if mode == "dynamic":
+        quantize_dynamic(str(model_path), str(output_path), weight_type=QuantType.QInt8)
+        return
+
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    source = model_path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            # Shape inference + graph cleanup recommended before static quantization
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            prepared = Path(tmp_dir) / "prepared.onnx"
+            quant_pre_process(str(model_path), str(prepared))
+            source = prepared
+        except Exception as exc:
+            print(f"[WARN] quant_pre_process skipped: {exc}")
+
+        quantize_static(
+            str(source),
+            str(output_path),
+            _RecordCalibrationReader(input_name, calib_images, imgsz),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+
+
+def compare_counts(config: ModelConfig, candidate_path: Path, holdout: Sequence[Path]) -> Dict[str, object]:
+    kwargs = dict(
+        class_names=config.class_names,
+        imgsz=config.imgsz,
+        conf_threshold=config.conf_threshold,
+        iou_threshold=config.iou_threshold,
+        nms_top_k=config.nms_top_k,
+        max_det=config.max_det,
+        providers=["CPUExecutionProvider"],
+    )
+    reference = OnnxYoloDetector(model_path=config.model_path, **kwargs)
+    candidate = OnnxYoloDetector(model_path=candidate_path, **kwargs)
+
+    rows: List[Dict[str, object]] = []
+    timings = {"fp32": 0.0, "int8": 0.0}
+    for image_path in holdout:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        start = time.perf_counter()
+        fp32_count = len(reference.predict(image))
+        timings["fp32"] += time.perf_counter() - start
+        start = time.perf_counter()
+        int8_count = len(candidate.predict(image))
+        timings["int8"] += time.perf_counter() - start
+        rows.append({"image": image_path.name, "fp32": fp32_count, "int8": int8_count})
+
+    fp32_total = sum(int(row["fp32"]) for row in rows)
+    int8_total = sum(int(row["int8"]) for row in rows)
+    per_image_diff = [abs(int(row["fp32"]) - int(row["int8"])) for row in rows]
+    evaluated = max(1, len(rows))
+    return {
+        "images": len(rows),
+        "fp32_total": fp32_total,
+        "int8_total": int8_total,
+        "total_drift": abs(int8_total - fp32_total) / max(1, fp32_total),
+        "max_image_diff": max(per_image_diff, default=0),
+        "mean_image_diff": sum(per_image_diff) / evaluated,
+        "fp32_ms_per_image": timings["fp32"] * 1000 / evaluated,
+        "int8_ms_per_image": timings["int8"] * 1000 / evaluated,
+        "rows": rows,
+    }
+
+
+def run_cli(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Quantize a detector to INT8 and gate it on count accuracy")
+    parser.add_argument("--type", required=True, choices=sorted(_MODEL_CONFIGS), help="Device type to quantize")
+    parser.add_argument("--mode", default="static", choices=("static", "dynamic"), help="Quantization mode")
+    parser.add_argument("--record-dir", type=str, default=None, help="Calibration/held-out image folder")
+    parser.add_argument("--config", type=str, default="./server_config.ini", help="server_config.ini path")
+    parser.add_argument("--calib-count", type=int, default=100, help="Images used for static calibration")
+    parser.add_argument("--holdout-count", type=int, default=50, help="Held-out images for the accuracy report")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Max relative drift of total counts")
+    parser.add_argument("--max-image-diff", type=int, default=1, help="Max absolute count diff on any image")
+    parser.add_argument("--seed", type=int, default=0, help="Shuffle seed for the calibration/held-out split")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    # onnxruntime.quantization imports onnx lazily; fail before calibration instead of mid-run
+    if importlib.util.find_spec("onnx") is None:
+        print("[ERROR] the onnx package is required for quantization: pip install onnx==1.17.0")
+        return 1
+
+    config = _MODEL_CONFIGS[args.type]
+    record_dir = Path(args.record_dir) if args.record_dir else default_record_dir(args.type, Path(args.config))
+    calib, holdout = split_images(record_dir, args.calib_count, args.holdout_count, args.seed)
+    if not holdout or (args.mode == "static" and not calib):
+        print(f"[ERROR] not enough images in {record_dir} (calibration={len(calib)}, held-out={len(holdout)})")
+        return 1
+
+    output_path = config.precision_path("int8")
+    candidate_path = output_path.with_name(output_path.name + ".candidate")
+    print(f"[INFO] {args.type}: {args.mode} quantization of {config.model_path.name} ({len(calib)} calibration images)")
+    quantize_model(config.model_path, candidate_path, args.mode, calib, config.imgsz)
+
+    report = compare_counts(config, candidate_path, holdout)
+    passed = report["total_drift"] <= args.tolerance and report["max_image_diff"] <= args.max_image_diff
+    report.update(
+        {
+            "type": args.type,
+            "mode": args.mode,
+            "fp32_model": config.model_path.name,
+            "int8_model": output_path.name,
+            "tolerance": args.tolerance,
+            "max_image_diff_allowed": args.max_image_diff,
+            "passed": passed,
+        }
+    )
+    report_path = output_path.with_name(f"{output_path.stem}.report.json")
+    report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(
+        f"[INFO] held-out {report['images']} images: fp32={report['fp32_total']} int8={report['int8_total']} "
+        f"drift={report['total_drift']:.3%} max_image_diff={report['max_image_diff']} "
+        f"({report['fp32_ms_per_image']:.1f} -> {report['int8_ms_per_image']:.1f} ms/image)"
+    )
+    if not passed:
+        candidate_path.unlink(missing_ok=True)
+        print(f"[ERROR] INT8 model rejected (report: {report_path})")
+        return 1
+
+    os.replace(candidate_path, output_path)
+    print(f"[INFO] INT8 model accepted -> {output_path} (report: {report_path})")
+    print(f"[INFO] enable with [Inference] precision_{args.type.lower()} = int8")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(run_cli())
@@ -0,0 +1,246 @@
+"""Record 目录的增量内存索引。
+
+图库原先每次刷新都 iterdir() 整个 Record 目录并逐个 stat() 排序，归档数万张后
+每次上传都会让界面卡顿数秒。这里每个 Record 目录只扫描一次（``rescan``，由图库在后台线程池调用；
+通过 ``server.archive.iter_images``，含日分区，不含已打包的日期），之后由归档流程（``_store_processed_image`` /
+``_finish_archive`` / ArchiveManager）调用 ``notify_archived`` / ``notify_removed`` 增量更新：
+- 全部图片按 (修改时间, 文件名) 升序保存在列表中，图库按从新到旧分页读取；
+- 每台设备另有一个同样排序的子列表，设备跳转取子列表末尾后二分定位，O(log n)；
+- ``version`` 在每次变化时递增，图库据此判断是否需要刷新；
+- 扫描不持有锁，期间的归档通知先排队，扫描结果替换后按顺序重放；扫描完成前查询返回空结果。
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from server.archive import ARCHIVE_EXTENSIONS, iter_images
+
+# (修改时间纳秒, 文件名)
+EntryKey = Tuple[int, str]
+
+
+def device_code_from_name(name: str) -> Optional[str]:
+    """TYPE_XXXXXX_YYYY-MM-DD_HH-MM-SS.png -> TYPE_XXXXXX。"""
+    parts = Path(name).stem.split("_")
+    if len(parts) < 2:
+        return None
+    return f"{parts[0]}_{parts[1]}"
+
+
+class RecordIndex:
+    """单个 Record 目录的有序索引，线程安全。"""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.version = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._entries: List[EntryKey] = []
+        self._by_name: Dict[str, EntryKey] = {}
+        self._paths: Dict[str, Path] = {}
+        self._by_device: Dict[str, List[EntryKey]] = {}
+        # 扫描期间收到的通知：(是否新增, 路径, 修改时间纳秒)
+        self._scanning = False
+        self._pending: List[Tuple[bool, Path, Optional[int]]] = []
+
+    # ------------------------------------------------------------------
+    # 维护
+    # ------------------------------------------------------------------
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def rescan(self) -> bool:
+        """扫描整个目录（耗时，应在后台线程调用）；已有扫描进行中时返回 False。
+
+        目录遍历不持有锁，查询和归档通知不会被阻塞；扫描期间的通知排队，替换结果后重放，不会丢失。
+        """
+        with self._lock:
+            if self._scanning:
+                return False
+            self._scanning = True
+            self._pending = []
+        try:
+            entries: List[EntryKey] = []
+            paths: Dict[str, Path] = {}
+            for image in iter_images(self.directory):
+                entries.append((int(image.mtime * 1e9), image.name))
+                paths[image.name] = image.path
+            entries.sort()
+            by_device: Dict[str, List[EntryKey]] = {}
+            for key in entries:
+                code = device_code_from_name(key[1])
+                if code:
+                    # entries 已排序，子列表按顺序追加即有序
+                    by_device.setdefault(code, []).append(key)
+        except BaseException:
+            with self._lock:
+                self._scanning = False
+                self._pending = []
+            raise
+        with self._lock:
+            self._entries = entries
+            self._by_name = {key[1]: key for key in entries}
+            self._paths = paths
+            self._by_device = by_device
+            self._loaded = True
+            self._scanning = False
+            pending, self._pending = self._pending, []
+            for added, path, mtime_ns in pending:
+                if added:
+                    self._add_locked(path, mtime_ns)
+                else:
+                    self._discard_locked(path)
+            self.version += 1
+        return True
+
+    def add(self, path: Path, mtime_ns: Optional[int] = None) -> None:
+        """插入或更新一张归档图片；索引尚未加载时忽略（首次访问会扫描到）。"""
+        path = Path(path)
+        if path.suffix.lower() not in ARCHIVE_EXTENSIONS:
+            return
+        if mtime_ns is None:
+            try:
+                mtime_ns = int(os.stat(path).st_mtime * 1e9)
+            except OSError:
+                return
+        with self._lock:
+            if self._scanning:
+                self._pending.append((True, path, mtime_ns))
+                return
+            if not self._loaded:
+                return
+            self._add_locked(path, mtime_ns)
+            self.version += 1
+
+    def discard(self, path: Path) -> None:
+        path = Path(path)
+        with self._lock:
+            if self._scanning:
+                self._pending.append((False, path, None))
+                return
+            if self._discard_locked(path):
+                self.version += 1
+
+    def _add_locked(self, path: Path, mtime_ns: int) -> None:
+        self._remove_locked(path.name)
+        key = (mtime_ns, path.name)
+        bisect.insort(self._entries, key)
+        self._by_name[path.name] = key
+        self._paths[path.name] = path
+        code = device_code_from_name(path.name)
+        if code:
+            bisect.insort(self._by_device.setdefault(code, []), key)
+
+    def _discard_locked(self, path: Path) -> bool:
+        # 迁移后旧路径的删除通知不影响新位置
+        return self._paths.get(path.name) == path and self._remove_locked(path.name)
+
+    def _remove_locked(self, name: str) -> bool:
+        key = self._by_name.pop(name, None)
+        if key is None:
+            return False
+        self._paths.pop(name, None)
+        _remove_sorted(self._entries, key)
+        code = device_code_from_name(name)
+        device_entries = self._by_device.get(code) if code else None
+        if device_entries is not None:
+            _remove_sorted(device_entries, key)
+            if not device_entries:
+                del self._by_device[code]
+        return True
+
+    # ------------------------------------------------------------------
+    # 查询（位置均按从新到旧计数，0 为最新）
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def page(self, offset: int, limit: int) -> List[Path]:
+        """从新到旧第 offset 张起的 limit 张图片。"""
+        with self._lock:
+            total = len(self._entries)
+            offset = max(0, offset)
+            end = total - offset
+            start = max(0, end - max(0, limit))
+            return [self._paths[key[1]] for key in reversed(self._entries[start:end])]
+
+    def position_of(self, path: Optional[Path]) -> int:
+        """图片在从新到旧顺序中的位置，不在索引中时返回 -1（二分查找）。"""
+        if path is None:
+            return -1
+        with self._lock:
+            key = self._by_name.get(Path(path).name)
+            if key is None:
+                return -1
+            i = bisect.bisect_left(self._entries, key)
+            return len(self._entries) - 1 - i
+
+    def latest_for_device(self, device_code: str) -> Optional[Path]:
+        with self._lock:
+            device_entries = self._by_device.get(device_code)
+            if not device_entries:
+                return None
+            return self._paths[device_entries[-1][1]]
+
+    def devices(self) -> List[str]:
+        with self._lock:
+            return list(self._by_device)
+
+
+def _remove_sorted(entries: List[EntryKey], key: EntryKey) -> None:
+    i = bisect.bisect_left(entries, key)
+    if i < len(entries) and entries[i] == key:
+        del entries[i]
+
+
+class RecordIndexRegistry:
+    """按目录管理 RecordIndex，归档流程通过 notify_archived 推送新文件。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, RecordIndex] = {}
+
+    @staticmethod
+    def _dir_key(directory: Path) -> str:
+        return os.path.normcase(os.path.abspath(str(directory)))
+
+    def get(self, directory: Path) -> RecordIndex:
+        key = self._dir_key(directory)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = RecordIndex(Path(directory))
+                self._indexes[key] = index
+            return index
+
+    def peek(self, directory: Path) -> Optional[RecordIndex]:
+        with self._lock:
+            return self._indexes.get(self._dir_key(directory))
+
+    def _index_for(self, path: Path) -> Optional[RecordIndex]:
+        # 图片位于 Record 根目录或其 YYYY/MM/DD 分区中
+        for parent in list(Path(path).parents)[:4]:
+            index = self.peek(parent)
+            if index is not None:
+                return index
+        return None
+
+    def notify_archived(self, path: Path) -> None:
+        index = self._index_for(path)
+        if index is not None:
+            index.add(Path(path))
+
+    def notify_removed(self, path: Path) -> None:
+        index = self._index_for(path)
+        if index is not None:
+            index.discard(Path(path))
+
+
+record_indexes = RecordIndexRegistry()
@@ -0,0 +1,270 @@
+"""报告 CSV 的追加日志 + 内存索引。
+
+原流程每处理一张图片都要读出整个报告 CSV 再整体重写。现在：
+- 每条检测结果追加写入 ``<报告目录>/.journal/<报告文件名>.log``（O(1)）；
+- 内存中按设备号维护最新一行（同一报告文件在进程内共享一份索引，
+  图像 / 视频 / 即时处理线程写同一个文件时互不覆盖）；
+- “每台设备一行”的报告 CSV 作为快照，按 snapshot_interval 定期重写，
+  或在 flush()（每个处理周期结束、程序退出）时写出，写出后清空追加日志；
+- 同进程内读取报告（柱状图）直接返回内存索引，不再读文件。
+
+当前报告文件由 ReportFileRegistry 记在内存中，并写入报告目录下的指针文件
+``.current_report``；只有启动时指针缺失或失效才扫描一次报告目录。
+程序异常退出时，启动后读取报告 CSV 并重放追加日志即可恢复最新状态。
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+REPORT_FIELDS = ["日期", "时间", "设备号", "数量"]
+JOURNAL_DIR_NAME = ".journal"
+POINTER_FILE_NAME = ".current_report"
+
+_registry: Dict[str, "ReportIndex"] = {}
+_registry_lock = threading.Lock()
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ReportIndex:
+    """单个报告文件的设备最新值索引。"""
+
+    def __init__(self, path: str, encoding: str, snapshot_interval: float) -> None:
+        self.path = path
+        self.encoding = encoding
+        self.snapshot_interval = max(0.0, float(snapshot_interval))
+        self.lock = threading.RLock()
+        self.rows: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self.dirty = False
+        self._snapshot_at = time.monotonic()
+        self._journal = None
+        self._load()
+
+    # ------------------------------------------------------------------
+    # 路径
+    # ------------------------------------------------------------------
+    def journal_path(self) -> str:
+        folder, name = os.path.split(self.path)
+        return os.path.join(folder, JOURNAL_DIR_NAME, name + ".log")
+
+    # ------------------------------------------------------------------
+    # 加载与恢复
+    # ------------------------------------------------------------------
+    def _load(self) -> None:
+        try:
+            with open(self.path, mode="r", encoding=self.encoding, newline="") as file:
+                for row in csv.DictReader(file):
+                    if row.get("设备号"):
+                        self.rows[row["设备号"]] = row
+        except FileNotFoundError:
+            pass
+        replayed = 0
+        try:
+            with open(self.journal_path(), mode="r", encoding=self.encoding, newline="") as file:
+                for values in csv.reader(file):
+                    if len(values) == len(REPORT_FIELDS):
+                        self.rows[values[2]] = dict(zip(REPORT_FIELDS, values))
+                        replayed += 1
+        except FileNotFoundError:
+            pass
+        if replayed:
+            # 上次退出前未写入快照的数据
+            self.dirty = True
+            logger.info(f"[Report] 从追加日志恢复 {replayed} 条记录: {os.path.basename(self.path)}")
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def append(self, date, time_value, equipment_number, nums) -> None:
+        # 与从 CSV 读出的行保持一致，统一存为字符串
+        values = [str(date), str(time_value), str(equipment_number), str(nums)]
+        row = dict(zip(REPORT_FIELDS, values))
+        with self.lock:
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.journal_path()), exist_ok=True)
+                self._journal = open(self.journal_path(), mode="a", encoding=self.encoding, newline="")
+            csv.writer(self._journal).writerow(values)
+            self._journal.flush()
+            # 设备号已存在则原位更新，否则追加在末尾（与原 CSV 行顺序一致）
+            self.rows[row["设备号"]] = row
+            self.dirty = True
+
+    def snapshot_due(self) -> bool:
+        """距上次快照已超过 snapshot_interval（<= 0 表示只在 flush 时写出）。"""
+        return self.dirty and self.snapshot_interval > 0 and time.monotonic() - self._snapshot_at >= self.snapshot_interval
+
+    def reset(self) -> None:
+        """报告文件被重新创建（只有表头）时清空索引与追加日志。"""
+        with self.lock:
+            self.rows.clear()
+            self.dirty = False
+            self._truncate_journal()
+
+    def flush(self, writer: Optional[Callable[[Dict[str, Dict[str, str]]], None]] = None) -> None:
+        """有未写出的变化时写出报告快照，成功后清空追加日志。"""
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = OrderedDict((device, dict(row)) for device, row in self.rows.items())
+            if writer is not None:
+                writer(snapshot)
+            else:
+                self._write_snapshot(snapshot)
+            self.dirty = False
+            self._snapshot_at = time.monotonic()
+            self._truncate_journal()
+
+    def _write_snapshot(self, snapshot: Dict[str, Dict[str, str]]) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, mode="w", encoding=self.encoding, newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(snapshot.values())
+        os.replace(tmp_path, self.path)
+
+    def _truncate_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        try:
+            os.remove(self.journal_path())
+        except FileNotFoundError:
+            pass
+
+    def records(self) -> List[Dict[str, str]]:
+        with self.lock:
+            return [dict(row) for row in self.rows.values()]
+
+    def close(self) -> None:
+        with self.lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+def get_report_index(path: str, encoding: str, snapshot_interval: float) -> ReportIndex:
+    key = _key(path)
+    with _registry_lock:
+        index = _registry.get(key)
+        if index is None:
+            index = ReportIndex(path, encoding, snapshot_interval)
+            _registry[key] = index
+        return index
+
+
+def peek_report_index(path: str) -> Optional[ReportIndex]:
+    with _registry_lock:
+        return _registry.get(_key(path))
+
+
+def alias_report_index(index: ReportIndex, new_path: str) -> None:
+    """快照因原文件被占用写入了新文件时，新路径继续使用同一份索引。"""
+    with _registry_lock:
+        index.path = new_path
+        _registry[_key(new_path)] = index
+
+
+class ReportFileRegistry:
+    """各报告目录的当前报告文件。
+
+    替代每次刷新都 listdir + getmtime 整个报告目录：查询时只检查缓存的文件是否仍存在，
+    新建或改写到新文件时由 set_current() 更新内存并重写指针文件。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._current: Dict[str, str] = {}
+
+    @staticmethod
+    def _pointer_path(folder: str) -> str:
+        return os.path.join(folder, POINTER_FILE_NAME)
+
+    def current(self, folder: str, prefix: str = "", suffix: str = "") -> Optional[str]:
+        """当前报告文件路径，目录中没有报告时返回 None。"""
+        key = _key(folder)
+        with self._lock:
+            path = self._current.get(key)
+            if path is not None and os.path.isfile(path):
+                return path
+            path = self._read_pointer(folder)
+            if path is None:
+                path = self._scan(folder, prefix, suffix)
+                if path is not None:
+                    self._write_pointer(folder, path)
+            if path is None:
+                self._current.pop(key, None)
+            else:
+                self._current[key] = path
+            return path
+
+    def set_current(self, folder: str, path: str) -> None:
+        key = _key(folder)
+        with self._lock:
+            if self._current.get(key) == path:
+                return
+            self._current[key] = path
+            self._write_pointer(folder, path)
+
+    def _read_pointer(self, folder: str) -> Optional[str]:
+        try:
+            with open(self._pointer_path(folder), mode="r", encoding="utf-8") as file:
+                name = file.read().strip()
+        except (FileNotFoundError, OSError):
+            return None
+        path = os.path.join(folder, name) if name else ""
+        return path if name and os.path.isfile(path) else None
+
+    def _write_pointer(self, folder: str, path: str) -> None:
+        pointer = self._pointer_path(folder)
+        try:
+            with open(pointer + ".tmp", mode="w", encoding="utf-8") as file:
+                file.write(os.path.basename(path))
+            os.replace(pointer + ".tmp", pointer)
+        except OSError as exc:
+            logger.warning(f"[Report] 写入报告指针文件失败 {pointer}: {exc}")
+
+    @staticmethod
+    def _scan(folder: str, prefix: str, suffix: str) -> Optional[str]:
+        """指针缺失时的一次性扫描：取修改时间最新的报告文件。"""
+        latest, latest_mtime = None, -1.0
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith(".") or not name.startswith(prefix) or not name.endswith(suffix):
+                        continue
+                    if name.endswith("_temp_read" + suffix) or not entry.is_file():
+                        continue
+                    mtime = entry.stat().st_mtime
+                    if mtime > latest_mtime:
+                        latest, latest_mtime = entry.path, mtime
+        except FileNotFoundError:
+            return None
+        if latest is not None:
+            logger.info(f"[Report] 扫描报告目录，当前报告: {os.path.basename(latest)}")
+        return latest
+
+
+report_files = ReportFileRegistry()
+
+
+def flush_all() -> None:
+    """写出所有报告快照（程序退出时调用）。"""
+    with _registry_lock:
+        indexes = list({id(index): index for index in _registry.values()}.values())
+    for index in indexes:
+        try:
+            index.flush()
+            index.close()
+        except Exception as exc:
+            logger.error(f"[Report] 写出报告快照失败 {index.path}: {exc}")
@@ -11,6 +11,19 @@ import datetime
 from loguru import logger
 
 from config.global_setting import global_setting
+from server.protocol import (
+    ACK_OK,
+    ACK_REJECTED,
+    ACK_SIZE,
+    HELLO_SIZE,
+    IncompleteFrame,
+    build_header,
+    build_hello,
+    hello_idle_timeout,
+    parse_ack,
+    parse_hello,
+    recv_exact,
+)
 
 
 class Sender(Thread):
@@ -25,6 +38,12 @@ class Sender(Thread):
 
     # Encryption settings
     KEY = b'MySuperSecretKey32BytesLongPassw'  # Must be 32 bytes for AES-256
+    # 不支持会话的服务端 {(host, port): 探测时间}，在此期间内直接使用单帧连接，
+    # 避免每次重连都等待握手超时并让旧版服务端多收到一帧无效数据
+    SESSION_PROBE_INTERVAL = 600
+    SESSION_HELLO_TIMEOUT = 5  # 等待握手应答的时间（秒）
+    _no_session_servers = {}
+
     def __init__(self,type,img_dir,host,port,uid):
         super().__init__()
         self.type = type
@@ -36,6 +55,10 @@ class Sender(Thread):
         self.client_socket=None
         self.max_retries = 3 #最大重连次数
         self.retry_delay = 1.0  # 初始重试延迟（秒）
+        self.session = False  # 服务端是否接受多帧会话
+        self.sequence = 0
+        self.session_idle = 0  # 服务端握手中声明的会话空闲超时（秒），0 表示未声明
+        self.last_active = 0.0
         self.init_state = self.client_init()
 
         pass
@@ -58,7 +81,8 @@ class Sender(Thread):
                 self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 self.client_socket.settimeout(30)  # 连接超时
                 self.client_socket.connect((self.host, self.port))
-                logger.info(f"Sender({retry_count + 1}/{self.max_retries}) {self.uid} connected {self.host}:{self.port} successfully")
+                self.session = self.open_session()
+                logger.info(f"Sender({retry_count + 1}/{self.max_retries}) {self.uid} connected {self.host}:{self.port} successfully | session={self.session}")
                 return True
             except (socket.error, ConnectionRefusedError, socket.timeout) as e:
                 logger.error(
@@ -69,6 +93,43 @@ class Sender(Thread):
         return False
 
 
+    def open_session(self):
+        """
+        发送会话握手，服务端应答后可在同一连接上连续发送多帧
+        旧版服务端不应答时重新建立连接，按单帧方式发送，并记住该服务端，
+        SESSION_PROBE_INTERVAL 秒内不再握手
+        :return: 是否进入会话模式
+        """
+        self.sequence = 0
+        server = (self.host, self.port)
+        probed_at = Sender._no_session_servers.get(server)
+        if probed_at is not None and time.monotonic() - probed_at < self.SESSION_PROBE_INTERVAL:
+            return False
+        try:
+            self.client_socket.settimeout(self.SESSION_HELLO_TIMEOUT)
+            self.client_socket.sendall(build_hello())
+            reply = bytes(recv_exact(self.client_socket, HELLO_SIZE))
+            version = parse_hello(reply)
+            self.client_socket.settimeout(30)
+            if version:
+                Sender._no_session_servers.pop(server, None)
+                self.session_idle = hello_idle_timeout(reply)
+                self.last_active = time.monotonic()
+                return True
+        except (socket.timeout, IncompleteFrame, OSError) as e:
+            logger.info(f"Sender {self.uid} 服务端不支持会话，{self.SESSION_PROBE_INTERVAL} 秒内使用单帧连接: {e}")
+        Sender._no_session_servers[server] = time.monotonic()
+        # 握手数据已被旧版服务端当作帧头读取，需重新连接
+        self.client_socket.close()
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client_socket.settimeout(30)
+        self.client_socket.connect((self.host, self.port))
+        return False
+
+    def session_expired(self):
+        """距上一帧应答已接近服务端声明的空闲超时（留 1 秒余量）。"""
+        return self.session_idle > 0 and time.monotonic() - self.last_active >= self.session_idle - 1
+
     def set_image_dir(self,img_dir):
         self.img_dir=img_dir
         pass
@@ -174,82 +235,39 @@ class Sender(Thread):
                 f"Error sender{self.uid} encrypted_data, tag, cipher to server: is None | trace stack:{traceback.print_exc()}")
             return
 
-        # Send the nonce (used instead of IV in GCM mode)
-        try:
-            self.client_socket.sendall(cipher.nonce)
-
-        except Exception as e:
-            logger.error(f"Error sender{self.uid} cipher.nonce to server: {e} | trace stack:{traceback.print_exc()}")
-            self.client_socket.shutdown(socket.SHUT_WR)  # 重要：半关闭发送端
-            self.init_state = False
-            if self.client_socket is not None:
-                self.client_socket.close()
-            # 重新在发一次
-            self.send_handle()
-
-        # Send the tag (for authentication)
-        try:
-            self.client_socket.sendall(tag)
-
-        except Exception as e:
-            logger.error(f"Error sender{self.uid} tag to server: {e} | trace stack:{traceback.print_exc()}")
-            self.client_socket.shutdown(socket.SHUT_WR)  # 重要：半关闭发送端
-            self.init_state = False
-            if self.client_socket is not None:
-                self.client_socket.close()
-            # 重新在发一次
-            self.send_handle()
-
-
-
-        # Send UID as fixed 32-byte string (padded with null bytes if shorter)
-        uid_bytes = self.uid.encode('utf-8')[:32]  # Truncate if too long
-        uid_padded = uid_bytes.ljust(32, b'\x00')   # Pad with null bytes to 32 bytes
-        try:
-            self.client_socket.sendall(uid_padded)
-
-        except Exception as e:
-            logger.error(f"Error sender{self.uid} uid_padded to server: {e} | trace stack:{traceback.print_exc()}")
-            self.client_socket.shutdown(socket.SHUT_WR)  # 重要：半关闭发送端
-            self.init_state = False
-            if self.client_socket is not None:
-                self.client_socket.close()
-            # 重新在发一次
-            self.send_handle()
-
-
-        # Send the encrypted image size
-        encrypted_size = len(encrypted_data)
-        try:
-            self.client_socket.sendall(encrypted_size.to_bytes(4, byteorder='big'))
-
-        except Exception as e:
-            logger.error(f"Error sender{self.uid} encrypted_size to server: {e} | trace stack:{traceback.print_exc()}")
-            self.client_socket.shutdown(socket.SHUT_WR)  # 重要：半关闭发送端
-            self.init_state = False
-            if self.client_socket is not None:
-                self.client_socket.close()
-            # 重新在发一次
-            self.send_handle()
-
-
-        # Send the encrypted image data
-
-        try:
-            self.client_socket.sendall(encrypted_data)
-
-        except Exception as e:
-            logger.error(f"Error sender{self.uid} encrypted_data——image to server: {e} | trace stack:{traceback.print_exc()}")
-            self.client_socket.shutdown(socket.SHUT_WR)  # 重要：半关闭发送端
-            self.init_state = False
-            if self.client_socket is not None:
-                self.client_socket.close()
-            # 重新在发一次
-            self.send_handle()
+        # nonce + tag + UID(32 bytes, null padded) + encrypted image size, then the encrypted image data
+        header = build_header(cipher.nonce, tag, self.uid, len(encrypted_data))
+        if self.session and self.session_expired():
+            # 服务端已按空闲超时关闭会话，先重连，避免在已关闭的连接上发送整帧后再重发
+            self.init_state = self.client_init()
+            if not self.init_state:
+                return
+        for attempt in range(2):
+            try:
+                self.client_socket.sendall(header)
+                self.client_socket.sendall(encrypted_data)
+                if not self.session:
+                    # 单帧连接：服务端接收后关闭，下次发送前重新连接
+                    self.client_socket.shutdown(socket.SHUT_WR)  # 重要：半关闭发送端
+                    self.init_state = False
+                    break
+                status, sequence = parse_ack(bytes(recv_exact(self.client_socket, ACK_SIZE)))
+                self.sequence = sequence + 1
+                self.last_active = time.monotonic()
+                if status == ACK_REJECTED:
+                    # 服务端拒绝后关闭会话
+                    self.init_state = False
+                if status != ACK_OK:
+                    logger.warning(f"Sender {self.uid} 帧 {sequence} 应答状态 {status}")
+                    return
+                break
+            except (socket.timeout, IncompleteFrame, OSError) as e:
+                # 会话可能已被服务端空闲超时关闭，重连后重发一次
+                logger.warning(f"Sender {self.uid} 发送失败({attempt + 1}/2): {e}")
+                self.init_state = self.client_init()
+                if not self.init_state:
+                    return
+        else:
+            return
 
         logger.info(f" Image sent{self.uid} successfully to {self.host}:{self.port}")
-
-
-
-
-
@@ -1,19 +1,53 @@
 import sys
+import asyncio
 import socket
 import threading
 import time
 import datetime
 import os
+import selectors
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from Cryptodome.Cipher import AES
 from loguru import logger
 
 from config.global_setting import global_setting
+from server.ingest_control import IngestThrottle
+from server.protocol import (
+    ACK_CORRUPTED,
+    ACK_OK,
+    ACK_REJECTED,
+    DEFAULT_MAX_IMAGE_SIZE,
+    DEFAULT_RECV_SIZE,
+    HEADER_SIZE,
+    HELLO_SIZE,
+    PROTOCOL_VERSION,
+    FrameError,
+    IncompleteFrame,
+    build_ack,
+    build_hello,
+    parse_header,
+    parse_hello,
+    recv_body,
+    recv_exact,
+    recv_header,
+)
 
 report_logger = logger.bind(category="report_logger")
 
+
+class _Session:
+    """threaded 模式下保持中的多帧会话。"""
+
+    __slots__ = ("addr", "sequence", "last_active")
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.sequence = 0
+        self.last_active = time.monotonic()
+
 class Server(threading.Thread):
     # Default save directory
     # save_dir = None
@@ -33,6 +67,11 @@ class Server(threading.Thread):
     # Encryption settings
     KEY = b'MySuperSecretKey32BytesLongPassw'  # Must be 32 bytes for AES-256
 
+    # 服务模式: threaded 逐个处理连接; asyncio 并发处理多个连接
+    SERVER_MODES = ("threaded", "asyncio")
+    # threaded 模式下保持中的会话数上限（Windows 上 select 最多监听 512 个套接字）
+    THREADED_MAX_SESSIONS = 500
+
     def __init__(self,save_dir,IP,port):
         super().__init__()
         self.save_dir = Path(save_dir).resolve() if save_dir else None
@@ -42,6 +81,17 @@ class Server(threading.Thread):
         self.server = None
         self.conns = []
         self.addrs = []
+        # asyncio 模式下的事件循环与解密/写盘线程池
+        self._loop = None
+        self._executor = None
+        self.throttle = None
+        # threaded 模式下保持中的会话：空闲连接放在 selector 中等待下一帧，不占用接收线程
+        self._selector = None
+        self._selector_listener = None
+        self._sessions = {}
+        # 每台设备最近一帧的文件名时间与同一秒内的序号，避免同秒多帧文件名冲突
+        self._frame_names = {}
+        self._frame_names_lock = threading.Lock()
 
         self.init_state = self.client_init()
 
@@ -65,12 +115,25 @@ class Server(threading.Thread):
         pass
     def run(self) -> None:
         self.running=True
+        server_cfg = global_setting.get_setting("server_config")['Server']
+        mode = str(server_cfg.get('mode', 'threaded')).strip().lower()
+        if mode not in self.SERVER_MODES:
+            logger.warning(f"[Server] 未知的服务模式 {mode}，使用 threaded")
+            mode = "threaded"
+        self.throttle = IngestThrottle.from_config(self._base_dir(), server_cfg)
+        if mode == "asyncio":
+            self.run_async()
+            return
         while (self.running):
             # 如果初始化client失败，则一直尝试初始化
             if not self.init_state:
                 self.init_state = self.client_init()
                 if not self.init_state:
                     continue
+            # 下游积压过多时暂停 accept，连接在内核队列中等待
+            if self.throttle.should_pause():
+                time.sleep(float(server_cfg['delay']))
+                continue
             try:
                 self.handle_client()
 
@@ -79,8 +142,17 @@ class Server(threading.Thread):
                 logger.error(f"Error connection:{e}|trace stack:{traceback.print_stack()}")
                 self.init_state=False
                 pass
-            time.sleep(float(global_setting.get_setting("server_config")['Server']['delay']))
+        # 会话由接收线程自己关闭，stop() 只关闭连接
+        self._close_sessions()
         pass
+
+    def _base_dir(self):
+        # 默认保存路径
+        if self.save_dir is None:
+            self.save_dir = Path(sys.path[0]) / 'saved'
+        base_dir = self.save_dir if isinstance(self.save_dir, Path) else Path(self.save_dir)
+        base_dir.mkdir(parents=True, exist_ok=True)
+        return base_dir
     def join(self, timeout: float | None = None) -> None:
         """Gracefully stop server thread.
         timeout kept compatible with threading.Thread.join signature.
@@ -92,6 +164,7 @@ class Server(threading.Thread):
         except RuntimeError:
             # In case join called from within the thread itself
             pass
+        self._close_sessions()
         for conn in self.conns:
             if conn is not None:
                try:
@@ -110,6 +183,9 @@ class Server(threading.Thread):
         pass
     def stop(self):
         self.running = False
+        if self._loop is not None:
+            # asyncio 模式由事件循环自行关闭监听与连接
+            return
         for conn in self.conns:
             if conn is not None:
                 try:
@@ -128,10 +204,9 @@ class Server(threading.Thread):
         pass
     def handle_client(self):
         """
-        Handles a client connection, receives an encrypted image, decrypts it, and saves it to disk.
+        threaded 模式的一轮处理：等待新连接或保持中的会话有数据到达，每个会话每次只接收一帧。
+        空闲会话留在 selector 中等待下一帧，不阻塞其他设备，空闲超过 session_idle_timeout 后关闭。
         Args:
-            self.conn: The client socket connection.
-            self.addr: The address of the connected client.
             self.save_dir: Optional directory to save the images. If None, uses current directory.
                 动态设备说明:
                         不再依赖配置中的 device_nums 判断一轮是否结束。通过:
@@ -141,9 +216,38 @@ class Server(threading.Thread):
         """
         if self.server is None:
             return
+        selector = self._session_selector()
+        try:
+            events = selector.select(timeout=1.0)
+        except (OSError, ValueError):
+            # Socket closed while waiting, exiting gracefully
+            self.running = False
+            return
+        for key, _ in events:
+            if key.fileobj is self.server:
+                self._accept_client()
+            else:
+                self._serve_session(key.fileobj, key.data)
+        self._expire_sessions()
+
+    def _session_selector(self):
+        if self._selector is None:
+            self._selector = selectors.DefaultSelector()
+        if self._selector_listener is not self.server:
+            # 监听 socket 重新初始化后替换注册
+            if self._selector_listener is not None:
+                try:
+                    self._selector.unregister(self._selector_listener)
+                except (KeyError, ValueError):
+                    pass
+            self._selector.register(self.server, selectors.EVENT_READ)
+            self._selector_listener = self.server
+        return self._selector
+
+    def _accept_client(self):
         try:
             conn, addr = self.server.accept()
-        except socket.timeout:
+        except (socket.timeout, BlockingIOError):
             return
         except OSError:
             # Socket closed while waiting, exiting gracefully
@@ -152,161 +256,459 @@ class Server(threading.Thread):
         self.conns.append(conn)
         self.addrs.append(addr)
 
-        logger.info(f" New connection from {addr} connected| Active connections: {threading.active_count() }")# 图像处理线程2个 server线程自己1个 tab一直读取status1个，charts读取数据1个，
-        # 默认保存路径
-        if self.save_dir is None:
-            self.save_dir = Path(sys.path[0]) / 'saved'
-        base_dir = self.save_dir if isinstance(self.save_dir, Path) else Path(self.save_dir)
-        base_dir.mkdir(parents=True, exist_ok=True)
+        logger.info(f" New connection from {addr} connected| Active connections: {threading.active_count() } | 保持中的会话: {len(self._sessions)}")
+        base_dir = self._base_dir()
+        keep = False
+        try:
+            server_cfg = global_setting.get_setting('server_config')['Server']
+            read_timeout = float(server_cfg.get('read_timeout', 30))
+            conn.settimeout(read_timeout)
 
+            # 先读取握手长度的前缀：会话握手 或 旧协议帧头的前 8 字节
+            try:
+                prefix = recv_exact(conn, HELLO_SIZE)
+                version = parse_hello(prefix)
+                if version is None:
+                    header = parse_header(prefix + recv_exact(conn, HEADER_SIZE - HELLO_SIZE))
+            except (IncompleteFrame, FrameError, UnicodeDecodeError) as e:
+                logger.warning(f"[Server] {addr} 协议头接收不完整，丢弃连接: {e}")
+                return
+            if version is None:
+                # 旧协议：单帧，不应答
+                self._receive_frame(conn, addr, header, base_dir)
+                return
+
+            idle_timeout = self._session_idle_timeout(server_cfg)
+            conn.sendall(build_hello(min(version, PROTOCOL_VERSION), idle_timeout))
+            self._park_session(conn, addr, server_cfg)
+            keep = True
+        except Exception as e:
+            logger.error(f" Error processing connection: {e}|trace stack :{traceback.print_stack()}")
+        finally:
+            if not keep:
+                self._close_conn(conn)
+
+    def _park_session(self, conn, addr, server_cfg):
+        """会话放入 selector 等待下一帧；超出上限时先关闭空闲最久的会话。"""
+        limit = min(self.THREADED_MAX_SESSIONS, max(1, int(server_cfg.get('max_connections', 256))))
+        while len(self._sessions) >= limit:
+            oldest = min(self._sessions, key=lambda c: self._sessions[c].last_active)
+            logger.warning(f"[Server] 保持中的会话已达上限 {limit}，关闭空闲最久的会话 {self._sessions[oldest].addr}")
+            self._end_session(oldest)
+        session = _Session(addr)
+        self._sessions[conn] = session
+        self._selector.register(conn, selectors.EVENT_READ, session)
+
+    def _serve_session(self, conn, session):
+        """会话上有数据到达：接收一帧并应答，会话结束时关闭连接。"""
+        keep = False
+        try:
+            server_cfg = global_setting.get_setting('server_config')['Server']
+            conn.settimeout(float(server_cfg.get('read_timeout', 30)))
+            try:
+                header = recv_header(conn)
+            except (socket.timeout, IncompleteFrame, OSError):
+                # 设备关闭会话或服务停止时连接被关闭
+                return
+            except (FrameError, UnicodeDecodeError) as e:
+                logger.warning(f"[Server] {session.addr} 会话帧头无效，关闭会话: {e!r}")
+                return
+            status = self._receive_frame(conn, session.addr, header, self._base_dir())
+            if status is None:
+                return
+            conn.sendall(build_ack(status, session.sequence))
+            session.sequence += 1
+            session.last_active = time.monotonic()
+            keep = status != ACK_REJECTED
+        except Exception as e:
+            logger.error(f" Error processing connection: {e}|trace stack :{traceback.print_stack()}")
+        finally:
+            if not keep:
+                self._end_session(conn)
+
+    def _expire_sessions(self):
+        if not self._sessions:
+            return
+        idle_timeout = self._session_idle_timeout(global_setting.get_setting('server_config')['Server'])
+        deadline = time.monotonic() - idle_timeout
+        for conn in [c for c, session in self._sessions.items() if session.last_active < deadline]:
+            self._end_session(conn)
+
+    def _end_session(self, conn):
+        session = self._sessions.pop(conn, None)
+        if self._selector is not None:
+            try:
+                self._selector.unregister(conn)
+            except (KeyError, ValueError):
+                pass
+        if session is not None:
+            logger.info(f"[Server] {session.addr} 会话结束，共接收 {session.sequence} 帧")
+        self._close_conn(conn)
+
+    def _close_sessions(self):
+        for conn in list(self._sessions):
+            self._end_session(conn)
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+            self._selector_listener = None
+
+    def _close_conn(self, conn):
+        try:
+            conn.close()
+        except OSError:
+            pass
+        try:
+            i = self.conns.index(conn)
+        except ValueError:
+            return
+        del self.conns[i]
+        del self.addrs[i]
+
+    def _receive_frame(self, conn, addr, header, base_dir):
+        """接收一帧密文并保存，返回应答状态；连接中断时返回 None。"""
         start_time = time.time()
+        filename_time = self._frame_time(header.uid)
+        recv_size, max_image_size = self._recv_limits(global_setting.get_setting('server_config')['Server'])
+
+        nonce, tag, uid, image_size = header.nonce, header.tag, header.uid, header.size
+        if self.DEBUG_SHOW_FILE_SIZE:
+            logger.debug(f"image_size:{image_size}")
+        if not self._admit(uid):
+            return ACK_REJECTED
+
+        # 测试存储不完整图片 后面图像处理的时候报错
+        if self.DEBUG_IMAGE_LOAD_ERRORS:
+            image_size=100000
+        # Receive the encrypted image data into a preallocated buffer
+        broken = False
+        try:
+            encrypted_data = recv_body(conn, image_size, recv_size, max_image_size)
+        except FrameError as e:
+            logger.error(f"[Server] {addr} 拒绝上传 (UID: {uid}): {e}")
+            report_logger.error(f"{uid}上传图片超出大小限制")
+            return ACK_REJECTED
+        except IncompleteFrame as e:
+            # 不完整的数据交由解密校验判定为损坏
+            logger.warning(f"[Server] {addr} 图片数据不完整 (UID: {uid}): {e}")
+            encrypted_data = e.partial
+            broken = True
+
+        _, verified = self.store_image(base_dir, uid, nonce, tag, encrypted_data, filename_time, start_time)
+        self.register_upload(uid)
+        self.throttle.record_ingest()
+        if broken:
+            return None
+        return ACK_OK if verified else ACK_CORRUPTED
+
+    @staticmethod
+    def _session_idle_timeout(server_cfg):
+        return max(0.1, float(server_cfg.get('session_idle_timeout', 60)))
+
+    @staticmethod
+    def _recv_limits(server_cfg):
+        """返回 (单次 recv 大小, 最大图片字节数)，兼容旧配置中的 patch_size。"""
+        recv_size = int(server_cfg.get('recv_size', server_cfg.get('patch_size', DEFAULT_RECV_SIZE)))
+        max_image_size = int(server_cfg.get('max_image_size', DEFAULT_MAX_IMAGE_SIZE))
+        return max(1, recv_size), max_image_size
+
+    def _admit(self, uid):
+        """下游处理跟不上时按设备限流，被拒绝的上传不读取数据直接关闭连接。"""
+        if self.throttle is None or self.throttle.admit(uid):
+            return True
+        logger.warning(f"[Ingest] 下游积压，设备 {uid} 上传过于频繁，本次上传被拒绝")
+        return False
 
-        now = datetime.datetime.now()
-        filename_time = now.strftime("%Y-%m-%d_%H-%M-%S")
+    def _frame_time(self, uid):
+        """生成文件名中的时间部分 YYYY-MM-DD_HH-MM-SS。
 
+        文件名只精确到秒，同一设备同一秒内的后续帧追加 _1、_2 … 序号，
+        否则会在 Temp/Record 中互相覆盖，交接队列中的同名条目也会被替换。
+        序号作为独立的一段，按 "_" 拆分文件名时前四段的含义保持不变。
+        """
+        stamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        with self._frame_names_lock:
+            last_stamp, count = self._frame_names.get(uid, ("", 0))
+            count = count + 1 if last_stamp == stamp else 0
+            self._frame_names[uid] = (stamp, count)
+        return f"{stamp}_{count}" if count else stamp
+
+    def parse_uid(self, uid, filename_time):
+        """解析 UID (AAAA-BBBBBB-CCCCC)，返回 (type_code, 设备编号, 文件名)。"""
         try:
+            parts = uid.split('-')
+            if len(parts) >= 2:
+                aaaa = parts[0]  # e.g., "AAYL"
+                bbbbbb = parts[1]  # e.g., "000021"
 
-            # Receive the nonce (used instead of IV in GCM mode)
-            nonce = conn.recv(16)
+                # Extract TYPE by removing first two characters from AAAA
+                type_code = aaaa[2:] if len(aaaa) >= 2 else aaaa  # e.g., "YL"
 
-            # Receive the tag (for authentication)
-            tag = conn.recv(16)
+                # Construct new filename: [TYPE]_[BBBBBB]_%Y-%m-%d_%H-%M-%S[_N].png
+                return type_code, bbbbbb, f"{type_code}_{bbbbbb}_{filename_time}.png"
+        except Exception as e:
+            logger.warning(f"Error parsing UID '{uid}': {e}, using fallback naming")
+        # Fallback to original UID if parsing fails
+        return "", "", f"{uid}_{filename_time}.png"
 
-            # Receive the UID (32 bytes string)
-            uid_bytes = conn.recv(32)
-            uid = uid_bytes.rstrip(b'\x00').decode('utf-8')  # Remove null padding and decode
+    def store_image(self, base_dir, uid, nonce, tag, encrypted_data, filename_time, start_time):
+        """解密并校验图片后写入 Temp 文件夹，返回 (保存路径, 是否通过校验)。
 
-            # Parse UID format: AAAA-BBBBBB-CCCCC
-            type_code=""
-            try:
-                parts = uid.split('-')
-                if len(parts) >= 2:
-                    aaaa = parts[0]  # e.g., "AAYL"
-                    bbbbbb = parts[1]  # e.g., "000021"
+        asyncio 模式下在线程池中执行，不访问共享的全局状态。
+        """
+        type_code, bbbbbb, filename = self.parse_uid(uid, filename_time)
 
-                    # Extract TYPE by removing first two characters from AAAA
-                    type_code = aaaa[2:] if len(aaaa) >= 2 else aaaa  # e.g., "YL"
+        folder_suffix = global_setting.get_setting('server_config')['Server']['fold_suffix']
+        type_dir = base_dir / f"{type_code}_{folder_suffix}"
+        type_dir.mkdir(parents=True, exist_ok=True)
+        filepath = type_dir / filename
 
-                    # Construct new filename: [TYPE]_[BBBBBB]_%Y-%m-%d_%H-%M-%S.png
-                    filename = f"{type_code}_{bbbbbb}_{filename_time}.png"
-                else:
-                    # Fallback to original UID if parsing fails
-                    filename = f"{uid}_{filename_time}.png"
-            except Exception as e:
-                logger.warning(f"Error parsing UID '{uid}': {e}, using fallback naming")
-                filename = f"{uid}_{filename_time}.png"
-
-            # Receive the encrypted image size
-            image_size_bytes = conn.recv(4)
-            image_size = int.from_bytes(image_size_bytes, byteorder='big')
-            if self.DEBUG_SHOW_FILE_SIZE:
-                logger.debug(f"image_size:{image_size}")
-
-            folder_suffix = global_setting.get_setting('server_config')['Server']['fold_suffix']
-            type_dir = base_dir / f"{type_code}_{folder_suffix}"
-            type_dir.mkdir(parents=True, exist_ok=True)
-            filepath = type_dir / filename
-
-            # Receive the encrypted image data
-            encrypted_data = bytearray()
-            # 测试存储不完整图片 后面图像处理的时候报错
-            if self.DEBUG_IMAGE_LOAD_ERRORS:
-                image_size=100000
-            while len(encrypted_data) < image_size:
-                packet = conn.recv(min(image_size - len(encrypted_data), int(global_setting.get_setting('server_config')['Server']['patch_size'])))
-                if not packet:
-                    break
-                encrypted_data.extend(packet)
-
-                if self.DEBUG_PRINT_PROGRESS:
-                    # if len(encrypted_data)/image_size > last_percent / 100:
-                    logger.debug(f'{len(encrypted_data)/image_size*100}%')
-
-            #
-            # Decrypt and verify the image data
-            cipher = AES.new(self.KEY, AES.MODE_GCM, nonce=nonce)
-            try:
-                image_data = cipher.decrypt_and_verify(encrypted_data, tag)
-                report_logger.info(f"{type_code}{bbbbbb}上传图片")
-            except ValueError as e:
-                logger.error(f" Authentication failed! Data may have been tampered with: {e}|trace stack :{traceback.print_stack()}")
-                image_data= bytearray()
-                report_logger.error(f"{type_code}{bbbbbb}上传图片已经损坏")
-                # if conn is not None:
-                #    conn.close()
-                # return
-            # Save the decrypted image
-            end_time = time.time()
-            time_elapsed = round(end_time-start_time,1)
-
-            with open(filepath, "wb") as f:
-                f.write(image_data)
-
-            logger.info(f' Saved to {filepath} (UID: {uid}). Time elapsed: {time_elapsed}s')
-            # 即时设备状态更新（去除轮次逻辑）
-            device_uids = global_setting.get_setting("device_uids")
-            last_seen = global_setting.get_setting("last_seen_image")
-            active_devices = global_setting.get_setting("active_image_devices")
-            now_ts = time.time()
-            if uid not in device_uids:
-                device_uids.add(uid)
-                logger.info(f"[DynamicRegister] 新设备注册: {uid} | 当前设备总数={len(device_uids)}")
-            # 如果是正式 UID (以 -CAFAF 结束) 并且存在对应的 BOOT 占位 UID，则进行合并
-            try:
-                if uid.endswith('-CAFAF'):
-                    parts = uid.split('-')
-                    if len(parts) >= 2:
-                        type_code_full = parts[0]      # AAFL 或 AAYL
-                        dev_num = parts[1]              # 000001
-                        boot_uid = f"{type_code_full}-{dev_num}-BOOT"
-                        if boot_uid in device_uids:
-                            boot_last = last_seen.get(boot_uid, 0)
-                            real_last = last_seen.get(uid, 0)
-                            # 迁移更大的时间戳（理论上 boot_last <= real_last，但保险）
-                            if boot_last > real_last:
-                                last_seen[uid] = boot_last
-                            # 移除占位
-                            device_uids.discard(boot_uid)
-                            last_seen.pop(boot_uid, None)
-                            logger.info(f"[DynamicMerge] 合并 BOOT 占位 {boot_uid} -> {uid}")
-                            # 触发一次刷新（防止图表仍显示 BOOT UID）
-                            try:
-                                global_setting.get_setting("processing_done").set()
-                            except Exception:
-                                pass
-            except Exception as merge_e:
-                logger.warning(f"[DynamicMerge] 处理 BOOT 合并时异常: {merge_e}")
-            last_seen[uid] = now_ts
-            active_devices.add(uid)
-            global_setting.get_setting("data_buffer").append(uid)
-
-            refresh_event = global_setting.get_setting("processing_done")
-            if refresh_event is not None:
+        # Decrypt and verify the image data
+        cipher = AES.new(self.KEY, AES.MODE_GCM, nonce=nonce)
+        verified = True
+        try:
+            image_data = cipher.decrypt_and_verify(encrypted_data, tag)
+            report_logger.info(f"{type_code}{bbbbbb}上传图片")
+        except ValueError as e:
+            verified = False
+            logger.error(f" Authentication failed! Data may have been tampered with: {e}|trace stack :{traceback.print_stack()}")
+            image_data= bytearray()
+            report_logger.error(f"{type_code}{bbbbbb}上传图片已经损坏")
+        # Save the decrypted image
+        end_time = time.time()
+        time_elapsed = round(end_time-start_time,1)
+
+        # 内存交接：直接交给图像处理线程，Temp 文件由后台异步写入作为崩溃恢复日志
+        handoff = global_setting.get_setting("image_handoff")
+        if verified and handoff is not None and handoff.submit(filepath, image_data):
+            logger.info(f' Handed off {filepath.name} (UID: {uid}). Time elapsed: {time_elapsed}s')
+            return filepath, verified
+
+        # 先写 .part 再原子重命名，Temp 监听与对账扫描不会取到写了一半的文件
+        part_path = filepath.with_name(filepath.name + ".part")
+        with open(part_path, "wb") as f:
+            f.write(image_data)
+        os.replace(part_path, filepath)
+        # 通知图像处理线程的待处理索引，无需再扫描 Temp 文件夹
+        temp_index = global_setting.get_setting("temp_index")
+        if temp_index is not None:
+            temp_index.add(filepath)
+
+        logger.info(f' Saved to {filepath} (UID: {uid}). Time elapsed: {time_elapsed}s')
+        return filepath, verified
+
+    def register_upload(self, uid):
+        """上传完成后更新设备注册、last_seen 与周期状态，并通知图像处理线程。"""
+        # 即时设备状态更新（去除轮次逻辑）
+        device_uids = global_setting.get_setting("device_uids")
+        last_seen = global_setting.get_setting("last_seen_image")
+        active_devices = global_setting.get_setting("active_image_devices")
+        now_ts = time.time()
+        if uid not in device_uids:
+            device_uids.add(uid)
+            logger.info(f"[DynamicRegister] 新设备注册: {uid} | 当前设备总数={len(device_uids)}")
+        # 如果是正式 UID (以 -CAFAF 结束) 并且存在对应的 BOOT 占位 UID，则进行合并
+        try:
+            if uid.endswith('-CAFAF'):
+                parts = uid.split('-')
+                if len(parts) >= 2:
+                    type_code_full = parts[0]      # AAFL 或 AAYL
+                    dev_num = parts[1]              # 000001
+                    boot_uid = f"{type_code_full}-{dev_num}-BOOT"
+                    if boot_uid in device_uids:
+                        boot_last = last_seen.get(boot_uid, 0)
+                        real_last = last_seen.get(uid, 0)
+                        # 迁移更大的时间戳（理论上 boot_last <= real_last，但保险）
+                        if boot_last > real_last:
+                            last_seen[uid] = boot_last
+                        # 移除占位
+                        device_uids.discard(boot_uid)
+                        last_seen.pop(boot_uid, None)
+                        logger.info(f"[DynamicMerge] 合并 BOOT 占位 {boot_uid} -> {uid}")
+                        # 触发一次刷新（防止图表仍显示 BOOT UID）
+                        global_setting.get_setting("refresh_bus").publish("devices")
+        except Exception as merge_e:
+            logger.warning(f"[DynamicMerge] 处理 BOOT 合并时异常: {merge_e}")
+        last_seen[uid] = now_ts
+        active_devices.add(uid)
+        global_setting.get_setting("data_buffer").append(uid)
+
+        refresh_bus = global_setting.get_setting("refresh_bus")
+        if refresh_bus is not None:
+            refresh_bus.publish("upload", uid)
+
+        cycle_received = global_setting.get_setting("cycle_received_uids")
+        if cycle_received is not None:
+            previous_size = len(cycle_received)
+            cycle_received.add(uid)
+            if previous_size == 0:
+                global_setting.set_setting("cycle_start_time_image", time.time())
+
+        condition = global_setting.get_setting("condition")
+        if condition is not None:
+            with condition:
+                condition.notify_all()
+
+    # ------------------------------------------------------------------
+    # asyncio 并发模式
+    # ------------------------------------------------------------------
+    def run_async(self):
+        """asyncio 模式：事件循环并发接收多个连接，解密与写盘放入线程池。"""
+        server_cfg = global_setting.get_setting("server_config")['Server']
+        max_connections = max(1, int(server_cfg.get('max_connections', 256)))
+        io_workers = max(1, int(server_cfg.get('io_workers', 4)))
+        read_timeout = float(server_cfg.get('read_timeout', 30))
+        self._executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="server_io")
+        self._loop = asyncio.new_event_loop()
+        logger.info(f"[Server] asyncio 模式启动: 最大并发连接={max_connections} 线程池={io_workers} 读超时={read_timeout}s")
+        try:
+            while self.running:
+                # 与 threaded 模式一致，监听失败时持续重试
+                if not self.init_state:
+                    self.init_state = self.client_init()
+                    if not self.init_state:
+                        time.sleep(float(server_cfg.get('delay', 1)))
+                        continue
                 try:
-                    refresh_event.set()
+                    self._loop.run_until_complete(self._serve_async(max_connections, read_timeout))
+                except Exception as e:
+                    logger.error(f"[Server] asyncio 服务异常: {e}")
+                    if self.server is not None:
+                        try:
+                            self.server.close()
+                        except Exception:
+                            pass
+                    self.init_state = False
+        finally:
+            self._loop.close()
+            self._executor.shutdown(wait=True)
+            if self.server is not None:
+                try:
+                    self.server.close()
                 except Exception:
-                    logger.debug("processing_done event set failed", exc_info=True)
+                    pass
+                self.server = None
+            logger.info("[Server] asyncio 模式已退出")
 
-            cycle_received = global_setting.get_setting("cycle_received_uids")
-            if cycle_received is not None:
-                previous_size = len(cycle_received)
-                cycle_received.add(uid)
-                if previous_size == 0:
-                    global_setting.set_setting("cycle_start_time_image", time.time())
+    async def _serve_async(self, max_connections, read_timeout):
+        limiter = asyncio.Semaphore(max_connections)
+        pause_delay = float(global_setting.get_setting("server_config")['Server']['delay'])
+        handlers = set()
 
-            condition = global_setting.get_setting("condition")
-            if condition is not None:
-                with condition:
-                    condition.notify_all()
+        async def on_connect(reader, writer):
+            handlers.add(asyncio.current_task())
+            try:
+                # 超过并发上限的连接在此排队，不占用解密线程
+                async with limiter:
+                    await self._handle_client_async(reader, writer, read_timeout, pause_delay)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f" Error processing connection: {e}")
+            finally:
+                handlers.discard(asyncio.current_task())
+                writer.close()
 
-            pass
-        except Exception as e:
-            logger.error(f" Error processing connection: {e}|trace stack :{traceback.print_stack()}")
-            if conn is not None:
-                conn.close()
+        async_server = await asyncio.start_server(on_connect, sock=self.server, backlog=1024)
+        try:
+            while self.running:
+                await asyncio.sleep(0.5)
         finally:
-            if conn is not None:
-                conn.close()
+            async_server.close()
+            # 停止时结束仍在等待数据的连接
+            for task in list(handlers):
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await async_server.wait_closed()
+            self.server = None
 
+    async def _handle_client_async(self, reader, writer, read_timeout, pause_delay):
+        addr = writer.get_extra_info('peername')
+        logger.info(f" New connection from {addr} connected")
+        base_dir = self._base_dir()
+        server_cfg = global_setting.get_setting("server_config")['Server']
 
+        await self._wait_backlog(pause_delay)
+        try:
+            prefix = await asyncio.wait_for(reader.readexactly(HELLO_SIZE), read_timeout)
+            version = parse_hello(prefix)
+            if version is None:
+                rest = await asyncio.wait_for(reader.readexactly(HEADER_SIZE - HELLO_SIZE), read_timeout)
+                header = parse_header(prefix + rest)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, FrameError, UnicodeDecodeError) as e:
+            logger.warning(f"[Server] {addr} 协议头接收不完整，丢弃连接: {e!r}")
+            return
+        if version is None:
+            # 旧协议：单帧，不应答
+            await self._receive_frame_async(reader, addr, header, base_dir, read_timeout)
+            return
 
+        idle_timeout = self._session_idle_timeout(server_cfg)
+        writer.write(build_hello(min(version, PROTOCOL_VERSION), idle_timeout))
+        await writer.drain()
+        sequence = 0
+        while self.running:
+            # 下游积压过多时暂不读取下一帧，由 TCP 窗口向设备端施加背压
+            await self._wait_backlog(pause_delay)
+            try:
+                header = parse_header(await asyncio.wait_for(reader.readexactly(HEADER_SIZE), idle_timeout))
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                # 设备关闭会话或空闲超时
+                break
+            except (FrameError, UnicodeDecodeError) as e:
+                logger.warning(f"[Server] {addr} 会话帧头无效，关闭会话: {e!r}")
+                break
+            status = await self._receive_frame_async(reader, addr, header, base_dir, read_timeout)
+            if status is None:
+                break
+            writer.write(build_ack(status, sequence))
+            await writer.drain()
+            sequence += 1
+            if status == ACK_REJECTED:
+                break
+        logger.info(f"[Server] {addr} 会话结束，共接收 {sequence} 帧")
+
+    async def _wait_backlog(self, pause_delay):
+        while self.running and self.throttle.should_pause():
+            await asyncio.sleep(pause_delay)
+
+    async def _receive_frame_async(self, reader, addr, header, base_dir, read_timeout):
+        """asyncio 版 _receive_frame：接收一帧并保存，返回应答状态；连接中断时返回 None。"""
+        start_time = time.time()
+        filename_time = self._frame_time(header.uid)
+        nonce, tag, uid, image_size = header.nonce, header.tag, header.uid, header.size
+        if self.DEBUG_SHOW_FILE_SIZE:
+            logger.debug(f"image_size:{image_size}")
+        if not self._admit(uid):
+            return ACK_REJECTED
+        _, max_image_size = self._recv_limits(global_setting.get_setting("server_config")['Server'])
+        if 0 < max_image_size < image_size:
+            logger.error(f"[Server] {addr} 拒绝上传 (UID: {uid}): 声明大小 {image_size} 超出限制 {max_image_size}")
+            report_logger.error(f"{uid}上传图片超出大小限制")
+            return ACK_REJECTED
+
+        broken = False
+        try:
+            encrypted_data = await asyncio.wait_for(reader.readexactly(image_size), read_timeout)
+        except asyncio.IncompleteReadError as e:
+            # 与 threaded 模式一致：不完整的数据交由解密校验判定为损坏
+            encrypted_data = e.partial
+            broken = True
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.warning(f"[Server] {addr} 图片数据接收超时或中断 (UID: {uid}): {e!r}")
+            return None
+
+        loop = asyncio.get_running_loop()
+        try:
+            _, verified = await loop.run_in_executor(
+                self._executor, self.store_image, base_dir, uid, nonce, tag, encrypted_data, filename_time, start_time
+            )
+        except Exception as e:
+            logger.error(f" Error processing connection: {e}")
+            return None
+        # 全局状态只在事件循环线程中更新，保持与 threaded 模式相同的串行语义
+        self.register_upload(uid)
+        self.throttle.record_ingest()
+        if broken:
+            return None
+        return ACK_OK if verified else ACK_CORRUPTED
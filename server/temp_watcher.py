@@ -0,0 +1,207 @@
+"""Temp 文件夹待处理图片的增量索引。
+
+图像处理线程不再每次循环都对所有 ``<TYPE>_Temp`` 目录做 mkdir + iterdir，
+而是从内存索引中取待处理文件。索引的更新来源：
+- 进程内通知：Server 写完 Temp 文件后直接调用 add()；
+- watchdog（requirements 中的依赖，未安装时退化为轮询）：只响应重命名（``.part`` 写完后
+  os.replace 到位）与写入关闭事件，不响应创建事件，避免把写了一半的文件交给处理线程；
+- 低频对账扫描（rescan_interval）：兜底，未安装 watchdog 时即为轮询模式；
+  跳过 SETTLE_TIME 秒内仍在修改的文件，由下一次扫描或关闭事件加入。
+``.part`` 等非图片扩展名的文件始终忽略。
+取出的文件在归档完成前处于“处理中”状态，对账扫描不会重复加入。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from loguru import logger
+
+try:  # 可选依赖
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - depends on environment
+    FileSystemEventHandler = object
+    Observer = None
+
+WATCH_MODES = ("auto", "watchdog", "poll")
+
+
+class _TempEventHandler(FileSystemEventHandler):
+    def __init__(self, index: "TempFolderIndex") -> None:
+        super().__init__()
+        self.index = index
+
+    def on_closed(self, event) -> None:
+        # 写入关闭事件（仅 inotify 提供），外部直接写入的文件此时已完整
+        if not event.is_directory:
+            self.index.add(Path(event.src_path))
+
+    def on_moved(self, event) -> None:
+        if not event.is_directory:
+            self.index.discard(Path(event.src_path))
+            self.index.add(Path(event.dest_path))
+
+    def on_deleted(self, event) -> None:
+        if not event.is_directory:
+            self.index.discard(Path(event.src_path))
+
+
+class TempFolderIndex:
+    """线程安全的待处理文件索引，按文件路径排序取出。"""
+
+    # 对账扫描时修改时间距今不足该值（秒）的文件视为仍在写入
+    SETTLE_TIME = 2.0
+
+    def __init__(
+        self,
+        directories: Sequence[Path],
+        extensions: Iterable[str],
+        rescan_interval: float = 60.0,
+        watch_mode: str = "auto",
+    ) -> None:
+        self.directories = [Path(d) for d in directories]
+        self.extensions = {ext.lower() for ext in extensions}
+        self.rescan_interval = max(0.0, float(rescan_interval))
+        watch_mode = (watch_mode or "auto").strip().lower()
+        if watch_mode not in WATCH_MODES:
+            logger.warning(f"[TempIndex] 未知的 watch_mode={watch_mode}，使用 auto")
+            watch_mode = "auto"
+        self.watch_mode = watch_mode
+
+        self._lock = threading.Lock()
+        self._pending: Set[Path] = set()
+        self._claimed: Set[Path] = set()
+        self._scanned_at = 0.0
+        self._observer = None
+
+    @classmethod
+    def from_config(cls, directories: Sequence[Path], extensions: Iterable[str], process_cfg: Dict[str, str]) -> "TempFolderIndex":
+        try:
+            rescan_interval = float(process_cfg.get("rescan_interval", 60))
+        except (TypeError, ValueError):
+            logger.warning("Image_Process.rescan_interval 配置无效，使用默认值 60")
+            rescan_interval = 60.0
+        return cls(directories, extensions, rescan_interval, process_cfg.get("watch_mode", "auto"))
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """首次全量扫描，并按 watch_mode 启动 watchdog。"""
+        for directory in self.directories:
+            directory.mkdir(parents=True, exist_ok=True)
+        self.rescan(settle=False)
+        if self.watch_mode == "poll":
+            logger.info(f"[TempIndex] 轮询模式，对账扫描间隔 {self.rescan_interval}s")
+            return
+        if Observer is None:
+            level = "warning" if self.watch_mode == "watchdog" else "info"
+            getattr(logger, level)(f"[TempIndex] 未安装 watchdog，使用轮询模式，对账扫描间隔 {self.rescan_interval}s")
+            return
+        try:
+            observer = Observer()
+            handler = _TempEventHandler(self)
+            for directory in self.directories:
+                observer.schedule(handler, str(directory), recursive=False)
+            observer.daemon = True
+            observer.start()
+            self._observer = observer
+            logger.info(f"[TempIndex] watchdog 监听 {len(self.directories)} 个 Temp 目录")
+        except Exception as exc:
+            logger.warning(f"[TempIndex] watchdog 启动失败，使用轮询模式: {exc}")
+
+    def stop(self) -> None:
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=5)
+            except Exception:
+                pass
+            self._observer = None
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+    def add(self, path: Path) -> None:
+        path = Path(path)
+        if path.suffix.lower() not in self.extensions:
+            return
+        with self._lock:
+            if path not in self._claimed:
+                self._pending.add(path)
+
+    def discard(self, path: Path) -> None:
+        with self._lock:
+            self._pending.discard(Path(path))
+
+    def rescan(self, settle: bool = True) -> None:
+        """全量对账：补充目录中未被索引的文件（处理中的文件除外）。
+
+        已被外部删除的条目在 take() 时剔除；这里采用合并而不是替换，避免丢失扫描期间通过 add() 加入的文件。
+        settle 为 True 时跳过刚修改过的文件（启动时的首次扫描不跳过，否则 rescan_interval = 0 时会漏掉）。
+        """
+        found: Set[Path] = set()
+        settled_before = time.time() - self.SETTLE_TIME if settle else None
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if os.path.splitext(entry.name)[1].lower() not in self.extensions or not entry.is_file():
+                            continue
+                        if settled_before is not None:
+                            try:
+                                if entry.stat().st_mtime > settled_before:
+                                    continue
+                            except OSError:  # 扫描期间被删除或移走
+                                continue
+                        found.add(Path(entry.path))
+            except FileNotFoundError:
+                directory.mkdir(parents=True, exist_ok=True)
+            except OSError as exc:
+                logger.warning(f"[TempIndex] 扫描 {directory} 失败: {exc}")
+        with self._lock:
+            self._pending = (self._pending | found) - self._claimed
+            self._scanned_at = time.monotonic()
+
+    def refresh(self) -> None:
+        """到达对账间隔时重新扫描（由图像处理线程调用）。"""
+        if self.rescan_interval <= 0:
+            return
+        if time.monotonic() - self._scanned_at >= self.rescan_interval:
+            self.rescan()
+
+    # ------------------------------------------------------------------
+    # 消费
+    # ------------------------------------------------------------------
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def backlog(self) -> int:
+        """待处理 + 处理中的文件数。"""
+        with self._lock:
+            return len(self._pending) + len(self._claimed)
+
+    def take(self, exclude: Optional[Set[Path]] = None) -> List[Path]:
+        """取出全部待处理文件（按路径排序），标记为处理中。exclude 中的路径直接丢弃。"""
+        with self._lock:
+            paths = self._pending
+            self._pending = set()
+            if exclude:
+                paths = paths - exclude
+            self._claimed.update(paths)
+        # 事件与删除之间可能存在时间差，只 stat 新增的文件
+        missing = {path for path in paths if not path.exists()}
+        if missing:
+            self.release(missing)
+        return sorted(paths - missing)
+
+    def release(self, paths: Iterable[Path]) -> None:
+        """处理结束（已归档或失败）后解除处理中标记；仍留在目录中的文件由下次对账扫描找回。"""
+        with self._lock:
+            self._claimed.difference_update(paths)
@@ -9,6 +9,7 @@ from PyQt6.QtCore import QThread
 from loguru import logger
 import cv2
 from config.global_setting import global_setting
+from server.detection_store import DetectionRecord
 from server.image_process import report_writing
 from util.time_util import time_util
 
@@ -141,7 +142,6 @@ class Video_process(QThread):
                         global_setting.set_setting("data_buffer_video", [])
                         # global_setting.set_setting("video_cycle_received_uids",["AASL-123123-123123","AASL-234523-12323"])
                         global_setting.set_setting("cycle_start_time_video", time.time())
-                        global_setting.get_setting("processing_done").set()
                     except Exception as e:
                         logger.error(f"video_process错误：{e}")
 
@@ -169,6 +169,7 @@ class Video_process(QThread):
             self.data_save.csv_create()
         else:
             self.data_save.file_path = latest_file_report_path
+        processed = []
         for video in videos:
             video_split = video.split('_')
             name = video_split[0] + '_' + video_split[1]
@@ -178,10 +179,22 @@ class Video_process(QThread):
             time_single =f"{video_split[5]}.{video_split[6]}.{video_split[7].split('.')[0]}"
             # 2.更新报告
             self.data_save.update_data(date, time_single, name, nums)
+            store = global_setting.get_setting("detection_store")
+            if store is not None:
+                store.add(DetectionRecord(device=name, date=date, time=time_single, count=nums, model_tag="mouse"))
             report_logger.info(f"完成 {name}数据分析 -> {nums} (mouse)")
+            processed.append(name)
             # 3.归档
             shutil.move(self.path +video.split('_')[0]+"_"+ self.temp_folder + video, self.path +video.split('_')[0]+"_"+self.record_folder)
         self.data_save.csv_close()
+        store = global_setting.get_setting("detection_store")
+        if store is not None:
+            store.flush()
+        # 结果写入后再通知界面刷新对应设备
+        refresh_bus = global_setting.get_setting("refresh_bus")
+        if refresh_bus is not None:
+            for name in processed:
+                refresh_bus.publish("video", name)
     def video_handle(self,video_path):
         """
         图像识别算法
@@ -8,8 +8,22 @@ import struct
 import random
 import string
 import glob
+import sys
 from Cryptodome.Cipher import AES
 
+# 会话协议常量与帧格式直接使用 server/protocol.py，避免与服务端不一致
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server.protocol import (  # noqa: E402
+    ACK_OK,
+    ACK_SIZE,
+    HELLO_SIZE,
+    build_header,
+    build_hello,
+    hello_idle_timeout,
+    parse_ack,
+    parse_hello,
+)
+
 FORMAT = "utf-8"
 
 # 默认参数（可被命令行覆盖）
@@ -133,12 +147,7 @@ def send_image(img_dir: str | None, host: str, port: int = 8000, uid_value: str
                 return last_error_code
             # 发送
             try:
-                client_socket.sendall(cipher.nonce)
-                client_socket.sendall(tag)
-                uid_bytes = uid_value.encode('utf-8')[:32]
-                uid_padded = uid_bytes.ljust(32, b'\x00')
-                client_socket.sendall(uid_padded)
-                client_socket.sendall(encrypted_size.to_bytes(4, byteorder='big'))
+                client_socket.sendall(build_header(cipher.nonce, tag, uid_value, encrypted_size))
                 client_socket.sendall(encrypted_data)
             except Exception as se:
                 last_error_code = 2
@@ -172,7 +181,74 @@ def send_image(img_dir: str | None, host: str, port: int = 8000, uid_value: str
     return last_error_code
 
 
-def polling_mode(host, port, retries=0, interval=SEND_INTERVAL):
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError(f"connection closed after {len(data)}/{size} bytes")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _frame(image: bytes, uid_value: str):
+    # 每帧重新生成 cipher / nonce
+    cipher = AES.new(KEY, AES.MODE_GCM)
+    encrypted_data, tag = cipher.encrypt_and_digest(image)
+    return build_header(cipher.nonce, tag, uid_value, len(encrypted_data)), encrypted_data
+
+
+class ImageSession:
+    """在一条连接上连续发送多张图片；服务端不支持会话时返回失败，由调用方改用 send_image。"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.idle_timeout = 0  # 服务端声明的会话空闲超时（秒）
+        self.last_active = 0.0
+
+    def open(self) -> bool:
+        self.close()
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=15)
+            self.sock.settimeout(5)
+            self.sock.sendall(build_hello())
+            reply = _recv_exact(self.sock, HELLO_SIZE)
+            if not parse_hello(reply):
+                raise ConnectionError("session not supported")
+            self.sock.settimeout(30)
+            self.idle_timeout = hello_idle_timeout(reply)
+            self.last_active = time.monotonic()
+            return True
+        except Exception as e:
+            print(f"[WARN] {time_now()} - Session handshake failed: {e}")
+            self.close()
+            return False
+
+    def send(self, image: bytes, uid_value: str) -> int:
+        """发送一帧并等待应答，返回应答状态；连接异常时抛出异常。"""
+        if self.idle_timeout and time.monotonic() - self.last_active >= self.idle_timeout - 1:
+            # 服务端已按空闲超时关闭会话，先重新握手
+            if not self.open():
+                raise ConnectionError("session reopen failed")
+        header, encrypted_data = _frame(image, uid_value)
+        self.sock.sendall(header)
+        self.sock.sendall(encrypted_data)
+        status, _ = parse_ack(_recv_exact(self.sock, ACK_SIZE))
+        self.last_active = time.monotonic()
+        return status
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+
+
+def polling_mode(host, port, retries=0, interval=SEND_INTERVAL, use_session=False):
     """轮询模式：扫描FL和YL文件夹，交替发送图片"""
     print(f"[INFO] {time_now()} - Starting polling mode...")
     print(f"[INFO] {time_now()} - FL directory: {FL_DIR}")
@@ -210,6 +286,11 @@ def polling_mode(host, port, retries=0, interval=SEND_INTERVAL):
     print(f"[INFO] {time_now()} - Starting image sending loop (interval: {interval}s)")
     print(f"[INFO] {time_now()} - Press Ctrl+C to stop")
 
+    session = ImageSession(host, port) if use_session else None
+    if session is not None and not session.open():
+        print(f"[WARN] {time_now()} - Server does not accept sessions, falling back to one connection per image")
+        session = None
+
     image_index = 0
     try:
         while True:
@@ -224,7 +305,19 @@ def polling_mode(host, port, retries=0, interval=SEND_INTERVAL):
 
             # 发送图片
             print(f"[INFO] {time_now()} - Sending {image_type} image: {os.path.basename(image_path)} | UID: {uid}")
-            result = send_image(image_path, host, port, uid, retries=retries)
+            result = None
+            if session is not None:
+                try:
+                    with open(image_path, 'rb') as f:
+                        status = session.send(f.read(), uid)
+                    result = 0 if status == ACK_OK else 8
+                except Exception as e:
+                    # 会话被服务端关闭（空闲超时等），重新握手后由下面的单帧方式补发本张
+                    print(f"[WARN] {time_now()} - Session send failed, reconnecting: {e}")
+                    if not session.open():
+                        session = None
+            if result is None:
+                result = send_image(image_path, host, port, uid, retries=retries)
 
             if result != 0:
                 print(f"[WARN] {time_now()} - Failed to send image, error code: {result}")
@@ -238,6 +331,9 @@ def polling_mode(host, port, retries=0, interval=SEND_INTERVAL):
     except KeyboardInterrupt:
         print(f"\n[INFO] {time_now()} - Polling stopped by user")
         return 0
+    finally:
+        if session is not None:
+            session.close()
 
 
 def parse_args():
@@ -259,6 +355,8 @@ def parse_args():
                         help='Send a generated 1x1 white PNG (parameter mode)')
     parser.add_argument('--interval', dest='interval', type=int, default=SEND_INTERVAL,
                         help='Send interval in seconds (polling mode)')
+    parser.add_argument('--session', dest='session', action='store_true',
+                        help='Keep one connection open and send all images over it (polling mode)')
     return parser.parse_args()
 
 
@@ -302,7 +400,7 @@ def main():
             print(f"[ERROR] {time_now()} - Invalid interval: {args.interval}")
             return 7
 
-        return polling_mode(args.host, args.port, max(0, args.retries), args.interval)
+        return polling_mode(args.host, args.port, max(0, args.retries), args.interval, use_session=args.session)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,117 @@
+import datetime
+
+import pytest
+
+from server.archive import ArchiveManager, iter_days, iter_images, locate, partition_dir, read_image_bytes
+
+
+def day_offset(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def image_name(day, device="000021", clock="12-00-00"):
+    return f"YL_{device}_{day}_{clock}.png"
+
+
+def archive_image(record_dir, name, size=100):
+    target = partition_dir(record_dir, name) / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(b"x" * size)
+    return target
+
+
+@pytest.fixture
+def record_dir(tmp_path):
+    path = tmp_path / "YL_Record"
+    path.mkdir()
+    return path
+
+
+def test_migrate_flat_moves_root_files_into_day_partitions(record_dir):
+    name = image_name("2026-01-02")
+    (record_dir / name).write_bytes(b"png")
+    (record_dir / "unparsable.png").write_bytes(b"png")
+    added = []
+
+    moved = ArchiveManager([record_dir], on_added=added.append).migrate_flat(record_dir)
+
+    assert moved == 1
+    assert added == [record_dir / "2026" / "01" / "02" / name]
+    assert (record_dir / "unparsable.png").exists()
+
+
+def test_retention_days_removes_old_days_and_notifies(record_dir):
+    old = archive_image(record_dir, image_name(day_offset(40)))
+    kept = archive_image(record_dir, image_name(day_offset(5)))
+    today = archive_image(record_dir, image_name(day_offset(0)))
+    removed = []
+
+    manager = ArchiveManager([record_dir], retention_days=30, on_removed=removed.append)
+
+    assert manager.apply_retention(record_dir) == 1
+    assert removed == [old]
+    assert not old.parent.exists()
+    assert kept.exists() and today.exists()
+    assert [day for day, _, _ in iter_days(record_dir)] == [day_offset(5), day_offset(0)]
+
+
+def test_size_limit_removes_oldest_days_but_never_today(record_dir):
+    for days in (3, 2, 1, 0):
+        archive_image(record_dir, image_name(day_offset(days)), size=400 * 1024)
+
+    manager = ArchiveManager([record_dir], max_total_mb=1)
+    assert manager.apply_retention(record_dir) == 2
+    assert [day for day, _, _ in iter_days(record_dir)] == [day_offset(1), day_offset(0)]
+
+    # 只剩当天时即使仍超出上限也不删除
+    manager.max_total_bytes = 1
+    assert manager.apply_retention(record_dir) == 1
+    assert [day for day, _, _ in iter_days(record_dir)] == [day_offset(0)]
+
+
+def test_bundled_days_stay_readable_and_count_toward_retention(record_dir):
+    name = image_name(day_offset(45))
+    archive_image(record_dir, name)
+    recent = archive_image(record_dir, image_name(day_offset(0)))
+    removed = []
+    manager = ArchiveManager([record_dir], bundle_after_days=30, on_removed=removed.append)
+
+    assert manager.bundle_old_days(record_dir) == 1
+    assert removed == [partition_dir(record_dir, name) / name]
+    assert locate(record_dir, name).bundled
+    assert read_image_bytes(record_dir, name) == b"x" * 100
+    assert [image.name for image in iter_images(record_dir)] == [recent.name]
+    assert sorted(image.name for image in iter_images(record_dir, include_bundles=True)) == sorted([name, recent.name])
+
+    manager.retention_days = 30
+    removed.clear()
+    assert manager.apply_retention(record_dir) == 1
+    assert locate(record_dir, name) is None
+    bundle = partition_dir(record_dir, name).with_suffix(".zip")
+    assert removed == [bundle / name]
+
+
+def test_size_limit_counts_detection_sidecars(record_dir):
+    for days in (2, 1, 0):
+        image = archive_image(record_dir, image_name(day_offset(days)), size=200 * 1024)
+        image.with_name(image.stem + ".det.json").write_bytes(b"x" * 200 * 1024)
+
+    # 只统计图片时 600KB 不超过 1MB；加上附属文件 1.2MB 超出，删除最早的一天
+    assert ArchiveManager([record_dir], max_total_mb=1).apply_retention(record_dir) == 1
+    assert [day for day, _, _ in iter_days(record_dir)] == [day_offset(1), day_offset(0)]
+
+
+def test_last_seen_scan_covers_partitions_bundles_and_flat_files(record_dir):
+    from server.last_seen import scan_record_dirs
+
+    bundled = image_name(day_offset(45), clock="08-00-00")
+    archive_image(record_dir, bundled)
+    ArchiveManager([record_dir], bundle_after_days=30).bundle_old_days(record_dir)
+    archive_image(record_dir, image_name(day_offset(2), clock="09-00-00"))
+    archive_image(record_dir, image_name(day_offset(1), device="000022"))
+    (record_dir / image_name(day_offset(0), device="000023")).write_bytes(b"png")
+
+    seen = scan_record_dirs([str(record_dir)], workers=3)
+
+    assert set(seen) == {("YL", "000021"), ("YL", "000022"), ("YL", "000023")}
+    assert datetime.date.fromtimestamp(seen[("YL", "000021")]).strftime("%Y-%m-%d") == day_offset(2)
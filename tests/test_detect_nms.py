@@ -0,0 +1,64 @@
+import numpy as np
+
+from server.bench_nms import legacy_class_nms, make_candidates
+from server.detect import OnnxYoloDetector, batched_nms
+
+# Two overlapping boxes per class plus one isolated box; class 1 reuses class 0's
+# coordinates so a class-unaware NMS would wrongly suppress across classes.
+BOXES = np.array(
+    [
+        [10, 10, 50, 50],
+        [12, 12, 52, 52],
+        [200, 200, 240, 240],
+        [10, 10, 50, 50],
+        [11, 11, 51, 51],
+        [400, 10, 420, 30],
+    ],
+    dtype=np.float32,
+)
+SCORES = np.array([0.9, 0.8, 0.7, 0.85, 0.95, 0.4], dtype=np.float32)
+CLASS_IDS = np.array([0, 0, 0, 1, 1, 1])
+
+
+def _batched_pairs(boxes, scores, class_ids, iou, **kwargs):
+    return sorted((int(class_ids[i]), int(i)) for i in batched_nms(boxes, scores, class_ids, iou, **kwargs))
+
+
+def test_batched_nms_matches_per_class_loop_on_fixed_boxes():
+    expected = legacy_class_nms(BOXES, SCORES, CLASS_IDS, 0.3)
+    assert expected == [(0, 0), (0, 2), (1, 4), (1, 5)]
+    assert _batched_pairs(BOXES, SCORES, CLASS_IDS, 0.3) == expected
+
+
+def test_batched_nms_matches_per_class_loop_on_crowded_candidates():
+    boxes, scores, class_ids = make_candidates(1000, 3)
+    assert _batched_pairs(boxes, scores, class_ids, 0.3) == legacy_class_nms(boxes, scores, class_ids, 0.3)
+
+
+def test_batched_nms_orders_by_score_and_caps_max_det():
+    keep = batched_nms(BOXES, SCORES, CLASS_IDS, 0.3)
+    assert list(SCORES[keep]) == sorted(SCORES[keep], reverse=True)
+    assert list(batched_nms(BOXES, SCORES, CLASS_IDS, 0.3, max_det=2)) == list(keep[:2])
+
+
+def test_batched_nms_empty():
+    empty = np.empty((0, 4), dtype=np.float32)
+    assert batched_nms(empty, np.empty(0, np.float32), np.empty(0, np.int64), 0.3).size == 0
+
+
+def test_postprocess_keeps_candidate_boxes():
+    # Bypass __init__ (no ONNX session needed) and feed a raw YOLOv8 head output
+    detector = object.__new__(OnnxYoloDetector)
+    detector.class_names = ["a", "b"]
+    detector.conf_threshold = 0.25
+    detector.iou_threshold = 0.3
+    detector.nms_top_k = 0
+    detector.max_det = 0
+    xywh = np.concatenate(((BOXES[:, :2] + BOXES[:, 2:]) / 2, BOXES[:, 2:] - BOXES[:, :2]), axis=1)
+    class_scores = np.zeros((len(BOXES), 2), dtype=np.float32)
+    class_scores[np.arange(len(BOXES)), CLASS_IDS] = SCORES
+    output = np.concatenate((xywh, class_scores), axis=1).T[None]  # (1, 4 + classes, N)
+
+    detections = detector._postprocess(output, (1.0, 1.0), (0.0, 0.0), (640, 640))
+
+    assert [(d.class_id, round(d.score, 2)) for d in detections] == [(1, 0.95), (0, 0.9), (0, 0.7), (1, 0.4)]
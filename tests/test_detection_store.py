@@ -0,0 +1,38 @@
+import sqlite3
+
+from server.detection_store import DetectionRecord, DetectionStore
+
+
+def test_latest_table_keeps_newest_capture(tmp_path):
+    store = DetectionStore(str(tmp_path / "detections.db"))
+    try:
+        store.add(DetectionRecord(device="FL_000001", date="20261017", time="12:00:00", count=3))
+        store.add(DetectionRecord(device="YL_000002", date="20261017", time="12:00:00", count=1))
+        store.flush()
+        # 补传的旧图片不覆盖最新值
+        store.add(DetectionRecord(device="FL_000001", date="20261017", time="11:00:00", count=9))
+        store.add(DetectionRecord(device="FL_000001", date="20261017", time="12:05:00", count=5))
+        store.flush()
+
+        assert [(r["设备号"], r["数量"]) for r in store.latest_per_device()] == [("FL_000001", "5"), ("YL_000002", "1")]
+        assert store.latest_for_devices(["YL_000002"])[0]["时间"] == "12:00:00"
+        assert [r["设备号"] for r in store.latest_per_device(["yl"])] == ["YL_000002"]
+    finally:
+        store.close()
+
+
+def test_latest_table_backfilled_for_existing_database(tmp_path):
+    path = tmp_path / "detections.db"
+    store = DetectionStore(str(path))
+    store.add(DetectionRecord(device="FL_000001", date="20261017", time="12:00:00", count=3))
+    store.add(DetectionRecord(device="FL_000001", date="20261017", time="12:05:00", count=4))
+    store.close()
+    # 模拟升级前创建的库：只有 detections 表
+    with sqlite3.connect(path) as conn:
+        conn.execute("DELETE FROM latest")
+
+    store = DetectionStore(str(path))
+    try:
+        assert [(r["设备号"], r["数量"]) for r in store.latest_per_device()] == [("FL_000001", "4")]
+    finally:
+        store.close()
@@ -0,0 +1,49 @@
+import threading
+from pathlib import Path
+
+from server.image_pipeline import ImagePipeline, PipelineJob
+
+
+def make_jobs(count):
+    return [PipelineJob(image_path=Path(f"{i}.png"), device_type="FL", metadata=("FL_000001", "", "")) for i in range(count)]
+
+
+def make_pipeline(finalized, **kwargs):
+    def decode(job):
+        job.image = object()
+
+    return ImagePipeline(
+        decode=decode,
+        infer=kwargs.pop("infer", lambda device_type, jobs: None),
+        encode=lambda job: None,
+        finalize=finalized.append,
+        **kwargs,
+    )
+
+
+def test_stop_before_run_is_not_lost():
+    finalized = []
+    pipeline = make_pipeline(finalized)
+    pipeline.stop()
+
+    assert pipeline.run(make_jobs(3)) == 0
+
+    pipeline.reset()
+    assert pipeline.run(make_jobs(3)) == 3
+
+
+def test_run_returns_when_infer_stage_dies_with_full_queue(monkeypatch):
+    finalized = []
+    pipeline = make_pipeline(finalized, queue_size=1)
+
+    def broken_flush(batch, pool, out_queue):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(pipeline, "_flush_batch", broken_flush)
+    result = []
+    runner = threading.Thread(target=lambda: result.append(pipeline.run(make_jobs(20))), daemon=True)
+    runner.start()
+    runner.join(timeout=10)
+
+    assert not runner.is_alive()
+    assert result == [0]
@@ -0,0 +1,16 @@
+import importlib.util
+
+from server import quantize
+
+
+def test_cli_reports_missing_onnx_before_loading_images(monkeypatch, capsys):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None if name == "onnx" else find_spec(name, *args))
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("images must not be loaded without onnx")
+
+    monkeypatch.setattr(quantize, "split_images", unexpected)
+
+    assert quantize.run_cli(["--type", "FL"]) == 1
+    assert "onnx package is required" in capsys.readouterr().out
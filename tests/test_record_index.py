@@ -0,0 +1,43 @@
+import os
+
+from server import record_index as record_index_module
+from server.record_index import RecordIndex
+
+
+def write_image(directory, name, mtime):
+    path = directory / name
+    path.write_bytes(b"png")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_queries_do_not_scan_before_rescan(tmp_path):
+    write_image(tmp_path, "FL_000001_2026-10-17_12-00-00.png", 1000)
+    index = RecordIndex(tmp_path)
+
+    assert not index.loaded and len(index) == 0 and index.devices() == []
+    assert index.rescan()
+    assert index.loaded and len(index) == 1
+
+
+def test_notifications_during_scan_are_replayed(tmp_path, monkeypatch):
+    old = write_image(tmp_path, "FL_000001_2026-10-17_12-00-00.png", 1000)
+    index = RecordIndex(tmp_path)
+    new = tmp_path / "FL_000002_2026-10-17_12-05-00.png"
+    scan = record_index_module.iter_images
+
+    def iter_images_with_archiving(directory):
+        images = list(scan(directory))
+        # 扫描期间归档一张新图片并删除一张已扫描到的图片
+        write_image(tmp_path, new.name, 2000)
+        index.add(new)
+        old.unlink()
+        index.discard(old)
+        assert not index.rescan()  # 扫描进行中
+        return iter(images)
+
+    monkeypatch.setattr(record_index_module, "iter_images", iter_images_with_archiving)
+    assert index.rescan()
+
+    assert index.page(0, 10) == [new]
+    assert index.devices() == ["FL_000002"]
@@ -0,0 +1,65 @@
+import csv
+
+from server.report_store import REPORT_FIELDS, ReportFileRegistry, ReportIndex
+
+
+def write_report(path, rows):
+    with open(path, mode="w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(REPORT_FIELDS)
+        writer.writerows(rows)
+
+
+def read_report(path):
+    with open(path, mode="r", encoding="utf-8", newline="") as file:
+        return [[row[field] for field in REPORT_FIELDS] for row in csv.DictReader(file)]
+
+
+def test_journal_replay_restores_unflushed_rows(tmp_path):
+    report = tmp_path / "report_20261017.csv"
+    write_report(report, [["20261017", "08:00:00", "YL_000021", "3"]])
+
+    index = ReportIndex(str(report), "utf-8", snapshot_interval=0)
+    index.append("20261017", "09:00:00", "YL_000021", 5)
+    index.append("20261017", "09:00:01", "FL_000001", 2)
+    # 模拟异常退出：只关闭追加日志，不写快照
+    index.close()
+    assert read_report(report) == [["20261017", "08:00:00", "YL_000021", "3"]]
+
+    recovered = ReportIndex(str(report), "utf-8", snapshot_interval=0)
+    assert recovered.dirty
+    assert [row["数量"] for row in recovered.records()] == ["5", "2"]
+    assert [row["设备号"] for row in recovered.records()] == ["YL_000021", "FL_000001"]
+
+    recovered.flush()
+    assert read_report(report) == [
+        ["20261017", "09:00:00", "YL_000021", "5"],
+        ["20261017", "09:00:01", "FL_000001", "2"],
+    ]
+    assert not (tmp_path / ".journal" / (report.name + ".log")).exists()
+
+
+def test_replay_skips_truncated_journal_line(tmp_path):
+    report = tmp_path / "report_20261017.csv"
+    journal = tmp_path / ".journal" / (report.name + ".log")
+    journal.parent.mkdir()
+    # 最后一行在写入过程中断电，只写了一半
+    journal.write_text("20261017,09:00:00,YL_000021,5\r\n20261017,09:00", encoding="utf-8")
+
+    index = ReportIndex(str(report), "utf-8", snapshot_interval=0)
+    assert index.records() == [dict(zip(REPORT_FIELDS, ["20261017", "09:00:00", "YL_000021", "5"]))]
+
+
+def test_report_registry_uses_pointer_then_scan(tmp_path):
+    older = tmp_path / "report_1.csv"
+    newer = tmp_path / "report_2.csv"
+    write_report(older, [])
+    write_report(newer, [])
+
+    registry = ReportFileRegistry()
+    registry.set_current(str(tmp_path), str(older))
+    # 新实例通过指针文件恢复，不按修改时间扫描
+    assert ReportFileRegistry().current(str(tmp_path), "report_", ".csv") == str(older)
+
+    older.unlink()
+    assert ReportFileRegistry().current(str(tmp_path), "report_", ".csv") == str(newer)
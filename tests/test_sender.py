@@ -0,0 +1,87 @@
+import socket
+import threading
+import time
+
+from server.sender import Sender
+
+
+def make_sender(host, port):
+    sender = object.__new__(Sender)
+    sender.host, sender.port, sender.uid = host, port, "AAYL-000021-00001"
+    sender.sequence = 0
+    return sender
+
+
+def test_negative_session_probe_is_cached_per_server(monkeypatch):
+    monkeypatch.setattr(Sender, "_no_session_servers", {})
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(4)
+    port = listener.getsockname()[1]
+    accepted = []
+
+    def old_server():
+        # 旧版服务端：接受连接但从不应答握手
+        listener.settimeout(5)
+        try:
+            while True:
+                accepted.append(listener.accept()[0])
+        except OSError:
+            pass
+
+    thread = threading.Thread(target=old_server, daemon=True)
+    thread.start()
+    monkeypatch.setattr(Sender, "SESSION_HELLO_TIMEOUT", 0.2)
+    try:
+        sender = make_sender("127.0.0.1", port)
+        sender.client_socket = socket.create_connection(("127.0.0.1", port))
+        assert sender.open_session() is False
+        assert ("127.0.0.1", port) in Sender._no_session_servers
+        sender.client_socket.close()
+
+        # 缓存期内不再握手，直接使用单帧连接
+        sender.client_socket = None
+        started = time.monotonic()
+        assert sender.open_session() is False
+        assert time.monotonic() - started < 0.1
+    finally:
+        listener.close()
+        for conn in accepted:
+            conn.close()
+
+
+def test_session_probe_retried_after_interval(monkeypatch):
+    monkeypatch.setattr(Sender, "_no_session_servers", {("127.0.0.1", 1): time.monotonic() - Sender.SESSION_PROBE_INTERVAL - 1})
+    sender = make_sender("127.0.0.1", 1)
+    calls = []
+
+    class FakeSocket:
+        def settimeout(self, value):
+            pass
+
+        def sendall(self, data):
+            calls.append(data)
+            raise OSError("closed")
+
+        def close(self):
+            pass
+
+        def connect(self, address):
+            pass
+
+    sender.client_socket = FakeSocket()
+    monkeypatch.setattr(socket, "socket", lambda *args: FakeSocket())
+    assert sender.open_session() is False
+    assert calls, "缓存过期后应重新握手"
+
+
+def test_session_expires_before_server_idle_timeout():
+    sender = make_sender("127.0.0.1", 1)
+    sender.session_idle = 60
+    sender.last_active = time.monotonic() - 30
+    assert not sender.session_expired()
+    sender.last_active = time.monotonic() - 59.5
+    assert sender.session_expired()
+    # 旧版服务端未声明空闲超时时不主动重连
+    sender.session_idle = 0
+    assert not sender.session_expired()
@@ -0,0 +1,238 @@
+import datetime
+import importlib.util
+import socket
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from Cryptodome.Cipher import AES
+
+from config.global_setting import global_setting
+from server import server as server_module
+from server.protocol import (
+    ACK_CORRUPTED,
+    ACK_OK,
+    ACK_REJECTED,
+    ACK_SIZE,
+    HELLO_SIZE,
+    PROTOCOL_VERSION,
+    IncompleteFrame,
+    build_header,
+    build_hello,
+    hello_idle_timeout,
+    parse_ack,
+    parse_hello,
+    recv_exact,
+)
+from server.server import Server
+
+
+class FixedDatetime(datetime.datetime):
+    now_value = datetime.datetime(2026, 10, 17, 12, 30, 45)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.now_value
+
+
+@pytest.fixture
+def bare_server(monkeypatch):
+    # 不绑定端口，只初始化文件名生成需要的状态
+    monkeypatch.setattr(Server, "client_init", lambda self: True)
+    monkeypatch.setattr(server_module.datetime, "datetime", FixedDatetime)
+    return Server(None, "127.0.0.1", 0)
+
+
+def test_frame_time_is_unique_within_one_second(bare_server):
+    uid = "AAYL-000021-00001"
+    names = [bare_server.parse_uid(uid, bare_server._frame_time(uid))[2] for _ in range(3)]
+
+    assert names == [
+        "YL_000021_2026-10-17_12-30-45.png",
+        "YL_000021_2026-10-17_12-30-45_1.png",
+        "YL_000021_2026-10-17_12-30-45_2.png",
+    ]
+    # 其他设备的序号独立计数
+    assert bare_server._frame_time("AAFL-000001-00001") == "2026-10-17_12-30-45"
+
+
+def test_frame_time_counter_resets_on_next_second(bare_server):
+    uid = "AAYL-000021-00001"
+    bare_server._frame_time(uid)
+    bare_server._frame_time(uid)
+    FixedDatetime.now_value = datetime.datetime(2026, 10, 17, 12, 30, 46)
+    try:
+        assert bare_server._frame_time(uid) == "2026-10-17_12-30-46"
+    finally:
+        FixedDatetime.now_value = datetime.datetime(2026, 10, 17, 12, 30, 45)
+
+
+def test_suffixed_name_keeps_date_and_time_fields():
+    name = "YL_000021_2026-10-17_12-30-45_1.png"
+    parts = name.split("_")
+
+    assert parts[2] == "2026-10-17"
+    assert parts[3].split(".")[0] == "12-30-45"
+
+
+# ----------------------------------------------------------------------
+# 多帧会话应答协议（threaded 模式 handle_client + selector）
+# ----------------------------------------------------------------------
+class AdmitAll:
+    def admit(self, uid):
+        return True
+
+    def record_ingest(self):
+        pass
+
+    def should_pause(self):
+        return False
+
+
+@pytest.fixture
+def session_server(tmp_path, monkeypatch):
+    settings = {
+        "server_config": {
+            "Server": {
+                "fold_suffix": "Temp",
+                "read_timeout": "5",
+                "session_idle_timeout": "5",
+                "max_image_size": "4096",
+            }
+        }
+    }
+    monkeypatch.setattr(global_setting, "_setting", settings)
+    monkeypatch.setattr(Server, "register_upload", lambda self, uid: None)
+    srv = Server(tmp_path, "127.0.0.1", 0)
+    assert srv.init_state
+    srv.running = True
+    srv.throttle = AdmitAll()
+
+    def serve():
+        while srv.running:
+            srv.handle_client()
+        srv._close_sessions()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield srv
+    srv.running = False
+    thread.join(timeout=5)
+    srv.server.close()
+
+
+def encrypted_frame(payload, uid="AAYL-000021-00001", tamper=False):
+    cipher = AES.new(Server.KEY, AES.MODE_GCM)
+    data, tag = cipher.encrypt_and_digest(payload)
+    if tamper:
+        data = bytes([data[0] ^ 0xFF]) + data[1:]
+    return build_header(cipher.nonce, tag, uid, len(data)) + data
+
+
+def connect(srv):
+    return socket.create_connection(srv.server.getsockname(), timeout=5)
+
+
+def open_session(srv):
+    client = connect(srv)
+    client.sendall(build_hello())
+    reply = bytes(recv_exact(client, HELLO_SIZE))
+    assert parse_hello(reply) == PROTOCOL_VERSION
+    return client, reply
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def temp_files(tmp_path):
+    return sorted(p.name for p in (tmp_path / "YL_Temp").iterdir())
+
+
+def test_session_acks_each_frame_in_order(session_server, tmp_path):
+    client, reply = open_session(session_server)
+    with client:
+        # 握手应答中声明会话空闲超时
+        assert hello_idle_timeout(reply) == 5
+        client.sendall(encrypted_frame(b"first"))
+        assert parse_ack(bytes(recv_exact(client, ACK_SIZE))) == (ACK_OK, 0)
+        client.sendall(encrypted_frame(b"second", tamper=True))
+        assert parse_ack(bytes(recv_exact(client, ACK_SIZE))) == (ACK_CORRUPTED, 1)
+        client.sendall(encrypted_frame(b"third"))
+        assert parse_ack(bytes(recv_exact(client, ACK_SIZE))) == (ACK_OK, 2)
+    wait_until(lambda: not session_server._sessions)
+
+    names = temp_files(tmp_path)
+    assert len(names) == 3 and not any(name.endswith(".part") for name in names)
+    contents = sorted((tmp_path / "YL_Temp" / name).read_bytes() for name in names)
+    assert contents == [b"", b"first", b"third"]
+
+
+def test_session_rejected_frame_closes_session(session_server, tmp_path):
+    client, _ = open_session(session_server)
+    with client:
+        # 只发送声明超出 max_image_size 的帧头，服务端不读取密文直接拒绝
+        client.sendall(build_header(bytes(16), bytes(16), "AAYL-000021-00001", 8192))
+        assert parse_ack(bytes(recv_exact(client, ACK_SIZE))) == (ACK_REJECTED, 0)
+        with pytest.raises(IncompleteFrame):
+            recv_exact(client, 1)
+    assert not session_server._sessions
+
+
+def test_legacy_connection_gets_single_frame_without_ack(session_server, tmp_path):
+    with connect(session_server) as client:
+        client.sendall(encrypted_frame(b"legacy"))
+        client.shutdown(socket.SHUT_WR)
+        assert client.recv(1) == b""
+
+    names = temp_files(tmp_path)
+    assert len(names) == 1
+    assert (tmp_path / "YL_Temp" / names[0]).read_bytes() == b"legacy"
+
+
+def test_idle_session_does_not_block_other_devices(session_server, tmp_path):
+    idle, _ = open_session(session_server)
+    with idle:
+        wait_until(lambda: len(session_server._sessions) == 1)
+        # 空闲会话保持期间，其他设备的单帧连接照常处理
+        with connect(session_server) as legacy:
+            legacy.sendall(encrypted_frame(b"other", uid="AAFL-000001-00001"))
+            legacy.shutdown(socket.SHUT_WR)
+            assert legacy.recv(1) == b""
+        assert [p.read_bytes() for p in (tmp_path / "FL_Temp").iterdir()] == [b"other"]
+
+        # 空闲超过 1 秒后仍可在同一会话上继续发送
+        time.sleep(1.2)
+        idle.sendall(encrypted_frame(b"later"))
+        assert parse_ack(bytes(recv_exact(idle, ACK_SIZE))) == (ACK_OK, 0)
+
+
+def test_idle_session_expires_after_session_idle_timeout(session_server):
+    global_setting.get_setting("server_config")["Server"]["session_idle_timeout"] = "0.2"
+    client, _ = open_session(session_server)
+    with client:
+        with pytest.raises(IncompleteFrame):
+            recv_exact(client, 1)
+    wait_until(lambda: not session_server._sessions)
+
+
+def test_polling_sender_session_matches_server_wire_format(session_server, tmp_path):
+    spec = importlib.util.spec_from_file_location(
+        "sender_for_dqy", Path(__file__).resolve().parents[1] / "socket_original" / "sender_for_dqy.py"
+    )
+    sender_for_dqy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sender_for_dqy)
+
+    session = sender_for_dqy.ImageSession(*session_server.server.getsockname())
+    try:
+        assert session.open()
+        assert session.idle_timeout == 5
+        assert session.send(b"one", "AAYL-000021-00001") == ACK_OK
+        assert session.send(b"two", "AAYL-000021-00001") == ACK_OK
+    finally:
+        session.close()
+    assert sorted(p.read_bytes() for p in (tmp_path / "YL_Temp").iterdir()) == [b"one", b"two"]
@@ -0,0 +1,52 @@
+import os
+import time
+from types import SimpleNamespace
+
+from server.temp_watcher import TempFolderIndex, _TempEventHandler
+
+
+def make_index(tmp_path):
+    return TempFolderIndex([tmp_path], [".png", ".jpg"], rescan_interval=60, watch_mode="poll")
+
+
+def write(path, age=0.0):
+    path.write_bytes(b"data")
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_rescan_ignores_part_files_and_files_still_being_written(tmp_path):
+    settled = write(tmp_path / "YL_000021_2026-10-17_12-30-45.png", age=10)
+    write(tmp_path / "YL_000021_2026-10-17_12-30-46.png.part", age=10)
+    fresh = write(tmp_path / "YL_000021_2026-10-17_12-30-47.png")
+    index = make_index(tmp_path)
+
+    index.rescan()
+    assert index.take() == [settled]
+
+    # 首次启动扫描不等待文件稳定
+    index.release([settled])
+    index.rescan(settle=False)
+    assert index.take() == [settled, fresh]
+
+
+def test_events_only_queue_completed_files(tmp_path):
+    index = make_index(tmp_path)
+    handler = _TempEventHandler(index)
+    part = write(tmp_path / "YL_000021_2026-10-17_12-30-45.png.part")
+    final = tmp_path / "YL_000021_2026-10-17_12-30-45.png"
+
+    # 不处理创建事件：文件可能仍在写入
+    assert "on_created" not in _TempEventHandler.__dict__
+    handler.on_closed(SimpleNamespace(is_directory=False, src_path=str(part)))
+    assert index.pending() == 0
+
+    os.replace(part, final)
+    handler.on_moved(SimpleNamespace(is_directory=False, src_path=str(part), dest_path=str(final)))
+    assert index.take() == [final]
+
+    index.release([final])
+    handler.on_closed(SimpleNamespace(is_directory=False, src_path=str(final)))
+    assert index.take() == [final]
@@ -12,9 +12,11 @@ from loguru import logger
 from config.global_setting import global_setting
 from server.image_process import report_writing
 from theme.ThemeQt6 import ThemedWidget
+from util.refresh_bus import RefreshBus, RefreshEvent
 
 
 class Data_thread(QThread):
+    """后台读取图表数据：整体加载时发出全部设备的行，收到设备变化通知时只发出这些设备的行。"""
     # 线程信号
     update_time_thread_doing = pyqtSignal(list)
 
@@ -31,63 +33,79 @@ class Data_thread(QThread):
                                                       'fold_path'] + f"/{global_setting.get_setting('server_config')['Storage']['report_fold_name']}", file_name_preffix=global_setting.get_setting('server_config')['Storage']['report_file_name_preffix'],
             file_name_suffix=global_setting.get_setting('server_config')['Storage']['report_file_name_suffix'])
         try:
-            self.delay_seconds = float(global_setting.get_setting('server_config')['Image_Process']['delay'])
+            refresh_interval = float(global_setting.get_setting('configer')['Status'].get('chart_refresh_interval', 500)) / 1000.0
         except Exception as e:
-            logger.warning(f"未能读取 Image_Process.delay，采用默认间隔 1s，原因: {e}")
-            self.delay_seconds = 1.0
+            logger.warning(f"未能读取 Status.chart_refresh_interval，采用默认间隔 0.5s，原因: {e}")
+            refresh_interval = 0.5
+        refresh_bus = global_setting.get_setting("refresh_bus")
+        self.subscription = refresh_bus.subscribe("chart", refresh_interval) if refresh_bus is not None else None
+        # 检测结果库中各设备最新数据（设备号 -> 行）
+        self._latest = {}
         self.auto_refresh_interval = 30.0
         self._running = False
         pass
 
 
     def run(self):
-        refresh_event = global_setting.get_setting("processing_done")
         self._running = True
+        # 首次启动整体加载
+        events = [RefreshEvent(kind="overflow")]
         while self._running:
-            triggered = False
-            if refresh_event is not None:
-                triggered = refresh_event.wait(timeout=self.auto_refresh_interval)
-            else:
-                time.sleep(self.auto_refresh_interval)
-            if not self._running:
-                break
-            if triggered:
-                logger.debug("新图像，更新图表数据中")
+            if events:
+                logger.debug("新数据，更新图表数据中")
             else:
                 logger.debug("超过 30 秒未收到新数据，触发定时刷新")
             try:
-                latest_file_report_path = self.data_save.get_latest_file(
-                    folder_path=global_setting.get_setting('server_config')['Storage'][
-                                    'fold_path'] + f"/{global_setting.get_setting('server_config')['Storage']['report_fold_name']}")
-                if not latest_file_report_path:
-                    logger.debug("未找到报告文件，跳过本次刷新")
+                store = global_setting.get_setting("detection_store")
+                if store is not None and not events and self._latest:
+                    # 检测结果库的变化都会经过刷新通知，超时期间没有通知说明数据未变，无需重新查询
+                    pass
+                elif store is not None:
+                    # 读取检测结果库的 latest 表；只有数量变化的设备重新查询，首次或通知溢出时整体查询
+                    changed = RefreshBus.changed_devices(events) if events and self._latest else None
+                    rows = store.latest_per_device() if changed is None else store.latest_for_devices(sorted(changed))
+                    if changed is None:
+                        self._latest = {}
+                    for row in rows:
+                        self._latest[row["设备号"]] = row
+                    self.data = list(self._latest.values())
+                    # 增量刷新只发出变化设备的行，界面按行更新对应的柱
+                    self.update_status_main_signal.emit(self.data if changed is None else list(rows), changed is None)
                 else:
-                    self.data_save.file_path = latest_file_report_path
-                    self.data = self.data_save.csv_read_not_dict()
-                    _ = self.data_save.csv_close()
-                    self.update_status_main_signal.emit(self.data)
+                    latest_file_report_path = self.data_save.get_latest_file(
+                        folder_path=global_setting.get_setting('server_config')['Storage'][
+                                        'fold_path'] + f"/{global_setting.get_setting('server_config')['Storage']['report_fold_name']}")
+                    if not latest_file_report_path:
+                        logger.debug("未找到报告文件，跳过本次刷新")
+                    else:
+                        self.data_save.file_path = latest_file_report_path
+                        self.data = self.data_save.csv_read_not_dict()
+                        _ = self.data_save.csv_close()
+                        self.update_status_main_signal.emit(self.data, True)
             except Exception as e:
                 logger.error(f"刷新图表数据失败: {e}")
-            finally:
-                if triggered and self._running and refresh_event is not None:
-                    refresh_event.clear()  # 清除事件以供下次使用
             if not self._running:
                 break
-            time.sleep(self.delay_seconds)
+            # 合并窗口内的多次通知只刷新一次
+            if self.subscription is not None:
+                events = self.subscription.wait(timeout=self.auto_refresh_interval)
+            else:
+                time.sleep(self.auto_refresh_interval)
+                events = []
         pass
 
     pass
 
     def stop(self):
         self._running = False
-        refresh_event = global_setting.get_setting("processing_done")
-        if refresh_event is not None:
-            refresh_event.set()
+        if self.subscription is not None:
+            self.subscription.close()
 
 # 创建柱状图
 class BarChartApp(ThemedWidget):
     data_types=["蜚蠊","蝇类","鼠类"]
-    update_data_main_signal_gui_update = pyqtSignal(list)
+    # (数据行, 是否为全部设备)
+    update_data_main_signal_gui_update = pyqtSignal(list, bool)
     def __init__(self,parent: QVBoxLayout = None, object_name: str = ""):
         super().__init__()
         # 图表按钮存放
@@ -124,10 +142,35 @@ class BarChartApp(ThemedWidget):
         # 离线判定缓存
         self.offline_highlight = {}
         self.categories=None
+        # 当前图表结构：(类型索引, 设备号顺序)，结构不变时只更新变化的柱与标签
+        self._shown_type = None
+        self._shown_keys = []
+        self._shown_index = {}
+        self._shown_values = []
+        self._shown_set = None
+        self._x_range = None
+        # 三类设备数量的最大值（x 轴范围），增量维护；None 表示需要重新计算
+        self._value_max = 0
+        self._merged_uid_count = -1
+        self._title_prefix = ""
+        self._age_map = {}
+        self._offline_label_prefixes = set()
+        self._offline_timeout = 1e9
+        # UID -> 设备号 (AAFL-000001-CAFAF => FL_000001) 解析缓存
+        self._uid_keys = {}
         self.data_thread=None
         self._select_callback = None
         self._init_ui()
         self.init_function()
+        # 设备标签中的上报时间 (2s)/(3min) 由低频定时器整体刷新，数据刷新只更新变化设备的标签
+        try:
+            age_interval = int(global_setting.get_setting('configer')['Status'].get('chart_age_refresh_interval', 10000))
+        except Exception as e:
+            logger.warning(f"未能读取 Status.chart_age_refresh_interval，采用默认间隔 10s，原因: {e}")
+            age_interval = 10000
+        self._age_timer = QTimer(self)
+        self._age_timer.timeout.connect(self._refresh_age_labels)
+        self._age_timer.start(max(1000, age_interval))
 
     def _init_ui(self):
         self.chart_view = QChartView()
@@ -283,67 +326,38 @@ class BarChartApp(ThemedWidget):
         else:
             chart_threads.append(self.data_thread)
 
-    def get_data(self,data):
+    def get_data(self, data, full=True):
 
         # self.fl_data = {item["设备号"]: item["数量"] for item in self.data if item["设备号"].startswith("FL")}
         # self.yl_data = {item["设备号"]: item["数量"] for item in self.data if item["设备号"].startswith("YL")}
+        # full 为 False 时 data 只包含本次有新数据的设备
         self.data = data
-        # 根据最新报告文件刷新数量，但也要合并动态注册的设备（没有出现在本次报告中的保持旧值）
-        self._merge_dynamic_devices()
-        self.update_charts()
-    def update_charts(self):
+        # 根据最新报告文件刷新数量，但也要合并动态注册的设备（没有出现在本次报告中的保持旧值，在 update_charts 中合并）
+        self.update_charts(full)
+    def update_charts(self, full=True):
         # 更新图表
-        title = ""
-        # 动态设备集合（图像）
-        device_uids = global_setting.get_setting("device_uids") or set()
-        last_seen = global_setting.get_setting("last_seen_image") or {}
         cfg = global_setting.get_setting("server_config")
         offline_timeout = float(cfg['Dynamic'].get('offline_timeout_image','120'))
         self._offline_timeout = offline_timeout  # 保存供后续着色使用
-        now_ts = time.time()
         # 确保所有已发现设备都在数据字典中
-        for uid in device_uids:
-            # uid 格式 AAFL-000001-CAFAF => 转换为 FL_000001
-            try:
-                parts = uid.split('-')
-                if len(parts) >= 2:
-                    type_code = parts[0][2:]
-                    num = parts[1]
-                    key = f"{type_code}_{num}"
-                    if type_code == 'FL' and key not in self.fl_data: self.fl_data[key] = 0
-                    elif type_code == 'YL' and key not in self.yl_data: self.yl_data[key] = 0
-            except Exception as e:
-                logger.debug(f"[Chart] 解析设备 UID 失败 {uid}: {e}")
+        self._merge_dynamic_devices()
+        received = []
         for item in self.data:
-            if item["设备号"].startswith("FL"):
-                self.fl_data[item["设备号"]] = int(item["数量"])
-                pass
-            elif item["设备号"].startswith("YL"):
-                self.yl_data[item["设备号"]] = int(item["数量"])
+            key = item["设备号"]
+            if key.startswith("FL"):
+                data_dict = self.fl_data
+            elif key.startswith("YL"):
+                data_dict = self.yl_data
             else:
-                self.sl_data[item["设备号"]] = int(item["数量"])
-            title = item['日期'] + "-"+ item['时间']
-        # 记录每个设备 age（秒），用于标签显示 (2s)/(3min)/(4h)/(2d)
-        self.offline_highlight.clear()
-        self._age_map = {}
-        # 年龄计算：先 BOOT 后 REAL 覆盖，保证真实 UID 最终生效
-        try:
-            boot_uids = [u for u in device_uids if u.endswith('-BOOT')]
-            real_uids = [u for u in device_uids if not u.endswith('-BOOT')]
-            def _record(u):
-                ts2 = last_seen.get(u, 0)
-                age2 = now_ts - ts2 if ts2 else 0
-                p = u.split('-')
-                if len(p) >= 2:
-                    tcode = p[0][2:]
-                    num2 = p[1]
-                    key2 = f"{tcode}_{num2}"
-                    self._age_map[key2] = age2
-            for bu in boot_uids: _record(bu)
-            for ru in real_uids: _record(ru)
-        except Exception as _reorder_e:
-            logger.debug(f"[ChartAgeOrder] 调整 age 覆盖顺序失败: {_reorder_e}")
-        self.chart.setTitle(title  + self.orgin_title)
+                data_dict = self.sl_data
+            value = int(item["数量"])
+            old = data_dict.get(key)
+            if old != value:
+                data_dict[key] = value
+                self._note_value(old, value)
+            received.append(key)
+            self._title_prefix = item['日期'] + "-"+ item['时间']
+        self.chart.setTitle(self._title_prefix + self.orgin_title)
         try:
             empty_current = (
                 (self.choose_type_index == 0 and len(self.fl_data) == 0) or
@@ -366,9 +380,18 @@ class BarChartApp(ThemedWidget):
                     self.chart.addAxis(self.y_axis, Qt.AlignmentFlag.AlignLeft)
                 self.series.attachAxis(self.x_axis); self.series.attachAxis(self.y_axis)
                 self._adjust_chart_height(1)
+                self._shown_type = None
+                return
+
+            current_data = self._current_data()
+            # 设备只增不减，数量不变即设备集合未变化
+            if not full and self._shown_type == self.choose_type_index and len(current_data) == len(self._shown_keys):
+                # 只更新本次有新数据的设备的柱与标签
+                self._update_chart_incremental(current_data, received)
                 return
 
-            # 有数据时重建 series
+            # 整体加载、类型切换或设备增加时重建 series
+            self._age_map = self._compute_age_map()
             self._set_data_set()
             self._set_series()
             self.set_data_to_series()
@@ -380,6 +403,11 @@ class BarChartApp(ThemedWidget):
                 case 2: nums = len(self.sl_data)
                 case _: nums = 1
             self._adjust_chart_height(nums)
+            self._shown_type = self.choose_type_index
+            self._shown_keys = self._sorted_keys(current_data)
+            self._shown_index = {key: index for index, key in enumerate(self._shown_keys)}
+            self._shown_values = [int(current_data[k]) for k in self._shown_keys]
+            self._shown_set = {0: self.fl_set, 1: self.yl_set, 2: self.sl_set}.get(self.choose_type_index)
         except Exception as e:
             logger.error(f"charts报错，原因：{e}")
         pass
@@ -387,7 +415,7 @@ class BarChartApp(ThemedWidget):
         # 创建数据集、
         def _sorted_values(data_dict):
             # 按设备号中的数字部分升序
-            keys_sorted = sorted(data_dict.keys(), key=lambda k: int(k.split('_')[1]) if '_' in k else k)
+            keys_sorted = self._sorted_keys(data_dict)
             logger.debug(f"device list: {keys_sorted}")
             return [int(data_dict[k]) for k in keys_sorted]
         fl_set_temp = _sorted_values(self.fl_data)
@@ -446,14 +474,8 @@ class BarChartApp(ThemedWidget):
     def _set_x_axis(self):
         # 设置 X 轴
         # 收集所有数值（空则默认 [0]）
-        fl_vals = [int(i) for i in self.fl_data.values()] or [0]
-        yl_vals = [int(i) for i in self.yl_data.values()] or [0]
-        sl_vals = [int(i) for i in self.sl_data.values()] or [0]
-        try:
-            max_val = max(max(fl_vals), max(yl_vals), max(sl_vals))
-        except ValueError:
-            max_val = 0
-        rng = max_val + 5 if max_val < 1000000 else max_val  # 防止极端溢出
+        rng = self._x_axis_range()
+        self._x_range = rng
         if self.x_axis is None:
             self.x_axis = QValueAxis()
             self.x_axis.setTitleText("生物数量（个）")
@@ -478,36 +500,8 @@ class BarChartApp(ThemedWidget):
         # for value in zip(extenal_list_data['FL'], extenal_list_data['YL']):
         #     keys.append(value[0].split("_")[0] + "/" + value[1].split("_")[0]+f"{int(value[1].split('_')[1])}")
         # 柱状图横向过后，数据标签x轴从上往下是大到小的设备号排列，我们需要逆转一下从小到大排列
-        keys = []
-        choose_data_keys=[]
-        match self.choose_type_index:
-            case 0:choose_data_keys=sorted(self.fl_data.keys(), key=lambda k: int(k.split('_')[1]) if '_' in k else k)
-            case 1:choose_data_keys=sorted(self.yl_data.keys(), key=lambda k: int(k.split('_')[1]) if '_' in k else k)
-            case 2:choose_data_keys=sorted(self.sl_data.keys(), key=lambda k: int(k.split('_')[1]) if '_' in k else k)
-            case _:pass
-        def _fmt_age(seconds: float) -> str:
-            if seconds <= 2:  # 认为刚在线
-                return "(0s)"
-            if seconds < 60:
-                return f"({int(seconds)}s)"
-            mins = seconds / 60
-            if mins < 60:
-                return f"({int(mins)}min)"
-            hours = mins / 60
-            if hours < 24:
-                return f"({int(hours)}h)"
-            days = hours / 24
-            return f"({int(days)}d)"
-
-        self._offline_label_prefixes = set()
-        for value in choose_data_keys:
-            age = self._age_map.get(value, 0)
-            label = f"{value}{_fmt_age(age)}"
-            if age > getattr(self, '_offline_timeout', 1e9):
-                # 记录离线前缀用于着色（value 而不是完整 label）
-                self._offline_label_prefixes.add(value)
-            keys.append(label)
-        self.categories = keys
+        choose_data_keys = self._sorted_keys(self._current_data())
+        self.categories, self._offline_label_prefixes = self._category_labels(choose_data_keys)
         if self.y_axis is None:
             self.y_axis = QBarCategoryAxis()
             self.y_axis.append(self.categories)
@@ -550,20 +544,162 @@ class BarChartApp(ThemedWidget):
 
     def _merge_dynamic_devices(self):
         # 确保在图表数据字典中包含所有已注册设备（未出现在报告中的保持原值）
+        # 只在已注册设备数变化时合并；BOOT UID 被真实 UID 替换时设备号不变，无需处理
         device_uids = global_setting.get_setting("device_uids") or set()
-        for uid in device_uids:
-            try:
-                parts = uid.split('-')
-                if len(parts) >= 2:
-                    type_code = parts[0][2:]
-                    num = parts[1]
-                    key = f"{type_code}_{num}"
-                    if type_code == 'FL' and key not in self.fl_data:
-                        self.fl_data[key] = 0
-                    elif type_code == 'YL' and key not in self.yl_data:
-                        self.yl_data[key] = 0
-            except Exception as e:
-                logger.debug(f"[ChartMerge] 解析失败 {uid}: {e}")
+        if len(device_uids) == self._merged_uid_count:
+            return
+        self._merged_uid_count = len(device_uids)
+        for uid in list(device_uids):
+            key = self._uid_key(uid)
+            if key is None:
+                continue
+            if key.startswith('FL_') and key not in self.fl_data:
+                self.fl_data[key] = 0
+            elif key.startswith('YL_') and key not in self.yl_data:
+                self.yl_data[key] = 0
+
+    def _uid_key(self, uid):
+        # uid 格式 AAFL-000001-CAFAF => 转换为 FL_000001，结果缓存
+        key = self._uid_keys.get(uid)
+        if key is None and uid not in self._uid_keys:
+            parts = uid.split('-')
+            if len(parts) >= 2:
+                key = f"{parts[0][2:]}_{parts[1]}"
+            else:
+                logger.debug(f"[ChartMerge] 解析失败 {uid}")
+            self._uid_keys[uid] = key
+        return key
+
+    def _current_data(self):
+        match self.choose_type_index:
+            case 0: return self.fl_data
+            case 1: return self.yl_data
+            case 2: return self.sl_data
+            case _: return {}
+
+    @staticmethod
+    def _sorted_keys(data_dict):
+        # 按设备号中的数字部分升序
+        return sorted(data_dict.keys(), key=lambda k: int(k.split('_')[1]) if '_' in k else k)
+
+    def _note_value(self, old, new):
+        # 增量维护最大值；原最大值变小时才需要重新计算
+        if self._value_max is None:
+            return
+        if new >= self._value_max:
+            self._value_max = new
+        elif old is not None and old >= self._value_max:
+            self._value_max = None
+
+    def _x_axis_range(self):
+        if self._value_max is None:
+            # 收集所有数值（空则默认 [0]）
+            self._value_max = max(
+                (int(v) for data_dict in (self.fl_data, self.yl_data, self.sl_data) for v in data_dict.values()),
+                default=0,
+            )
+        max_val = self._value_max
+        return max_val + 5 if max_val < 1000000 else max_val  # 防止极端溢出
+
+    def _compute_age_map(self):
+        # 记录每个设备 age（秒），用于标签显示 (2s)/(3min)/(4h)/(2d)
+        device_uids = global_setting.get_setting("device_uids") or set()
+        last_seen = global_setting.get_setting("last_seen_image") or {}
+        now_ts = time.time()
+        age_map = {}
+        # 年龄计算：先 BOOT 后 REAL 覆盖，保证真实 UID 最终生效
+        try:
+            uids = list(device_uids)
+            boot_uids = [u for u in uids if u.endswith('-BOOT')]
+            real_uids = [u for u in uids if not u.endswith('-BOOT')]
+            for u in boot_uids + real_uids:
+                ts2 = last_seen.get(u, 0)
+                key2 = self._uid_key(u)
+                if key2 is not None:
+                    age_map[key2] = now_ts - ts2 if ts2 else 0
+        except Exception as _reorder_e:
+            logger.debug(f"[ChartAgeOrder] 调整 age 覆盖顺序失败: {_reorder_e}")
+        return age_map
+
+    def _refresh_age_labels(self):
+        """低频定时器：重新计算全部设备的上报时间标签，有变化时一次 setCategories。"""
+        if self._shown_type is None or self.y_axis is None or not self._shown_keys:
+            return
+        self._age_map = self._compute_age_map()
+        labels, offline = self._category_labels(self._shown_keys)
+        relabeled = labels != self.categories
+        if relabeled:
+            self.categories = labels
+            self.y_axis.setCategories(labels)
+        if relabeled or offline != self._offline_label_prefixes:
+            self._offline_label_prefixes = offline
+            QTimer.singleShot(0, self._recolor_axis_labels)
+
+    @staticmethod
+    def _fmt_age(seconds: float) -> str:
+        if seconds <= 2:  # 认为刚在线
+            return "(0s)"
+        if seconds < 60:
+            return f"({int(seconds)}s)"
+        mins = seconds / 60
+        if mins < 60:
+            return f"({int(mins)}min)"
+        hours = mins / 60
+        if hours < 24:
+            return f"({int(hours)}h)"
+        days = hours / 24
+        return f"({int(days)}d)"
+
+    def _category_labels(self, keys):
+        # y 轴标签：设备号 + 距上次上报时间；超过离线时间的设备号单独返回用于着色
+        labels = []
+        offline = set()
+        for value in keys:
+            age = self._age_map.get(value, 0)
+            if age > self._offline_timeout:
+                # 记录离线前缀用于着色（value 而不是完整 label）
+                offline.add(value)
+            labels.append(f"{value}{self._fmt_age(age)}")
+        return labels, offline
+
+    def _update_chart_incremental(self, current_data, received):
+        """设备集合不变时的刷新：只处理本次有新数据的设备。
+
+        变化的柱用 QBarSet.replace 更新；这些设备刚上报，标签改为 (0s) 后一次 setCategories；
+        其余设备的上报时间标签由 _refresh_age_labels 定时刷新。
+        """
+        bar_set = self._shown_set
+        changed = 0
+        relabeled = False
+        offline_changed = False
+        fresh = self._fmt_age(0)
+        for key in received:
+            index = self._shown_index.get(key)
+            if index is None:
+                # 其他类型的设备
+                continue
+            value = int(current_data[key])
+            if value != self._shown_values[index]:
+                bar_set.replace(index, value)
+                self._shown_values[index] = value
+                changed += 1
+            self._age_map[key] = 0
+            label = f"{key}{fresh}"
+            if self.categories[index] != label:
+                self.categories[index] = label
+                relabeled = True
+            if key in self._offline_label_prefixes:
+                self._offline_label_prefixes.discard(key)
+                offline_changed = True
+        if relabeled:
+            self.y_axis.setCategories(self.categories)
+        rng = self._x_axis_range()
+        if rng != self._x_range:
+            self.x_axis.setRange(0, rng)
+            self._x_range = rng
+        if relabeled or offline_changed:
+            QTimer.singleShot(0, self._recolor_axis_labels)
+        logger.debug(f"[Chart] 增量刷新: 设备 {len(received)}，数值变化 {changed}，标签{'已' if relabeled else '未'}更新")
 
 
     def set_style(self):
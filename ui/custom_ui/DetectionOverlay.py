@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from PyQt6.QtCore import QPointF, QRectF
+from PyQt6.QtGui import QColor, QFont, QImage, QPainter, QPen
+
+from server.detect import color_palette
+from server.detection_sidecar import visible_detections
+
+
+def draw_detections(image: QImage, sidecar: Dict[str, Any], min_score: Optional[float] = None) -> QImage:
+    """按检测结果附属文件在图片上绘制检测框（坐标按附属文件记录的原图尺寸缩放），返回新图片。"""
+    detections = visible_detections(sidecar, min_score)
+    if image.isNull() or not detections:
+        return image
+    width = float(sidecar.get("width") or image.width())
+    height = float(sidecar.get("height") or image.height())
+    sx = image.width() / width if width > 0 else 1.0
+    sy = image.height() / height if height > 0 else 1.0
+    class_names = sidecar.get("class_names") or []
+
+    result = image.convertToFormat(QImage.Format.Format_RGB32)
+    painter = QPainter(result)
+    try:
+        # 线宽与字号随显示尺寸变化，缩略图上也清晰可见
+        line_width = max(2, round(max(result.width(), result.height()) / 400))
+        font = QFont()
+        font.setPixelSize(max(12, line_width * 6))
+        painter.setFont(font)
+        for class_id, score, x1, y1, x2, y2 in (d[:6] for d in detections):
+            b, g, r = color_palette(int(class_id))  # 与 cv2 标注图颜色一致（BGR）
+            color = QColor(r, g, b)
+            painter.setPen(QPen(color, line_width))
+            rect = QRectF(x1 * sx, y1 * sy, (x2 - x1) * sx, (y2 - y1) * sy)
+            painter.drawRect(rect)
+            name = class_names[int(class_id)] if 0 <= int(class_id) < len(class_names) else str(class_id)
+            text_y = max(float(font.pixelSize()), rect.top() - line_width * 2)
+            painter.drawText(QPointF(rect.left(), text_y), f"{name} {score:.2f}")
+    finally:
+        painter.end()
+    return result
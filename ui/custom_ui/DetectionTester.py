@@ -8,7 +8,7 @@ from typing import Optional
 import cv2
 from loguru import logger
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPixmap, QImage
+from PyQt6.QtGui import QPixmap, QImage, QImageReader
 from PyQt6.QtWidgets import (
     QFileDialog,
     QFrame,
@@ -21,9 +21,11 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
-from server.detect import IMAGE_EXTENSIONS
+from server.archive import ARCHIVE_EXTENSIONS
+from server.detection_sidecar import build_sidecar, class_counts, read_sidecar
 from server.image_process import _DETECTORS, _MODEL_CONFIGS
 from theme.ThemeQt6 import ThemedWidget
+from ui.custom_ui.DetectionOverlay import draw_detections
 
 
 class RecognitionTestWindow(ThemedWidget):
@@ -137,7 +139,7 @@ class RecognitionTestWindow(ThemedWidget):
             self,
             "选择测试图片",
             folder,
-            "图像文件 (*.jpg *.jpeg *.png *.bmp *.tif *.tiff)",
+            "图像文件 (*.jpg *.jpeg *.png *.bmp *.tif *.tiff *.webp)",
         )
         if file_path:
             self._process_file(Path(file_path))
@@ -152,29 +154,40 @@ class RecognitionTestWindow(ThemedWidget):
             QMessageBox.critical(self, "模型未配置", f"未找到 {self._current_type} 对应的模型配置。")
             return
 
-        try:
-            detector = _DETECTORS.get(self._current_type)
-            image, detections = detector.predict_from_path(image_path)
-            annotated = detector.annotate(image, detections)
-        except Exception as exc:
-            logger.error(f"模型识别失败: {exc}")
-            QMessageBox.critical(self, "识别失败", f"识别过程中出现错误:\n{exc}")
+        # 归档图片带有同一模型的检测结果附属文件时直接绘制，不再重新推理
+        sidecar = read_sidecar(image_path)
+        if sidecar is not None and sidecar.get("model_tag") == config.tag:
+            source = "归档检测结果"
+            qimage = self._load_qimage(image_path)
+        else:
+            try:
+                detector = _DETECTORS.get(self._current_type)
+                image, detections = detector.predict_from_path(image_path)
+            except Exception as exc:
+                logger.error(f"模型识别失败: {exc}")
+                QMessageBox.critical(self, "识别失败", f"识别过程中出现错误:\n{exc}")
+                return
+            sidecar = build_sidecar(
+                detections, detector.class_names, config.tag, image.shape, conf_threshold=detector.conf_threshold
+            )
+            source = "模型识别"
+            qimage = self._qimage_from_bgr(image)
+
+        if qimage is None:
+            QMessageBox.warning(self, "显示失败", "无法将识别结果转换为图像。")
             return
+        if not sidecar.get("burned_in"):
+            qimage = draw_detections(qimage, sidecar)
 
         self._current_path = image_path
-        class_counts = Counter(det.class_id for det in detections)
-        count_text = self._format_count_text(class_counts, config.class_names)
-        self.count_label.setText(f"检测数量：{sum(class_counts.values())}")
+        counts = class_counts(sidecar)
+        count_text = self._format_count_text(counts, sidecar.get("class_names") or config.class_names)
+        self.count_label.setText(f"检测数量：{sum(counts.values())}")
         self.extra_info_label.setText(count_text)
 
-        pixmap = self._pixmap_from_bgr(annotated)
-        if pixmap is None:
-            QMessageBox.warning(self, "显示失败", "无法将识别结果转换为图像。")
-            return
-
-        self._current_pixmap = pixmap
+        self._current_pixmap = QPixmap.fromImage(qimage)
         self._update_image_label()
-        self.hint_label.setText(f"文件：{image_path.name}")
+        self.hint_label.setText(f"文件：{image_path.name}（{source}）")
 
     def _format_count_text(self, counts: Counter, class_names) -> str:
         if not counts:
@@ -188,14 +201,22 @@ class RecognitionTestWindow(ThemedWidget):
             parts.append(f"{name}:{amount}")
         return " | ".join(parts)
 
-    def _pixmap_from_bgr(self, image) -> Optional[QPixmap]:
+    def _qimage_from_bgr(self, image) -> Optional[QImage]:
         if image is None:
             return None
         rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         height, width, channel = rgb.shape
         bytes_per_line = channel * width
-        qimage = QImage(rgb.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-        return QPixmap.fromImage(qimage)
+        # copy() 使 QImage 不再引用 numpy 缓冲区
+        return QImage(rgb.data, width, height, bytes_per_line, QImage.Format.Format_RGB888).copy()
+
+    @staticmethod
+    def _load_qimage(image_path: Path) -> Optional[QImage]:
+        reader = QImageReader(str(image_path))
+        # 与 cv2.imread 一致按 EXIF 方向旋转，附属文件中的坐标才能对齐
+        reader.setAutoTransform(True)
+        image = reader.read()
+        return None if image.isNull() else image
 
     def _update_image_label(self) -> None:
         if self._current_pixmap is None:
@@ -221,4 +242,4 @@ class RecognitionTestWindow(ThemedWidget):
     # ------------------------------------------------------------------
     @staticmethod
     def _is_supported_file(path: os.PathLike | str) -> bool:
-        return Path(path).suffix.lower() in IMAGE_EXTENSIONS
\ No newline at end of file
+        return Path(path).suffix.lower() in ARCHIVE_EXTENSIONS
\ No newline at end of file
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from PyQt6.QtCore import QObject, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader, QPixmap
+from loguru import logger
+
+from config.global_setting import global_setting
+from server.detection_sidecar import read_sidecar
+from ui.custom_ui.DetectionOverlay import draw_detections
+
+# (路径, 修改时间纳秒, 文件大小)：原图被覆盖后自动失效
+CacheKey = Tuple[str, int, int]
+
+# 每提交多少个解码任务检查一次缩略图目录大小
+_PRUNE_EVERY = 1000
+
+
+def _app_dir() -> Path:
+    """程序所在目录：打包后为 exe 所在目录，开发模式为源码根目录（不随启动时的工作目录变化）。"""
+    if getattr(sys, "frozen", False):
+        return Path(sys.executable).resolve().parent
+    return Path(__file__).resolve().parents[2]
+
+
+def prune_thumbnails(directory: Path, max_bytes: int) -> int:
+    """缩略图目录超出 max_bytes 时按修改时间（读取时会刷新）从旧到新删除，降到上限的 90%，返回删除数量。"""
+    files = []
+    total = 0
+    try:
+        with os.scandir(directory) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                with os.scandir(bucket.path) as entries:
+                    for entry in entries:
+                        try:
+                            if not entry.is_file():
+                                continue
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+    except OSError:
+        return 0
+    if total <= max_bytes:
+        return 0
+    target = int(max_bytes * 0.9)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    logger.info(f"[GalleryCache] 缩略图目录超出上限，已删除 {removed} 个最久未使用的缩略图")
+    return removed
+
+
+class _DecodeSignals(QObject):
+    decoded = pyqtSignal(object, object)  # CacheKey, QImage (失败时为 None)
+
+
+class _DecodeTask(QRunnable):
+    """在线程池中解码并缩小图片；优先读取磁盘缩略图，没有时解码原图并写入缩略图。"""
+
+    def __init__(
+        self,
+        key: CacheKey,
+        max_size: int,
+        thumb_path: Optional[Path],
+        signals: _DecodeSignals,
+        overlay_min_score: Optional[float] = None,
+    ) -> None:
+        super().__init__()
+        self.key = key
+        self.max_size = max_size
+        self.thumb_path = thumb_path
+        self.signals = signals
+        self.overlay_min_score = overlay_min_score
+
+    def run(self) -> None:
+        image = None
+        try:
+            if self.thumb_path is not None and self.thumb_path.exists():
+                image = QImage(str(self.thumb_path))
+                if image.isNull():
+                    image = None
+                else:
+                    self._touch_thumbnail()
+            if image is None:
+                image = self._decode_original()
+                if image is not None and self.thumb_path is not None:
+                    self._save_thumbnail(image)
+            if image is not None:
+                # 按检测结果附属文件绘制检测框（缩略图中不含检测框，阈值可随时调整）
+                sidecar = read_sidecar(Path(self.key[0]))
+                if sidecar is not None and not sidecar.get("burned_in"):
+                    image = draw_detections(image, sidecar, self.overlay_min_score)
+        except Exception as exc:
+            logger.debug(f"[GalleryCache] 解码失败 {self.key[0]}: {exc}")
+            image = None
+        self.signals.decoded.emit(self.key, image)
+
+    def _decode_original(self) -> Optional[QImage]:
+        reader = QImageReader(self.key[0])
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid() and self.max_size > 0 and max(size.width(), size.height()) > self.max_size:
+            # 解码阶段直接缩小到显示尺寸
+            reader.setScaledSize(size.scaled(QSize(self.max_size, self.max_size), Qt.AspectRatioMode.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            logger.debug(f"[GalleryCache] 无法读取 {self.key[0]}: {reader.errorString()}")
+            return None
+        return image
+
+    def _touch_thumbnail(self) -> None:
+        # 刷新修改时间，缩略图目录超出上限时按最久未使用删除
+        try:
+            os.utime(self.thumb_path)
+        except OSError:
+            pass
+
+    def _save_thumbnail(self, image: QImage) -> None:
+        try:
+            self.thumb_path.parent.mkdir(parents=True, exist_ok=True)
+            part_path = self.thumb_path.with_name(self.thumb_path.name + ".part")
+            if image.save(str(part_path), "JPG", 90):
+                os.replace(part_path, self.thumb_path)
+        except OSError as exc:
+            logger.debug(f"[GalleryCache] 写入缩略图失败 {self.thumb_path}: {exc}")
+
+
+class _PruneTask(QRunnable):
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def run(self) -> None:
+        try:
+            prune_thumbnails(self.directory, self.max_bytes)
+        except Exception as exc:
+            logger.debug(f"[GalleryCache] 清理缩略图失败 {self.directory}: {exc}")
+
+
+class GalleryImageCache(QObject):
+    """
+    图库图片缓存
+    - 解码与缩小在后台线程完成，GUI 线程只把 QImage 转为 QPixmap
+    - 显示尺寸的 QPixmap 按 LRU 保存在内存中，总大小受 memory_budget 限制
+    - 缩小后的图片以 JPEG 保存到磁盘缩略图目录，重新打开程序时直接读取；
+      相对路径以程序所在目录为准，总大小超过 thumbnail_max_mb 时后台删除最久未使用的缩略图
+    """
+
+    image_ready = pyqtSignal(str, QPixmap)  # 图片路径, 显示尺寸的图片
+    image_failed = pyqtSignal(str)
+
+    def __init__(
+        self,
+        max_size: int = 1600,
+        memory_budget_mb: float = 256,
+        thumbnail_dir: str = "",
+        workers: int = 2,
+        overlay_min_score: Optional[float] = None,
+        thumbnail_max_mb: float = 0,
+    ) -> None:
+        super().__init__()
+        self.max_size = max(0, int(max_size))
+        # 显示检测框的最低置信度，None 表示显示附属文件中的全部检测
+        self.overlay_min_score = overlay_min_score
+        self.memory_budget = int(max(16.0, float(memory_budget_mb)) * 1024 * 1024)
+        self.thumbnail_dir = (_app_dir() / thumbnail_dir).resolve() if thumbnail_dir else None
+        self.thumbnail_max_bytes = int(max(0.0, float(thumbnail_max_mb)) * 1024 * 1024)
+        self._submitted = 0
+        self._pixmaps: "OrderedDict[CacheKey, QPixmap]" = OrderedDict()
+        self._used_bytes = 0
+        self._inflight: Set[CacheKey] = set()
+        self._keys: Dict[str, CacheKey] = {}
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(max(1, int(workers)))
+        self._signals = _DecodeSignals()
+        self._signals.decoded.connect(self._on_decoded)
+        self._schedule_prune()
+
+    @classmethod
+    def from_config(cls) -> "GalleryImageCache":
+        section = {}
+        configer = global_setting.get_setting("configer")
+        try:
+            section = configer["Gallery"]
+        except Exception:
+            pass
+        try:
+            min_score = str(section.get("overlay_min_score", "")).strip()
+            return cls(
+                max_size=int(section.get("display_max_size", 1600)),
+                memory_budget_mb=float(section.get("cache_mb", 256)),
+                thumbnail_dir=section.get("thumbnail_dir", "./cache/thumbnails"),
+                workers=int(section.get("decode_workers", 2)),
+                overlay_min_score=float(min_score) if min_score else None,
+                thumbnail_max_mb=float(section.get("thumbnail_max_mb", 512)),
+            )
+        except (TypeError, ValueError) as exc:
+            logger.warning(f"[GalleryCache] Gallery 配置无效，使用默认值: {exc}")
+            return cls(thumbnail_dir="./cache/thumbnails", thumbnail_max_mb=512)
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+    def get(self, path: Path) -> Optional[QPixmap]:
+        """已缓存时直接返回显示尺寸的图片，否则返回 None。"""
+        key = self._key(path)
+        if key is None:
+            return None
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def request(self, path: Path, prefetch: bool = False) -> bool:
+        """后台加载图片，完成后发出 image_ready；已在缓存中或正在加载时返回 False。"""
+        key = self._key(path)
+        if key is None:
+            if not prefetch:
+                self.image_failed.emit(str(path))
+            return False
+        if key in self._pixmaps or key in self._inflight:
+            return False
+        self._inflight.add(key)
+        task = _DecodeTask(key, self.max_size, self._thumbnail_path(key), self._signals, self.overlay_min_score)
+        # 当前图片优先于预取
+        self._pool.start(task, 0 if prefetch else 1)
+        self._submitted += 1
+        if self._submitted % _PRUNE_EVERY == 0:
+            self._schedule_prune()
+        return True
+
+    def clear(self) -> None:
+        self._pixmaps.clear()
+        self._used_bytes = 0
+
+    def shutdown(self) -> None:
+        self._pool.clear()
+        self._pool.waitForDone(2000)
+
+    # ------------------------------------------------------------------
+    # 内部逻辑
+    # ------------------------------------------------------------------
+    def _schedule_prune(self) -> None:
+        if self.thumbnail_dir is None or self.thumbnail_max_bytes <= 0:
+            return
+        # 优先级最低，不影响图片解码
+        self._pool.start(_PruneTask(self.thumbnail_dir, self.thumbnail_max_bytes), -1)
+
+    def _key(self, path: Path) -> Optional[CacheKey]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        self._keys[str(path)] = key
+        return key
+
+    def _thumbnail_path(self, key: CacheKey) -> Optional[Path]:
+        if self.thumbnail_dir is None:
+            return None
+        digest = hashlib.sha1(f"{key[0]}|{key[1]}|{key[2]}|{self.max_size}".encode("utf-8")).hexdigest()
+        return self.thumbnail_dir / digest[:2] / f"{digest}.jpg"
+
+    def _on_decoded(self, key: CacheKey, image: Optional[QImage]) -> None:
+        self._inflight.discard(key)
+        if image is None:
+            self.image_failed.emit(key[0])
+            return
+        pixmap = QPixmap.fromImage(image)
+        self._put(key, pixmap)
+        # 原图在加载期间被替换时，只发出与最新文件对应的结果
+        if self._keys.get(key[0]) == key:
+            self.image_ready.emit(key[0], pixmap)
+
+    def _put(self, key: CacheKey, pixmap: QPixmap) -> None:
+        size = max(1, pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8))
+        self._pixmaps[key] = pixmap
+        self._used_bytes += size
+        while self._used_bytes > self.memory_budget and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._used_bytes -= max(1, evicted.width() * evicted.height() * max(1, evicted.depth() // 8))
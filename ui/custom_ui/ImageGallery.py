@@ -2,15 +2,36 @@ from __future__ import annotations
 from pathlib import Path
 from typing import List, Optional
 
-from PyQt6.QtCore import Qt, QEvent
+from PyQt6.QtCore import Qt, QEvent, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt6.QtGui import QPixmap
 from PyQt6.QtWidgets import QLabel, QPushButton, QMessageBox, QPlainTextEdit, QComboBox
 from loguru import logger
 
 from config.global_setting import global_setting
-from server.detect import IMAGE_EXTENSIONS
+from server.record_index import RecordIndex, record_indexes
 from theme.ThemeQt6 import ThemedWidget
 from ui.custom_ui.DetectionTester import RecognitionTestWindow
+from ui.custom_ui.GalleryImageCache import GalleryImageCache
+
+
+class _IndexScanSignals(QObject):
+    finished = pyqtSignal(object)  # RecordIndex
+
+
+class _IndexScanTask(QRunnable):
+    """在线程池中扫描 Record 目录，完成后通知图库重新定位。"""
+
+    def __init__(self, index: RecordIndex, signals: _IndexScanSignals) -> None:
+        super().__init__()
+        self.index = index
+        self.signals = signals
+
+    def run(self) -> None:
+        try:
+            self.index.rescan()
+        except Exception as exc:
+            logger.error(f"[ImageGallery] 扫描 Record 目录失败 {self.index.directory}: {exc}")
+        self.signals.finished.emit(self.index)
 
 
 class ImageGallery(ThemedWidget):
@@ -40,12 +61,31 @@ class ImageGallery(ThemedWidget):
 
         self._current_type: Optional[str] = None
         self._current_dir: Optional[Path] = None
-        self._images: List[Path] = []
+        # Record 目录的增量索引（从新到旧），图库只按页读取
+        self._index: Optional[RecordIndex] = None
+        self._index_version: int = -1
+        self._page_size = self._read_page_size()
+        self._page: List[Path] = []
+        self._page_offset: int = 0
+        self._page_version: int = -1
         self._current_index: int = -1
         self._current_pixmap: Optional[QPixmap] = None
         self._current_path: Optional[Path] = None
+        # 等待后台加载的图片（切换过快时只显示最后一次选择的图片）
+        self._requested_path: Optional[Path] = None
+        # 上次缩放结果对应的 (图片, 宽, 高)，尺寸未变化时不重复缩放
+        self._scaled_for = None
         self.test_window: Optional[RecognitionTestWindow] = None
 
+        # 后台解码 + 显示尺寸 LRU 缓存 + 磁盘缩略图
+        self.image_cache = GalleryImageCache.from_config()
+        self.image_cache.image_ready.connect(self._on_image_ready)
+        self.image_cache.image_failed.connect(self._on_image_failed)
+        # Record 目录首次扫描在全局线程池中进行，GUI 线程只读取扫描结果
+        self._scan_signals = _IndexScanSignals()
+        self._scan_signals.finished.connect(self._on_index_scanned)
+        self._scanning_indexes = set()
+
         self.canvas_label.installEventFilter(self)
 
         # 绑定事件
@@ -73,6 +113,7 @@ class ImageGallery(ThemedWidget):
 
         self._current_type = type_code
         self._current_dir = self._resolve_record_dir(type_code)
+        self._index = record_indexes.get(self._current_dir) if self._current_dir is not None else None
         if self.test_btn is not None:
             self.test_btn.setEnabled(type_code in {"FL", "YL"})
         if self.test_window is not None:
@@ -81,54 +122,94 @@ class ImageGallery(ThemedWidget):
         self.refresh()
 
     def refresh(self) -> None:
+        """手动刷新：索引由归档通知增量维护，只在尚未扫描时后台扫描 Record 目录，然后重新定位。"""
         directory = self._current_dir
-        if directory is None:
-            self._images = []
+        if directory is not None:
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+            except Exception:
+                # 即使目录创建失败也继续尝试列出已有文件
+                pass
+            self._start_scan(self._index)
+        self._reload()
+
+    def _start_scan(self, index: Optional[RecordIndex]) -> None:
+        if index is None or index.loaded or index in self._scanning_indexes:
+            return
+        self._scanning_indexes.add(index)
+        QThreadPool.globalInstance().start(_IndexScanTask(index, self._scan_signals))
+
+    def _on_index_scanned(self, index: RecordIndex) -> None:
+        self._scanning_indexes.discard(index)
+        if index is self._index:
+            self._reload()
+
+    def on_data_updated(self) -> None:
+        """数据更新时只在 Record 索引变化后重新定位，否则只同步设备列表。"""
+        if self._index is not None and self._index.version == self._index_version:
+            self._update_device_combo()
+            return
+        self._reload()
+
+    def current_image_path(self) -> Optional[Path]:
+        """返回当前展示的图片路径。"""
+        return self._current_path
+
+    # ------------------------------------------------------------------
+    # 内部逻辑
+    # ------------------------------------------------------------------
+    def _reload(self) -> None:
+        index = self._index
+        if index is None:
+            self._index_version = -1
+            self._page = []
             self._current_index = -1
             self._show_placeholder()
             self._set_path_display("")
             self._update_navigation_buttons()
-            self._update_device_combo([])
+            self._update_device_combo()
             return
 
-        try:
-            directory.mkdir(parents=True, exist_ok=True)
-        except Exception:
-            # 即使目录创建失败也继续尝试列出已有文件
-            pass
-
-        image_files = [p for p in directory.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS and p.is_file()]
-        image_files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-        previous_path = self.current_image_path()
-        self._images = image_files
-        self._update_device_combo(image_files)
+        self._index_version = index.version
+        previous_path = self.current_image_path() or self._requested_path
+        self._update_device_combo()
 
-        if not self._images:
+        if self._image_count() == 0:
             self._current_index = -1
-            self._show_placeholder()
+            self._show_placeholder("暂无图片" if index.loaded else "正在读取图片列表...")
             self._set_path_display("")
             self._update_navigation_buttons()
             return
 
-        if previous_path and previous_path in self._images:
-            self._current_index = self._images.index(previous_path)
-        else:
-            self._current_index = 0
-
-        self._display_image(self._images[self._current_index])
+        position = index.position_of(previous_path)
+        self._current_index = position if position >= 0 else 0
+        self._display_image(self._image_at(self._current_index))
         self._update_navigation_buttons()
 
-    def on_data_updated(self) -> None:
-        """供外部信号复用，简单调用 refresh。"""
-        self.refresh()
+    def _image_count(self) -> int:
+        return len(self._index) if self._index is not None else 0
 
-    def current_image_path(self) -> Optional[Path]:
-        """返回当前展示的图片路径。"""
-        return self._current_path
+    def _image_at(self, position: int) -> Optional[Path]:
+        """按从新到旧的位置取图片，只在位置超出当前页或索引变化时读取新的一页。"""
+        if self._index is None or position < 0:
+            return None
+        if (
+            self._page_version != self._index.version
+            or not self._page_offset <= position < self._page_offset + len(self._page)
+        ):
+            self._page_offset = position - position % self._page_size
+            self._page_version = self._index.version
+            self._page = self._index.page(self._page_offset, self._page_size)
+        offset = position - self._page_offset
+        return self._page[offset] if 0 <= offset < len(self._page) else None
+
+    @staticmethod
+    def _read_page_size() -> int:
+        try:
+            return max(1, int(global_setting.get_setting('configer')['Gallery'].get('page_size', 200)))
+        except Exception:
+            return 200
 
-    # ------------------------------------------------------------------
-    # 内部逻辑
-    # ------------------------------------------------------------------
     def _resolve_record_dir(self, type_code: str) -> Optional[Path]:
         cfg = global_setting.get_setting("server_config")
         if not cfg:
@@ -140,22 +221,25 @@ class ImageGallery(ThemedWidget):
         return base / f"{type_code}_{record_suffix}"
 
     def _select_previous(self) -> None:
-        if not self._images:
-            return
-        self._current_index = (self._current_index - 1) % len(self._images)
-        self._display_image(self._images[self._current_index])
-        self._update_navigation_buttons()
+        self._select_offset(-1)
 
     def _select_next(self) -> None:
-        if not self._images:
+        self._select_offset(1)
+
+    def _select_offset(self, step: int) -> None:
+        count = self._image_count()
+        if not count:
             return
-        self._current_index = (self._current_index + 1) % len(self._images)
-        self._display_image(self._images[self._current_index])
+        self._current_index = (self._current_index + step) % count
+        path = self._image_at(self._current_index)
+        if path is not None:
+            self._display_image(path)
         self._update_navigation_buttons()
 
     def _update_navigation_buttons(self) -> None:
-        has_images = len(self._images) > 0
-        multiple = len(self._images) > 1
+        count = self._image_count()
+        has_images = count > 0
+        multiple = count > 1
         self.prev_btn.setEnabled(multiple)
         self.next_btn.setEnabled(multiple)
         if not has_images:
@@ -166,6 +250,8 @@ class ImageGallery(ThemedWidget):
     def _show_placeholder(self, message: str = "暂无图片") -> None:
         self._current_pixmap = None
         self._current_path = None
+        self._requested_path = None
+        self._scaled_for = None
         self.canvas_label.setPixmap(QPixmap())
         self.canvas_label.setText(message)
         self.canvas_label.setToolTip("")
@@ -176,12 +262,38 @@ class ImageGallery(ThemedWidget):
             self._set_path_display("")
             return
 
-        pixmap = QPixmap(str(path))
-        if pixmap.isNull():
+        self._requested_path = path
+        pixmap = self.image_cache.get(path)
+        if pixmap is None:
+            # 后台解码，完成后由 _on_image_ready 显示；加载期间保留上一张图片
+            self.image_cache.request(path)
+            if self._current_pixmap is None:
+                self.canvas_label.setText("加载中...")
+            self._set_path_display(str(path).replace(" ", ""))
+        else:
+            self._show_pixmap(path, pixmap)
+        self._prefetch_neighbours()
+
+    def _prefetch_neighbours(self) -> None:
+        # 预取前后各一张，翻页时直接命中缓存
+        count = self._image_count()
+        if count < 2 or self._current_index < 0:
+            return
+        for offset in (1, -1):
+            path = self._image_at((self._current_index + offset) % count)
+            if path is not None:
+                self.image_cache.request(path, prefetch=True)
+
+    def _on_image_ready(self, path_text: str, pixmap: QPixmap) -> None:
+        if self._requested_path is not None and str(self._requested_path) == path_text:
+            self._show_pixmap(self._requested_path, pixmap)
+
+    def _on_image_failed(self, path_text: str) -> None:
+        if self._requested_path is not None and str(self._requested_path) == path_text:
             self._show_placeholder("无法加载图片")
             self._set_path_display("")
-            return
 
+    def _show_pixmap(self, path: Path, pixmap: QPixmap) -> None:
         self._current_pixmap = pixmap
         self._current_path = path
         self.canvas_label.setText("")
@@ -199,7 +311,7 @@ class ImageGallery(ThemedWidget):
             self.path_display.setPlainText(text)
         self.path_display.blockSignals(previous)
 
-    def _update_device_combo(self, image_files: Optional[List[Path]] = None) -> None:
+    def _update_device_combo(self) -> None:
         if self.device_combo is None:
             return
 
@@ -215,16 +327,17 @@ class ImageGallery(ThemedWidget):
                 if code.startswith(type_prefix):
                     devices.add(code)
 
-        files_to_scan = image_files if image_files is not None else self._images
-        for path in files_to_scan:
-            code = self._extract_device_code(path)
-            if code and code.startswith(type_prefix):
-                devices.add(code)
+        if self._index is not None:
+            # 索引中按设备分组，不再逐个文件解析设备号
+            devices.update(code for code in self._index.devices() if code.startswith(type_prefix))
 
         sorted_devices = sorted(
             devices,
             key=lambda c: int(c.split('_')[1]) if '_' in c and c.split('_')[1].isdigit() else c,
         )
+        if sorted_devices == self._available_devices and self.device_combo.count() > 0:
+            # 设备列表未变化，不重建下拉框
+            return
 
         previous_state = self.device_combo.blockSignals(True)
         self._suppress_combo_handler = True
@@ -283,18 +396,20 @@ class ImageGallery(ThemedWidget):
     def _jump_to_device(self, device_code: Optional[str], notify_when_missing: bool) -> None:
         if not device_code:
             return
-        if not self._images:
+        if not self._image_count():
             if notify_when_missing:
                 QMessageBox.information(self, "未找到图片", "当前未找到任何记录图片。")
             return
 
-        target = next((p for p in self._images if self._extract_device_code(p) == device_code), None)
-        if target is None:
+        # 设备子列表中最新的一张，再二分定位其在全部图片中的位置
+        target = self._index.latest_for_device(device_code)
+        position = self._index.position_of(target)
+        if target is None or position < 0:
             if notify_when_missing:
                 QMessageBox.information(self, "未找到图片", f"未检索到 {device_code} 的记录图片。")
             return
 
-        self._current_index = self._images.index(target)
+        self._current_index = position
         self._display_image(target)
         self._update_navigation_buttons()
 
@@ -360,6 +475,10 @@ class ImageGallery(ThemedWidget):
         target_size = self.canvas_label.size()
         if target_size.width() <= 0 or target_size.height() <= 0:
             return
+        scaled_for = (self._current_pixmap.cacheKey(), target_size.width(), target_size.height())
+        if scaled_for == self._scaled_for:
+            return
+        self._scaled_for = scaled_for
 
         scaled = self._current_pixmap.scaled(
             target_size,
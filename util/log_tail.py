@@ -0,0 +1,123 @@
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+
+class LogTail:
+    """
+    增量读取日志文件末尾
+    记住每个文件的读取位置，每次只读取新追加的字节；只保留最新 max_lines 行
+    首次打开文件时从文件末尾向前读取，直到凑够 max_lines 行
+    """
+
+    block_size = 64 * 1024
+
+    def __init__(self, max_lines: int = 0):
+        # max_lines <= 0 表示不限制行数
+        self.max_lines = max_lines if max_lines > 0 else None
+        self.lines: Deque[str] = deque(maxlen=self.max_lines)
+        # 路径 -> (已读取位置, 不完整的最后一行)
+        self._state: Dict[str, Tuple[int, bytes]] = {}
+        self._paths: List[str] = []
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data.decode('gbk', errors='ignore')
+
+    def _read_last_lines(self, file, size: int) -> Tuple[List[bytes], bytes]:
+        """
+        从文件末尾向前按块读取，返回 (完整行, 不完整的最后一行)
+        """
+        chunks: List[bytes] = []
+        newlines = 0
+        position = size
+        need = self.max_lines + 1 if self.max_lines is not None else None
+        while position > 0 and (need is None or newlines < need):
+            step = min(self.block_size, position)
+            position -= step
+            file.seek(position)
+            chunk = file.read(step)
+            newlines += chunk.count(b'\n')
+            chunks.append(chunk)
+        data = b''.join(reversed(chunks))
+        lines = data.split(b'\n')
+        partial = lines.pop()
+        if position > 0 and lines:
+            # 第一行可能是被截断的半行
+            lines = lines[1:]
+        return lines, partial
+
+    def _read_file(self, path: str) -> Tuple[List[str], bool]:
+        """
+        读取文件新追加的完整行，返回 (新行, 文件是否被截断或替换)
+        """
+        offset, partial = self._state.get(path, (-1, b''))
+        truncated = False
+        try:
+            with open(path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                if offset < 0 or size < offset:
+                    truncated = offset >= 0
+                    raw_lines, partial = self._read_last_lines(file, size)
+                else:
+                    file.seek(offset)
+                    data = partial + file.read(size - offset)
+                    raw_lines = data.split(b'\n')
+                    partial = raw_lines.pop()
+        except FileNotFoundError:
+            self._state.pop(path, None)
+            return [], False
+        except OSError as exc:
+            logger.warning(f"[LogTail] 读取日志 {path} 失败: {exc}")
+            return [], False
+        self._state[path] = (size, partial)
+        return [self._decode(line).rstrip('\r') for line in raw_lines], truncated
+
+    def set_files(self, paths: Sequence[str]) -> bool:
+        """
+        设置要跟踪的文件（按时间先后排列），文件列表变化时重新加载，返回是否重新加载
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        if paths == self._paths:
+            return False
+        self._paths = paths
+        self._state.clear()
+        self.lines.clear()
+        return True
+
+    def poll(self) -> Tuple[List[str], bool]:
+        """
+        读取所有文件新追加的行，返回 (新行, 是否需要整体刷新)
+        首次读取或有文件被截断/替换时返回全部保留的行
+        """
+        reset = not self._state
+        new_lines: List[str] = []
+        if not reset:
+            for path in self._paths:
+                lines, truncated = self._read_file(path)
+                if truncated:
+                    reset = True
+                    break
+                new_lines.extend(lines)
+        if reset:
+            self._state.clear()
+            self.lines.clear()
+            for path in self._paths:
+                lines, _ = self._read_file(path)
+                self.lines.extend(lines)
+            return list(self.lines), True
+        self.lines.extend(new_lines)
+        if self.max_lines is not None and len(new_lines) > self.max_lines:
+            new_lines = new_lines[-self.max_lines:]
+        return new_lines, False
+
+    def text(self, lines: Optional[Sequence[str]] = None, newest_first: bool = True) -> str:
+        lines = list(self.lines) if lines is None else list(lines)
+        if newest_first:
+            lines.reverse()
+        return '\n'.join(lines)
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional, Set
+
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class RefreshEvent:
+    """
+    界面刷新通知
+    kind: upload(收到上传) / image(图片处理完成) / stored(本轮结果已写入检测结果库) / video(视频处理完成)
+          / devices(设备集合变化) / overflow(通知过多被合并，需要整体刷新)
+    device: 发生变化的设备号（如 FL_000001）或 UID，None 表示不特定设备
+    """
+    kind: str
+    device: Optional[str] = None
+    seq: int = 0
+    timestamp: float = field(default_factory=time.time)
+
+
+class RefreshSubscription:
+    """
+    单个订阅者：记录已读取的序号，各订阅者互不影响（不再共用一个 Event 的 set/clear）
+    """
+
+    def __init__(self, bus: "RefreshBus", name: str, min_interval: float = 0.0):
+        self.bus = bus
+        self.name = name
+        # 合并窗口：两次返回之间至少间隔 min_interval 秒，窗口内的通知合并为一次
+        self.min_interval = max(0.0, float(min_interval))
+        self.last_seq = bus.seq
+        self._last_delivery = 0.0
+        self.closed = False
+
+    def wait(self, timeout: Optional[float] = None) -> List[RefreshEvent]:
+        """
+        等待新的通知，返回自上次以来的全部通知；超时或已关闭时返回空列表
+        """
+        bus = self.bus
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with bus.condition:
+            while not self.closed and bus.seq == self.last_seq:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                bus.condition.wait(remaining)
+            if self.closed:
+                return []
+            # 距上次返回不足合并窗口时继续等待，期间到达的通知一并返回
+            hold = self._last_delivery + self.min_interval - time.monotonic()
+            while hold > 0 and not self.closed:
+                bus.condition.wait(hold)
+                hold = self._last_delivery + self.min_interval - time.monotonic()
+            if self.closed:
+                return []
+            events = bus.events_since(self.last_seq)
+            self.last_seq = bus.seq
+        self._last_delivery = time.monotonic()
+        return events
+
+    def close(self):
+        self.closed = True
+        self.bus.unsubscribe(self)
+
+
+class RefreshBus:
+    """
+    界面刷新发布/订阅总线
+    发布方（接收线程、图像/视频处理线程）publish 通知；各界面线程通过自己的订阅按合并窗口取出通知，
+    通知携带设备号，订阅方可只刷新变化的设备
+    """
+
+    def __init__(self, history: int = 1024, legacy_event: Optional[threading.Event] = None):
+        self.condition = threading.Condition()
+        self.seq = 0
+        self._events: Deque[RefreshEvent] = deque(maxlen=max(1, history))
+        self._subscriptions: Set[RefreshSubscription] = set()
+        # 兼容仍在等待 processing_done 的旧代码
+        self.legacy_event = legacy_event
+
+    def publish(self, kind: str, device: Optional[str] = None):
+        with self.condition:
+            self.seq += 1
+            self._events.append(RefreshEvent(kind=kind, device=device, seq=self.seq))
+            self.condition.notify_all()
+        if self.legacy_event is not None:
+            try:
+                self.legacy_event.set()
+            except Exception:
+                logger.debug("processing_done event set failed", exc_info=True)
+
+    def subscribe(self, name: str, min_interval: float = 0.0) -> RefreshSubscription:
+        subscription = RefreshSubscription(self, name, min_interval)
+        with self.condition:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: RefreshSubscription):
+        with self.condition:
+            self._subscriptions.discard(subscription)
+            self.condition.notify_all()
+
+    def events_since(self, seq: int) -> List[RefreshEvent]:
+        """
+        返回序号大于 seq 的通知（调用方需持有 condition）；已被挤出历史的通知以一条 overflow 代替
+        """
+        if self.seq == seq:
+            return []
+        events = [event for event in self._events if event.seq > seq]
+        if not events or events[0].seq != seq + 1:
+            events.insert(0, RefreshEvent(kind="overflow", seq=seq + 1))
+        return events
+
+    # 会改变设备数量的通知类型
+    COUNT_KINDS = ("image", "stored", "video")
+
+    @staticmethod
+    def changed_devices(events: List[RefreshEvent], kinds=COUNT_KINDS) -> Optional[Set[str]]:
+        """
+        通知中数量发生变化的设备号集合；存在 overflow 或不特定设备的同类通知时返回 None（需要整体刷新）
+        """
+        devices: Set[str] = set()
+        for event in events:
+            if event.kind == "overflow":
+                return None
+            if event.kind in kinds:
+                if event.device is None:
+                    return None
+                devices.add(event.device)
+        return devices